@@ -0,0 +1,335 @@
+"""
+bench_pipeline.py
+
+End-to-end pipeline benchmark: extract -> chunk -> embed -> upload -> query,
+run against the offline Azure stand-ins in mock_azure.py (or against whatever
+services the environment points at, with --external).
+
+For every stage it reports throughput, p50/p95/p99 latency, and at the end
+peak RSS and API call counts, as JSON. A saved baseline can be compared
+against to catch regressions (exit code 1 when a stage got slower than the
+tolerance allows).
+
+Two modes:
+  --mode stages   time each stage per document / per query using the
+                  step functions directly (default)
+  --mode scripts  run step1_extract.main() and step2_index.process_and_upload()
+                  as the batch scripts do, then the query path
+
+Usage:
+    python bench_pipeline.py --docs 200 --queries 50
+    python bench_pipeline.py --docs 200 --save-baseline bench_baseline.json
+    python bench_pipeline.py --docs 200 --baseline bench_baseline.json --tolerance 0.2
+    python bench_pipeline.py --corpus path/to/docs      # use an existing corpus
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import glob
+import random
+import shutil
+import resource
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import percentile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PARTIES = ["Margaret A. Whitfield", "Robert J. Whitfield", "Patricia L. Donovan",
+           "Frank Marchetti", "Eleanor Ruiz", "Samuel Okafor", "Grace Lindqvist",
+           "Thomas Nguyen", "Aisha Rahman", "Daniel Kowalski"]
+QUESTIONS = [
+    "Who is the successor agent?",
+    "What powers are granted to the agent?",
+    "When does the power of attorney become effective?",
+    "What statute governs this power of attorney?",
+    "Who are the witnesses and was it notarized?",
+    "What are the differences between the PA and IL forms?",
+]
+
+
+# -- Synthetic corpus --
+def synthetic_document(i, rng, pages=3):
+    """A small multi-page POA-like text document (pages split by form feeds)."""
+    state = rng.choice(["PA", "IL"])
+    principal, agent, successor = rng.sample(PARTIES, 3)
+    statute = "20 Pa.C.S. Chapter 56" if state == "PA" else "755 ILCS 45"
+    body = []
+    for page in range(1, pages + 1):
+        body.append(
+            f"# {state} Durable Power of Attorney {i} - page {page}\n\n"
+            f"I, {principal}, appoint {agent} as my agent, and {successor} as "
+            f"successor agent, pursuant to {statute}. "
+            + " ".join(rng.choice([
+                "My agent may handle real estate transactions.",
+                "My agent may make health care decisions for me.",
+                "This power of attorney is effective immediately.",
+                "This power of attorney is durable and survives my incapacity.",
+                "Signed before a notary public and two witnesses.",
+                "My agent must act in good faith and keep records.",
+            ]) for _ in range(40))
+        )
+    return f"{state}_Synthetic_POA_{i:05d}.txt", "\f".join(body)
+
+
+def build_corpus(directory, count, seed):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        name, text = synthetic_document(i, rng)
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+# -- Measurement helpers --
+def summarize(name, latencies, wall_seconds, items=None):
+    items = items if items is not None else len(latencies)
+    return {
+        "stage": name,
+        "items": items,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_s": round(items / wall_seconds, 2) if wall_seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def timed_map(fn, items, concurrency):
+    """Run fn over items on a thread pool; returns (results, latencies, wall_seconds)."""
+    def run(item):
+        start = time.perf_counter()
+        result = fn(item)
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(run, items))
+    wall = time.perf_counter() - start
+    return [r for r, _ in outcomes], [t for _, t in outcomes], wall
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Silence the step scripts' progress prints while timing."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# -- Benchmark modes --
+def bench_stages(args, step1, step2, step3):
+    stages = []
+    doc_files = sorted(glob.glob("docs/*"))
+
+    with quiet(not args.verbose):
+        step2.create_search_index()
+
+        _, latencies, wall = timed_map(step1.extract_document, doc_files, args.concurrency)
+        stages.append(summarize("extract", latencies, wall))
+
+        texts = []
+        for path in sorted(glob.glob("extracted/*.md")):
+            with open(path, encoding="utf-8") as f:
+                texts.append((os.path.basename(path), f.read()))
+
+        chunked, latencies, wall = timed_map(lambda t: (t[0], step2.chunk_text(t[1])),
+                                             texts, 1)
+        stages.append(summarize("chunk", latencies, wall))
+
+        embedded, latencies, wall = timed_map(
+            lambda c: (c[0], c[1], step2.get_embeddings(c[1])), chunked, args.concurrency)
+        stages.append(summarize("embed", latencies, wall,
+                                items=sum(len(c) for _, c, _ in embedded)))
+
+        def upload(item):
+            filename, chunks, vectors = item
+            documents = [{
+                "id": f"{filename}-chunk-{i}".replace(" ", "-").replace(".", "-"),
+                "content": chunk, "source_file": filename, "chunk_index": i,
+                "content_vector": vector,
+            } for i, (chunk, vector) in enumerate(zip(chunks, vectors))]
+            for i in range(0, len(documents), 100):
+                step2.live_client().upload_documents(documents=documents[i:i + 100])
+
+        _, latencies, wall = timed_map(upload, embedded, args.concurrency)
+        stages.append(summarize("upload", latencies, wall))
+
+    stages.extend(bench_queries(args, step3))
+    return stages
+
+
+def bench_scripts(args, step1, step2, step3):
+    stages = []
+    with quiet(not args.verbose):
+        start = time.perf_counter()
+        step1.main()
+        stages.append(summarize("extract_script", [], time.perf_counter() - start,
+                                items=len(glob.glob("docs/*"))))
+
+        start = time.perf_counter()
+        step2.create_search_index()
+        step2.process_and_upload()
+        stages.append(summarize("index_script", [], time.perf_counter() - start,
+                                items=len(glob.glob("extracted/*.md"))))
+
+    stages.extend(bench_queries(args, step3))
+    return stages
+
+
+def bench_queries(args, step3):
+    rng = random.Random(args.seed)
+    questions = [rng.choice(QUESTIONS) for _ in range(args.queries)]
+    stages = []
+    with quiet(not args.verbose):
+        _, latencies, wall = timed_map(step3.search_documents, questions, args.concurrency)
+        stages.append(summarize("query_search", latencies, wall))
+        if args.rag:
+            _, latencies, wall = timed_map(step3.ask_question, questions, args.concurrency)
+            stages.append(summarize("query_rag", latencies, wall))
+    return stages
+
+
+# -- Baseline comparison --
+def compare(results, baseline, tolerance):
+    """Returns a list of regression messages (empty when everything is within tolerance)."""
+    regressions = []
+    previous = {s["stage"]: s for s in baseline.get("stages", [])}
+    for stage in results["stages"]:
+        old = previous.get(stage["stage"])
+        if not old:
+            continue
+        if old.get("throughput_per_s") and stage["throughput_per_s"] is not None and \
+                stage["throughput_per_s"] < old["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{stage['stage']}: throughput {stage['throughput_per_s']}/s "
+                               f"vs baseline {old['throughput_per_s']}/s")
+        if old.get("p95_ms") and stage["p95_ms"] is not None and \
+                stage["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{stage['stage']}: p95 {stage['p95_ms']}ms "
+                               f"vs baseline {old['p95_ms']}ms")
+    return regressions
+
+
+def print_report(results):
+    print(f"\n{'Stage':<16} {'Items':>7} {'Wall s':>8} {'Items/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print("-" * 72)
+    for s in results["stages"]:
+        fmt = lambda v: "-" if v is None else v
+        print(f"{s['stage']:<16} {s['items']:>7} {s['wall_seconds']:>8} "
+              f"{fmt(s['throughput_per_s']):>9} {fmt(s['p50_ms']):>9} "
+              f"{fmt(s['p95_ms']):>9} {fmt(s['p99_ms']):>9}")
+    print(f"\nPeak RSS: {results['peak_rss_mb']} MB")
+    if results["api_calls"]:
+        print("API calls: " + ", ".join(f"{k}={v}" for k, v in sorted(results["api_calls"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the POA RAG pipeline end to end.")
+    parser.add_argument("--docs", type=int, default=50, help="synthetic documents to generate")
+    parser.add_argument("--corpus", help="use the files in this folder instead of a synthetic corpus")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--rag", action="store_true", help="also time full ask_question()")
+    parser.add_argument("--mode", choices=["stages", "scripts"], default="stages")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=None,
+                        help="mock service latency (default: mock_azure defaults)")
+    parser.add_argument("--external", action="store_true",
+                        help="don't start the mock; use the services in the environment")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="compare against this saved result")
+    parser.add_argument("--save-baseline", help="also write the result here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown vs baseline (default: 0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    corpus = os.path.abspath(args.corpus) if args.corpus else None
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    server = None
+    if not args.external:
+        import mock_azure
+        config = {}
+        if args.latency_ms is not None:
+            config["latency_ms"] = {s: args.latency_ms for s in mock_azure.DEFAULT_CONFIG["latency_ms"]}
+        server, env = mock_azure.start_mock_server(config)
+        env["AZURE_SEARCH_INDEX_NAME"] = f"bench-{int(time.time())}"
+        os.environ.update(env)
+
+    # The step scripts use relative paths - run them in a scratch folder
+    workdir = tempfile.mkdtemp(prefix="poa-bench-")
+    os.chdir(workdir)
+    if corpus:
+        shutil.copytree(corpus, "docs")
+    else:
+        build_corpus("docs", args.docs, args.seed)
+    os.makedirs("extracted", exist_ok=True)
+    os.makedirs("extraction_metrics", exist_ok=True)
+
+    sys.path.insert(0, REPO_DIR)
+    import step1_extract
+    import step2_index
+    import step3_query
+    from rate_limiter import limiter_stats
+
+    print(f"Benchmarking {len(glob.glob('docs/*'))} document(s), {args.queries} "
+          f"queries ({args.mode} mode) in {workdir}")
+    run = bench_stages if args.mode == "stages" else bench_scripts
+    stages = run(args, step1_extract, step2_index, step3_query)
+
+    api_calls = dict(server.RequestHandlerClass.state.stats) if server else {}
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items()
+                   if k not in ("output", "baseline", "save_baseline", "verbose")},
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "api_calls": api_calls,
+        "rate_limiter": limiter_stats(),
+    }
+
+    print_report(results)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved: {output}")
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved: {save_path}")
+
+    os.chdir(REPO_DIR)
+    shutil.rmtree(workdir, ignore_errors=True)
+    if server:
+        server.shutdown()
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS vs {baseline_path}:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {baseline_path} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+boilerplate.py
+
+Index-time detection of template boilerplate shared between documents -
+the statutory NOTICE text, the IL short-form power lists - so that step2
+embeds and stores each shared passage once instead of once per filled copy.
+
+Every chunk step2 indexes is registered here with a MinHash signature of
+its 5-word shingles and its index id (SQLite, same style as
+job_ledger.py). Signatures are banded (LSH) so a new chunk is compared only
+with the few registered chunks that share a band. When a chunk of a new
+document matches a chunk of another document at an estimated Jaccard
+similarity of BOILERPLATE_THRESHOLD or more AND carries exactly the same
+filled-in values, step2
+  - skips embedding it (and its child passages),
+  - does not upload a copy, and
+  - adds the document to the "shared_by" list of the chunk already indexed.
+The similarity alone does not separate filled copies of one template: a
+swapped principal name or city still scores ~0.9. So every passage is also
+registered with a hash of its value tokens (fingerprints.value_tokens:
+names, dates, addresses, numbers), and a chunk is only shared when that hash
+is identical - otherwise it is indexed per document with its own values.
+
+Usage:
+    python boilerplate.py            # registry stats: shared passages, refs, savings
+    python boilerplate.py --top 20   # the most widely shared passages
+"""
+
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+from fingerprints import value_tokens
+
+BOILERPLATE_PATH = os.environ.get("BOILERPLATE_PATH", "ingest_state/boilerplate.db")
+BOILERPLATE_THRESHOLD = float(os.environ.get("BOILERPLATE_THRESHOLD", "0.85"))
+SHINGLE_WORDS = 5
+NUM_PERM = 64
+BANDS = 16              # 16 bands x 4 rows: candidates from ~50% similarity up
+MIN_WORDS = 40          # shorter chunks are never treated as boilerplate
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)   # fixed: signatures must be comparable across runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS passages (
+    passage_id  TEXT PRIMARY KEY,
+    doc_id      TEXT NOT NULL,
+    signature   TEXT NOT NULL,
+    chars       INTEGER,
+    value_hash  TEXT,
+    created_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_passages_doc ON passages(doc_id);
+
+CREATE TABLE IF NOT EXISTS bands (
+    band        INTEGER NOT NULL,
+    bucket      TEXT NOT NULL,
+    passage_id  TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, passage_id)
+);
+
+CREATE TABLE IF NOT EXISTS refs (
+    passage_id  TEXT NOT NULL,
+    doc_id      TEXT NOT NULL,
+    PRIMARY KEY (passage_id, doc_id)
+);
+CREATE INDEX IF NOT EXISTS idx_refs_doc ON refs(doc_id);
+"""
+
+
+# -- MinHash --
+def shingles(text):
+    """Hashed 5-word shingles of the normalized text (empty for short text)."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    if len(words) < MIN_WORDS:
+        return set()
+    return {int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE_WORDS]).encode(),
+                                           digest_size=8).digest(), "little")
+            for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(shingle_set):
+    if not shingle_set:
+        return None
+    return [min((a * x + b) % _PRIME for x in shingle_set) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def band_buckets(signature):
+    rows = NUM_PERM // BANDS
+    return [(band, hashlib.sha1(json.dumps(signature[band * rows:(band + 1) * rows])
+                                .encode()).hexdigest()[:16])
+            for band in range(BANDS)]
+
+
+def signature_of(text):
+    return minhash(shingles(text))
+
+
+def value_hash(text):
+    """Hash of the chunk's filled-in values; shared chunks must agree on it exactly."""
+    return hashlib.sha1(json.dumps(sorted(value_tokens(text))).encode()).hexdigest()
+
+
+class BoilerplateRegistry:
+    """SQLite-backed MinHash/LSH registry of indexed chunks and who shares them."""
+
+    def __init__(self, path=BOILERPLATE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        self._conn.executescript(SCHEMA)
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(passages)")}
+        if "value_hash" not in columns:
+            # Registries from before value_hash: their passages never match until re-registered
+            self._conn.execute("ALTER TABLE passages ADD COLUMN value_hash TEXT")
+
+    def find(self, signature, values, exclude_doc=None, threshold=BOILERPLATE_THRESHOLD):
+        """
+        The most similar registered passage of another document with the same
+        filled-in values (`values` from value_hash()), or None.
+        """
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for band, bucket in band_buckets(signature):
+                candidates.update(r["passage_id"] for r in self._conn.execute(
+                    "SELECT passage_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)))
+            best = None
+            for passage_id in candidates:
+                row = self._conn.execute(
+                    "SELECT passage_id, doc_id, signature, value_hash FROM passages "
+                    "WHERE passage_id = ?", (passage_id,)).fetchone()
+                if row is None or row["doc_id"] == exclude_doc or row["value_hash"] != values:
+                    continue
+                score = similarity(signature, json.loads(row["signature"]))
+                if score >= threshold and (best is None or score > best["similarity"]):
+                    best = {"passage_id": row["passage_id"], "doc_id": row["doc_id"],
+                            "similarity": score}
+        return best
+
+    def add(self, passage_id, doc_id, signature, values, chars):
+        """Register one indexed chunk (re-registering replaces it)."""
+        if signature is None:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM bands WHERE passage_id = ?", (passage_id,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO passages "
+                    "(passage_id, doc_id, signature, value_hash, chars, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (passage_id, doc_id, json.dumps(signature), values, chars, time.time()),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO bands (band, bucket, passage_id) VALUES (?, ?, ?)",
+                    [(band, bucket, passage_id) for band, bucket in band_buckets(signature)],
+                )
+                self._conn.execute("INSERT OR IGNORE INTO refs (passage_id, doc_id) VALUES (?, ?)",
+                                   (passage_id, doc_id))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add_ref(self, passage_id, doc_id):
+        """Record that `doc_id` contains the passage. Returns every document that does."""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO refs (passage_id, doc_id) VALUES (?, ?)",
+                               (passage_id, doc_id))
+        return self.refs(passage_id)
+
+    def remove(self, passage_id):
+        """Forget a passage that is no longer in the index (and every reference to it)."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for table in ("bands", "refs", "passages"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE passage_id = ?", (passage_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def drop_refs(self, doc_id, passage_ids=None):
+        """
+        Remove doc_id's references to other documents' passages (or to just
+        `passage_ids`). Returns the passages it no longer references.
+        """
+        with self._lock:
+            if passage_ids is None:
+                rows = self._conn.execute(
+                    "SELECT r.passage_id FROM refs r JOIN passages p ON p.passage_id = r.passage_id "
+                    "WHERE r.doc_id = ? AND p.doc_id != ?", (doc_id, doc_id)).fetchall()
+                passage_ids = [r["passage_id"] for r in rows]
+            self._conn.executemany("DELETE FROM refs WHERE passage_id = ? AND doc_id = ?",
+                                   [(passage_id, doc_id) for passage_id in passage_ids])
+        return list(passage_ids)
+
+    def refs(self, passage_id):
+        with self._lock:
+            return [r["doc_id"] for r in self._conn.execute(
+                "SELECT doc_id FROM refs WHERE passage_id = ? ORDER BY doc_id", (passage_id,))]
+
+    def stats(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS passages, "
+                "COALESCE(SUM(CASE WHEN n > 1 THEN 1 ELSE 0 END), 0) AS shared, "
+                "COALESCE(SUM(n - 1), 0) AS copies_saved, "
+                "COALESCE(SUM((n - 1) * chars), 0) AS chars_saved "
+                "FROM (SELECT p.passage_id, p.chars, COUNT(r.doc_id) AS n FROM passages p "
+                "      JOIN refs r ON r.passage_id = p.passage_id GROUP BY p.passage_id)"
+            ).fetchone()
+        return dict(row)
+
+    def most_shared(self, limit=10):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.passage_id, p.doc_id, p.chars, COUNT(r.doc_id) AS refs FROM passages p "
+                "JOIN refs r ON r.passage_id = p.passage_id GROUP BY p.passage_id "
+                "HAVING refs > 1 ORDER BY refs DESC, p.chars DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """One BoilerplateRegistry per process."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = BoilerplateRegistry()
+        return _registry
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared template passage registry.")
+    parser.add_argument("--top", type=int, default=10, help="most shared passages to list")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    stats = registry.stats()
+    print(f"\n{stats['passages']} registered chunk(s), {stats['shared']} shared by 2+ documents")
+    print(f"{stats['copies_saved']} duplicate chunk(s) not embedded or stored "
+          f"(~{stats['chars_saved']:,} characters)")
+    shared = registry.most_shared(args.top)
+    if shared:
+        print(f"\nMost shared passages:")
+        for row in shared:
+            print(f"  {row['refs']:>5} docs  {row['chars']:>5} chars  {row['passage_id']}")
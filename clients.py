@@ -0,0 +1,142 @@
+"""
+clients.py
+
+Shared registry of the SDK clients the pipeline talks to - Azure OpenAI,
+Azure AI Search (one SearchClient per physical index, plus the index
+management client) and Document Intelligence.
+
+Nothing is imported or built until a client is first asked for: the
+openai / azure SDK imports and the environment variables they need are
+only touched then, so importing step2_index, step3_query or
+step5_extraction_metrics for a helper (chunk_text, the field extraction
+prompt, ...) or printing a CLI's --help costs a few milliseconds and needs
+no credentials. Each client is built once per process and shared by every
+thread; construction is guarded by a lock so concurrent first calls (the
+embedding fan-out, per-state searches) don't build duplicates. A missing
+setting is reported by name when the client that needs it is first used.
+
+Usage:
+    import clients
+    clients.openai().embeddings.create(...)
+    clients.search("poa-index-v2").search(...)
+    clients.search_index().create_or_update_index(...)
+    clients.docintel().begin_analyze_document(...)
+
+    python clients.py          # import + construction time of each client
+"""
+
+import os
+import time
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_API_VERSION = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-06-01")
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def setting(name):
+    """A required environment variable, with a clear error when it is missing."""
+    value = os.environ.get(name)
+    if not value:
+        raise RuntimeError(f"{name} is not set (add it to .env or the environment)")
+    return value
+
+
+def get(key, factory):
+    """The client cached under `key`, built with factory() on first use."""
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+
+# -- Clients --
+def openai():
+    def build():
+        from openai import AzureOpenAI
+
+        return AzureOpenAI(
+            azure_endpoint=setting("AZURE_OPENAI_ENDPOINT"),
+            api_key=setting("AZURE_OPENAI_API_KEY"),
+            api_version=OPENAI_API_VERSION,
+            max_retries=0,  # throttling/retries are handled by rate_limiter
+        )
+    return get("openai", build)
+
+
+def search(index_name):
+    """SearchClient for one physical index (see index_aliases.resolve)."""
+    if not index_name:
+        raise RuntimeError("AZURE_SEARCH_INDEX_NAME is not set (add it to .env or the environment)")
+
+    def build():
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents import SearchClient
+        from rate_limiter import azure_client_kwargs
+
+        return SearchClient(
+            endpoint=setting("AZURE_SEARCH_ENDPOINT"),
+            index_name=index_name,
+            credential=AzureKeyCredential(setting("AZURE_SEARCH_ADMIN_KEY")),
+            **azure_client_kwargs("search"),
+        )
+    return get(("search", index_name), build)
+
+
+def search_index():
+    """SearchIndexClient: create/update/delete indexes and aliases."""
+    def build():
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents.indexes import SearchIndexClient
+        from rate_limiter import azure_client_kwargs
+
+        return SearchIndexClient(
+            endpoint=setting("AZURE_SEARCH_ENDPOINT"),
+            credential=AzureKeyCredential(setting("AZURE_SEARCH_ADMIN_KEY")),
+            **azure_client_kwargs("search"),
+        )
+    return get("search_index", build)
+
+
+def docintel():
+    def build():
+        from azure.core.credentials import AzureKeyCredential
+        from azure.ai.documentintelligence import DocumentIntelligenceClient
+        from rate_limiter import azure_client_kwargs
+
+        return DocumentIntelligenceClient(
+            endpoint=setting("AZURE_DOCINTEL_ENDPOINT"),
+            credential=AzureKeyCredential(setting("AZURE_DOCINTEL_KEY")),
+            **azure_client_kwargs("docintel"),
+        )
+    return get("docintel", build)
+
+
+def print_timings():
+    """Build every client (no network calls) and show what each one costs."""
+    builders = [("openai", openai),
+                ("search", lambda: search(os.environ.get("AZURE_SEARCH_INDEX_NAME"))),
+                ("search_index", search_index),
+                ("docintel", docintel)]
+    print(f"\n{'Client':<14} {'ms':>8}  Status")
+    print("-" * 50)
+    for name, build in builders:
+        start = time.perf_counter()
+        try:
+            build()
+            status = "ok"
+        except (ImportError, RuntimeError) as e:
+            status = str(e)
+        print(f"{name:<14} {(time.perf_counter() - start) * 1000:>8.1f}  {status}")
+
+
+if __name__ == "__main__":
+    print_timings()
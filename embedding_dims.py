@@ -0,0 +1,204 @@
+"""
+embedding_dims.py
+
+Embedding size configuration shared by step2_index.py (documents and the
+index schema) and step3_query.py (queries), so the vectors in the index and
+the query vector always have the same length and come from the same
+reduction.
+
+    AZURE_OPENAI_EMBEDDING_MODEL   model behind the embedding deployment
+                                   (default text-embedding-ada-002)
+    EMBEDDING_DIMENSIONS           stored vector size (default: the model's)
+    EMBEDDING_REDUCTION            how vectors get to that size:
+        auto      (default) "none" at the model's own size, else "api" for
+                  text-embedding-3 models and "truncate" for the rest
+                  (ada-002 was not trained for truncation - check the
+                  loss with eval_dimensions.py, or use pca)
+        api       pass dimensions= to the embeddings call (text-embedding-3
+                  only; the service shortens and renormalizes the vector)
+        truncate  keep the first N components and renormalize locally
+                  (Matryoshka truncation; same result as "api" for
+                  text-embedding-3, for deployments/backends without it)
+        pca       project onto a PCA basis fitted on our own chunk vectors
+                  (EMBEDDING_PCA_PATH, written by `fit-pca`; needs numpy)
+        none      store the vectors as returned
+
+Changing any of these changes the index schema: recreate the index and
+re-embed (python job_ledger.py reset ...), then re-run step2.
+eval_dimensions.py measures the recall vs. storage/latency trade-off on our
+corpus before committing to a size.
+
+Usage:
+    python embedding_dims.py                         # show the active settings
+    python embedding_dims.py fit-pca --dimensions 256
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+from dotenv import load_dotenv
+
+# Read before step2/step3 call load_dotenv themselves: the settings live in .env
+load_dotenv()
+
+EMBEDDING_MODEL = os.environ.get("AZURE_OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+NATIVE_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+MODEL_DIMENSIONS = NATIVE_DIMENSIONS.get(EMBEDDING_MODEL, 1536)
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS") or MODEL_DIMENSIONS)
+PCA_PATH = os.environ.get("EMBEDDING_PCA_PATH", "ingest_state/embedding_pca.json")
+REDUCTIONS = ("none", "api", "truncate", "pca")
+
+_pca = None
+
+
+def supports_dimensions(model=EMBEDDING_MODEL):
+    """Only the text-embedding-3 family accepts the dimensions parameter."""
+    return model.startswith("text-embedding-3")
+
+
+def _resolve_reduction():
+    reduction = os.environ.get("EMBEDDING_REDUCTION", "auto").lower()
+    if reduction == "auto":
+        if EMBEDDING_DIMENSIONS == MODEL_DIMENSIONS:
+            return "none"
+        reduction = "api" if supports_dimensions() else "truncate"
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"EMBEDDING_REDUCTION must be auto or one of {REDUCTIONS}")
+    if reduction == "api" and not supports_dimensions():
+        raise ValueError(f"{EMBEDDING_MODEL} does not accept dimensions=; "
+                         "use EMBEDDING_REDUCTION=truncate or pca")
+    if reduction == "none" and EMBEDDING_DIMENSIONS != MODEL_DIMENSIONS:
+        raise ValueError(f"EMBEDDING_DIMENSIONS={EMBEDDING_DIMENSIONS} but {EMBEDDING_MODEL} "
+                         f"returns {MODEL_DIMENSIONS}; pick a reduction")
+    if EMBEDDING_DIMENSIONS > MODEL_DIMENSIONS:
+        raise ValueError(f"EMBEDDING_DIMENSIONS={EMBEDDING_DIMENSIONS} exceeds "
+                         f"{EMBEDDING_MODEL}'s {MODEL_DIMENSIONS}")
+    return reduction
+
+
+EMBEDDING_REDUCTION = _resolve_reduction()
+
+
+def describe():
+    if EMBEDDING_REDUCTION == "none":
+        return f"{EMBEDDING_MODEL}, {EMBEDDING_DIMENSIONS} dimensions"
+    return (f"{EMBEDDING_MODEL}, {MODEL_DIMENSIONS} -> {EMBEDDING_DIMENSIONS} dimensions "
+            f"({EMBEDDING_REDUCTION})")
+
+
+# -- Request side --
+def request_options(native=False):
+    """Extra keyword arguments for embeddings.create()."""
+    if EMBEDDING_REDUCTION == "api" and not native:
+        return {"dimensions": EMBEDDING_DIMENSIONS}
+    return {}
+
+
+# -- Local reduction --
+def normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def truncate(vector, dimensions):
+    """Matryoshka truncation: the leading components, renormalized."""
+    return normalize(vector[:dimensions])
+
+
+def reduce_vectors(vectors):
+    """Bring vectors returned by embeddings.create() to EMBEDDING_DIMENSIONS."""
+    if EMBEDDING_REDUCTION in ("none", "api"):
+        return vectors
+    if EMBEDDING_REDUCTION == "truncate":
+        return [truncate(v, EMBEDDING_DIMENSIONS) for v in vectors]
+    return project(get_pca(), vectors)
+
+
+def fit_pca(vectors, dimensions):
+    """Fit a PCA basis (mean + top components) on full-size vectors."""
+    import numpy as np
+
+    matrix = np.asarray(vectors, dtype=np.float64)
+    if dimensions > min(matrix.shape):
+        raise ValueError(f"need at least {dimensions} vectors to fit {dimensions} components "
+                         f"(have {matrix.shape[0]})")
+    mean = matrix.mean(axis=0)
+    _, singular, components = np.linalg.svd(matrix - mean, full_matrices=False)
+    explained = (singular ** 2) / (singular ** 2).sum()
+    return {
+        "model": EMBEDDING_MODEL,
+        "dimensions": dimensions,
+        "mean": mean.tolist(),
+        "components": components[:dimensions].tolist(),
+        "explained_variance": round(float(explained[:dimensions].sum()), 4),
+        "fitted_on": matrix.shape[0],
+    }
+
+
+def project(pca, vectors):
+    """Project full-size vectors onto a fitted basis and renormalize."""
+    import numpy as np
+
+    reduced = ((np.asarray(vectors, dtype=np.float64) - np.asarray(pca["mean"]))
+               @ np.asarray(pca["components"]).T)
+    norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (reduced / norms).tolist()
+
+
+def get_pca():
+    """The basis at PCA_PATH, loaded once."""
+    global _pca
+    if _pca is None:
+        if not os.path.exists(PCA_PATH):
+            raise FileNotFoundError(f"{PCA_PATH} not found; run "
+                                    f"'python embedding_dims.py fit-pca --dimensions "
+                                    f"{EMBEDDING_DIMENSIONS}' first")
+        with open(PCA_PATH, encoding="utf-8") as f:
+            pca = json.load(f)
+        if pca["dimensions"] != EMBEDDING_DIMENSIONS or pca["model"] != EMBEDDING_MODEL:
+            raise ValueError(f"{PCA_PATH} was fitted for {pca['model']} at {pca['dimensions']} "
+                             f"dimensions, not {EMBEDDING_MODEL} at {EMBEDDING_DIMENSIONS}")
+        _pca = pca
+    return _pca
+
+
+def ledger_vectors(ledger):
+    """Full-size chunk vectors checkpointed by step2 (the 'embedded' artifacts)."""
+    vectors = []
+    for _, documents in ledger.artifacts("embedded"):
+        vectors.extend(d["content_vector"] for d in documents
+                       if len(d.get("content_vector") or ()) == MODEL_DIMENSIONS)
+    return vectors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding size settings and PCA fitting.")
+    parser.add_argument("command", nargs="?", default="show", choices=["show", "fit-pca"])
+    parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS)
+    parser.add_argument("--output", default=PCA_PATH)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print(f"Embeddings: {describe()}")
+        sys.exit(0)
+
+    from job_ledger import JobLedger
+
+    vectors = ledger_vectors(JobLedger())
+    if not vectors:
+        print(f"No {MODEL_DIMENSIONS}-dimension chunk vectors in the ledger; "
+              "run step2 once with EMBEDDING_REDUCTION=none first.")
+        sys.exit(1)
+    pca = fit_pca(vectors, args.dimensions)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(pca, f)
+    print(f"Fitted {args.dimensions} components on {len(vectors)} vector(s) "
+          f"({pca['explained_variance']:.1%} of the variance) -> {args.output}")
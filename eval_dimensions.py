@@ -0,0 +1,196 @@
+"""
+eval_dimensions.py
+
+Offline recall vs. storage/latency evaluation of smaller embeddings
+(embedding_dims.py), run before re-indexing at a new EMBEDDING_DIMENSIONS.
+
+Uses the full-size chunk vectors step2 checkpointed in the job ledger and
+the question set of eval_retrieval.py (embedded once at full size), then
+for each candidate size and reduction:
+  truncate  leading components, renormalized - what dimensions= returns
+            for text-embedding-3 models
+  pca       PCA basis fitted on the same chunk vectors (in-sample, so a
+            little optimistic)
+runs an exact cosine search locally and reports
+  recall@k / MRR   against the answer-bearing chunks, as in eval_retrieval
+  overlap@k        share of the full-size top k that is still retrieved
+  storage          vector bytes per chunk and for the whole corpus
+  latency          brute-force search time per query (scales with size;
+                   the HNSW search in Azure AI Search does too)
+
+Needs numpy. Results are written to eval_results/ as JSON.
+
+Usage:
+    python eval_dimensions.py
+    python eval_dimensions.py --dimensions 1536,1024,512,256,128 --top-k 5
+    python eval_dimensions.py --methods truncate --limit 50
+"""
+
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from tracing import percentile
+from embedding_dims import EMBEDDING_MODEL, MODEL_DIMENSIONS, fit_pca, project
+from eval_retrieval import QUESTIONS_PATH, RESULTS_DIR, load_questions, score_query
+from job_ledger import JobLedger
+
+METHODS = ("truncate", "pca")
+
+
+def load_corpus(ledger):
+    """Chunk metadata + full-size vectors from the 'embedded' artifacts."""
+    chunks, vectors, skipped = [], [], 0
+    for _, documents in ledger.artifacts("embedded"):
+        for d in documents:
+            if len(d.get("content_vector") or ()) != MODEL_DIMENSIONS:
+                skipped += 1
+                continue
+            chunks.append({"source": d["source_file"], "chunk_index": d["chunk_index"],
+                           "content": d["content"]})
+            vectors.append(d["content_vector"])
+    return chunks, np.asarray(vectors, dtype=np.float32), skipped
+
+
+def unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def reduce(method, doc_vectors, query_vectors, dimensions):
+    """Both sides reduced the same way, as step2 and step3 would."""
+    if dimensions >= MODEL_DIMENSIONS:
+        return unit_rows(doc_vectors), unit_rows(query_vectors)
+    if method == "truncate":
+        return (unit_rows(doc_vectors[:, :dimensions]),
+                unit_rows(query_vectors[:, :dimensions]))
+    pca = fit_pca(doc_vectors, dimensions)
+    return (np.asarray(project(pca, doc_vectors), dtype=np.float32),
+            np.asarray(project(pca, query_vectors), dtype=np.float32))
+
+
+def search(doc_matrix, query_vector, k):
+    scores = doc_matrix @ query_vector
+    top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def evaluate(chunks, doc_vectors, questions, query_vectors, methods, sizes, k):
+    full_docs, full_queries = reduce("truncate", doc_vectors, query_vectors, MODEL_DIMENSIONS)
+    reference = [set(search(full_docs, q, k).tolist()) for q in full_queries]
+
+    rows = []
+    for method in methods:
+        for dimensions in sizes:
+            if dimensions >= MODEL_DIMENSIONS and method != methods[0]:
+                continue   # the full-size row is the same for every method
+            try:
+                docs, queries = reduce(method, doc_vectors, query_vectors, dimensions)
+            except ValueError as e:
+                print(f"  -> {method} @ {dimensions}: skipped ({e})")
+                continue
+
+            recalls, mrrs, overlaps, latencies = [], [], [], []
+            for q, vector, expected in zip(questions, queries, reference):
+                start = time.perf_counter()
+                top = search(docs, vector, k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                scores = score_query([chunks[i] for i in top], q, k)
+                recalls.append(scores["recall"])
+                mrrs.append(scores["mrr"])
+                overlaps.append(len(expected & set(top.tolist())) / max(1, len(expected)))
+
+            n = len(questions) or 1
+            rows.append({
+                "method": "full" if dimensions >= MODEL_DIMENSIONS else method,
+                "dimensions": min(dimensions, MODEL_DIMENSIONS),
+                "top_k": k,
+                "recall": round(sum(recalls) / n, 4),
+                "mrr": round(sum(mrrs) / n, 4),
+                "overlap": round(sum(overlaps) / n, 4),
+                "bytes_per_vector": min(dimensions, MODEL_DIMENSIONS) * 4,
+                "corpus_mb": round(len(chunks) * min(dimensions, MODEL_DIMENSIONS) * 4 / 1e6, 2),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+            })
+            print(f"  -> {rows[-1]['method']} @ {rows[-1]['dimensions']}: "
+                  f"recall={rows[-1]['recall']} overlap={rows[-1]['overlap']}")
+    return rows
+
+
+def print_report(rows, chunks):
+    print(f"\n{len(chunks)} chunk(s), {EMBEDDING_MODEL} at {MODEL_DIMENSIONS} dimensions")
+    print(f"\n{'Method':<10} {'Dims':>5} {'Recall':>7} {'MRR':>6} {'Overlap':>8} "
+          f"{'B/vec':>7} {'Corpus MB':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    print("-" * 78)
+    for r in rows:
+        print(f"{r['method']:<10} {r['dimensions']:>5} {r['recall']:>7.3f} {r['mrr']:>6.3f} "
+              f"{r['overlap']:>8.3f} {r['bytes_per_vector']:>7} {r['corpus_mb']:>10.2f} "
+              f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate embedding size vs. recall.")
+    parser.add_argument("--questions", default=QUESTIONS_PATH,
+                        help=f"question set JSONL (default: {QUESTIONS_PATH})")
+    parser.add_argument("--dimensions", default="1536,1024,768,512,256,128",
+                        help="comma-separated sizes to compare")
+    parser.add_argument("--methods", default=",".join(METHODS),
+                        help=f"comma-separated reductions (default: {','.join(METHODS)})")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=0, help="evaluate only the first N questions")
+    parser.add_argument("--output", default=None,
+                        help="report path (default: eval_results/dimensions_<time>.json)")
+    args = parser.parse_args()
+
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+    unknown = [m for m in methods if m not in METHODS]
+    if unknown:
+        parser.error(f"unknown method(s) {unknown}; choose from {list(METHODS)}")
+    sizes = sorted({int(d) for d in args.dimensions.split(",")}, reverse=True)
+
+    chunks, doc_vectors, skipped = load_corpus(JobLedger())
+    if not chunks:
+        print(f"No {MODEL_DIMENSIONS}-dimension chunk vectors in the ledger; "
+              "run step2 with EMBEDDING_REDUCTION=none first.")
+        return
+    if skipped:
+        print(f"Skipping {skipped} chunk(s) stored at a reduced size")
+
+    questions = load_questions(args.questions)
+    if args.limit:
+        questions = questions[:args.limit]
+
+    import step3_query
+
+    print("=" * 50)
+    print(f"EMBEDDING SIZE EVALUATION: {len(questions)} question(s), {len(chunks)} chunk(s)")
+    print("=" * 50)
+    query_vectors = np.asarray([step3_query.get_embedding(q["question"], native=True)
+                                for q in questions], dtype=np.float32)
+    rows = evaluate(chunks, doc_vectors, questions, query_vectors, methods, sizes, args.top_k)
+    print_report(rows, chunks)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "model": EMBEDDING_MODEL,
+        "questions_file": args.questions,
+        "questions": len(questions),
+        "chunks": len(chunks),
+        "results": rows,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"dimensions_{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+eval_retrieval.py
+
+Retrieval quality + latency evaluation for the search step of the RAG
+pipeline (step3_query.search_documents).
+
+A question set is a JSONL file, one question per line:
+    {"question": "...", "field": "agent_name", "answers": ["Maria E. Castellano"],
+     "source_file": "IL_....pdf.md", "expected_chunks": [0, 3], "source_chunks": 9}
+
+--build derives one from the field values in extraction_metrics/*_fields.json
+(step5) and/or ground_truth/*.json (generate_poa_corpus.py). The expected
+chunks are the indexed chunks of the source document that contain the
+answer text, read from the job ledger (or re-chunked from extracted/).
+
+Each retrieval configuration (hybrid + semantic reranker, hybrid, vector
+only, keyword only, small-to-big passages) is scored on every question:
+  recall@k   share of the expected chunks retrieved (the document itself
+             when the answer could not be located in a chunk)
+  hit@k      the source document appears at all
+  MRR        reciprocal rank of the first answer-bearing chunk
+  nDCG@k     graded: 2 = answer-bearing chunk, 1 = other chunk of the source
+alongside per-query search latency (p50/p95, plus the one-off query
+embedding) and token cost: query embedding tokens and the context tokens
+the retrieved chunks would add to the chat prompt.
+
+Results are written to eval_results/ as JSON; pass --baseline to print the
+change against an earlier run, e.g. before and after a chunk_text change.
+
+Usage:
+    python eval_retrieval.py --build
+    python eval_retrieval.py --build --truth-dir ground_truth --max-per-doc 5
+    python eval_retrieval.py
+    python eval_retrieval.py --configs hybrid-semantic,vector --top-k 3,5,10
+    python eval_retrieval.py --baseline eval_results/retrieval_20250301-120000.json
+"""
+
+import os
+import re
+import json
+import math
+import glob
+import time
+import random
+import argparse
+from datetime import datetime
+
+from tracing import percentile
+from rate_limiter import estimate_tokens
+
+QUESTIONS_PATH = os.environ.get("EVAL_QUESTIONS_PATH", "eval_questions.jsonl")
+RESULTS_DIR = "eval_results"
+
+CONFIGS = {
+    "hybrid-semantic": {"mode": "hybrid", "semantic": True},    # step3 chunk search
+    "hybrid": {"mode": "hybrid", "semantic": False},
+    "vector": {"mode": "vector", "semantic": False},
+    "keyword": {"mode": "keyword", "semantic": False},
+    # child passages expanded to a window of their parent chunk (step3 default)
+    "small-to-big": {"mode": "hybrid", "semantic": True, "small_to_big": True},
+}
+
+# field: question template ({principal} / {agent} come from the same document)
+QUESTION_TEMPLATES = {
+    "principal_name": "Who is the principal that appointed {agent} as agent?",
+    "principal_address": "What is the address of {principal}?",
+    "agent_name": "Who did {principal} appoint as agent?",
+    "agent_address": "What is the address of the agent appointed by {principal}?",
+    "agent_relationship": "How is the agent related to {principal}?",
+    "successor_agent": "Who is the successor agent in the power of attorney of {principal}?",
+    "governing_statute": "Which statute governs the power of attorney signed by {principal}?",
+    "powers_granted": "What powers were granted to the agent of {principal}?",
+    "effective_date": "When does the power of attorney of {principal} become effective?",
+    "execution_date": "On what date did {principal} sign the power of attorney?",
+    "witness_names": "Who witnessed the power of attorney of {principal}?",
+    "notary_info": "Which notary acknowledged the power of attorney of {principal}?",
+}
+
+
+# -- Question set --
+def field_values(fields):
+    """Flatten step5 ({"found", "value"}) and ground-truth (plain) fields to answer lists."""
+    values = {}
+    for name, entry in fields.items():
+        if isinstance(entry, dict) and "found" in entry:
+            entry = entry.get("value") if entry.get("found") else None
+        if entry in (None, "", "NOT FOUND"):
+            continue
+        if isinstance(entry, dict):
+            entry = [str(v) for v in entry.values() if v]
+        answers = [str(v) for v in entry] if isinstance(entry, list) else [str(entry)]
+        if answers:
+            values[name] = answers
+    return values
+
+
+def load_field_files(metrics_dir, truth_dir):
+    """Yields (source filename, {field: [answers]}) from step5 and corpus outputs."""
+    if metrics_dir:
+        for path in sorted(glob.glob(os.path.join(metrics_dir, "*_fields.json"))):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            filename = os.path.basename(path)[:-len("_fields.json")]
+            yield filename, field_values(data.get("fields", {}))
+    if truth_dir:
+        for path in sorted(glob.glob(os.path.join(truth_dir, "*.json"))):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if "fields" in data and "filename" in data:
+                yield data["filename"], field_values(data["fields"])
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", re.sub(r"[*_#|`]", " ", text or "")).strip().lower()
+
+
+def load_chunks(doc_id, ledger):
+    """The chunks step2 indexed for a document (ledger artifact, else re-chunked)."""
+    chunks = ledger.get_artifact(doc_id, "chunks") if ledger else None
+    if chunks is None:
+        path = os.path.join("extracted", f"{doc_id}.md")
+        if os.path.exists(path):
+            from step2_index import chunk_text
+            with open(path, encoding="utf-8") as f:
+                chunks = chunk_text(f.read())
+    return chunks
+
+
+def answer_chunks(chunks, answers):
+    """Indexes of the chunks that contain any of the answers."""
+    needles = [normalize(a) for a in answers if len(normalize(a)) >= 4]
+    return [i for i, chunk in enumerate(chunks)
+            if any(n in normalize(chunk) for n in needles)]
+
+
+def build_questions(metrics_dir, truth_dir, max_per_doc, seed):
+    from job_ledger import JobLedger
+
+    ledger = JobLedger()
+    rng = random.Random(seed)
+    questions = []
+    for filename, values in load_field_files(metrics_dir, truth_dir):
+        principal = values.get("principal_name", [None])[0]
+        agent = values.get("agent_name", [None])[0]
+        chunks = load_chunks(filename, ledger)
+        if not principal or chunks is None:
+            print(f"  -> Skipping {filename} (no principal name or no indexed chunks)")
+            continue
+
+        fields = [f for f in QUESTION_TEMPLATES if f in values and
+                  (f != "principal_name" or agent)]
+        if max_per_doc:
+            fields = rng.sample(fields, min(max_per_doc, len(fields)))
+        for field in fields:
+            questions.append({
+                "question": QUESTION_TEMPLATES[field].format(principal=principal, agent=agent),
+                "field": field,
+                "answers": values[field],
+                "source_file": f"{filename}.md",
+                "expected_chunks": answer_chunks(chunks, values[field]),
+                "source_chunks": len(chunks),
+            })
+    return questions
+
+
+def load_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# -- Scoring --
+def grade(result, question):
+    expected = question["expected_chunks"]
+    if result["source"] == question["source_file"]:
+        return 2 if not expected or result["chunk_index"] in expected else 1
+    if question["source_file"] in (result.get("shared_by") or ()):
+        # Boilerplate indexed once under another document: its chunk_index is
+        # that document's, so check for the answer in the text instead
+        answered = answer_chunks([result.get("content") or ""], question.get("answers", []))
+        return 2 if not expected or answered else 1
+    return 0
+
+
+def score_query(results, question, k):
+    grades = [grade(r, question) for r in results[:k]]
+    expected = question["expected_chunks"]
+
+    if expected:
+        found = {(r["source"], r["chunk_index"]) for r, g in zip(results, grades) if g == 2}
+        recall = min(1.0, len(found) / len(expected))
+    else:
+        recall = 1.0 if 2 in grades else 0.0
+    first = next((i for i, g in enumerate(grades) if g == 2), None)
+    mrr = 1 / (first + 1) if first is not None else 0.0
+
+    dcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(grades))
+    n_best = max(1, len(expected))
+    n_other = max(0, question.get("source_chunks", n_best) - n_best)
+    ideal = ([2] * n_best + [1] * n_other)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+
+    return {"recall": recall, "hit": 1.0 if any(grades) else 0.0,
+            "mrr": mrr, "ndcg": dcg / idcg if idcg else 0.0}
+
+
+def evaluate(step3, questions, configs, top_ks):
+    """Run every question through every (configuration, k). Returns the report rows."""
+    # One embedding per question, shared by every configuration that needs it
+    vectors, embed_ms = [], []
+    for q in questions:
+        start = time.perf_counter()
+        vectors.append(step3.get_embedding(q["question"]))
+        embed_ms.append((time.perf_counter() - start) * 1000)
+
+    rows = []
+    for name in configs:
+        config = dict(CONFIGS[name])
+        search = step3.search_passages if config.pop("small_to_big", False) \
+            else step3.search_documents
+        for k in top_ks:
+            per_query = []
+            for q, vector in zip(questions, vectors):
+                start = time.perf_counter()
+                results = search(q["question"], top_k=k, query_vector=vector, **config)
+                latency = (time.perf_counter() - start) * 1000
+                scores = score_query(results, q, k)
+                per_query.append(dict(
+                    scores,
+                    question=q["question"],
+                    field=q.get("field"),
+                    latency_ms=round(latency, 2),
+                    context_tokens=estimate_tokens([r["content"] for r in results]),
+                ))
+
+            n = len(per_query) or 1
+            latencies = [p["latency_ms"] for p in per_query]
+            embeds = embed_ms if config["mode"] != "keyword" else []
+            rows.append({
+                "config": name,
+                "top_k": k,
+                "questions": len(per_query),
+                "recall": round(sum(p["recall"] for p in per_query) / n, 4),
+                "hit_rate": round(sum(p["hit"] for p in per_query) / n, 4),
+                "mrr": round(sum(p["mrr"] for p in per_query) / n, 4),
+                "ndcg": round(sum(p["ndcg"] for p in per_query) / n, 4),
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "embed_p50_ms": round(percentile(embeds, 50), 2) if embeds else 0,
+                "embedding_tokens": sum(estimate_tokens(q["question"]) for q in questions)
+                                    if embeds else 0,
+                "context_tokens_mean": round(sum(p["context_tokens"] for p in per_query) / n, 1),
+                "per_query": per_query,
+            })
+            print(f"  -> {name} @ {k}: recall={rows[-1]['recall']} mrr={rows[-1]['mrr']}")
+    return rows
+
+
+# -- Reporting --
+def print_report(rows, baseline=None):
+    previous = {}
+    if baseline:
+        previous = {(r["config"], r["top_k"]): r for r in baseline.get("results", [])}
+
+    print(f"\n{'Config':<16} {'k':>3} {'Recall':>7} {'Hit':>6} {'MRR':>6} {'nDCG':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'Ctx tok':>8}")
+    print("-" * 78)
+    for r in rows:
+        print(f"{r['config']:<16} {r['top_k']:>3} {r['recall']:>7.3f} {r['hit_rate']:>6.3f} "
+              f"{r['mrr']:>6.3f} {r['ndcg']:>6.3f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['context_tokens_mean']:>8.0f}")
+        old = previous.get((r["config"], r["top_k"]))
+        if old:
+            print(f"{'  vs baseline':<20} {r['recall'] - old['recall']:>+7.3f} "
+                  f"{r['hit_rate'] - old['hit_rate']:>+6.3f} {r['mrr'] - old['mrr']:>+6.3f} "
+                  f"{r['ndcg'] - old['ndcg']:>+6.3f} {r['p50_ms'] - old['p50_ms']:>+8.1f} "
+                  f"{r['p95_ms'] - old['p95_ms']:>+8.1f} "
+                  f"{r['context_tokens_mean'] - old['context_tokens_mean']:>+8.0f}")
+
+    by_field = {}
+    best = max(rows, key=lambda r: r["mrr"]) if rows else None
+    if best:
+        for p in best["per_query"]:
+            by_field.setdefault(p["field"], []).append(p["recall"])
+        print(f"\nRecall by field ({best['config']} @ {best['top_k']}):")
+        for field, recalls in sorted(by_field.items(), key=lambda kv: sum(kv[1]) / len(kv[1])):
+            print(f"  {field or '-':<22} {sum(recalls) / len(recalls):.3f}  ({len(recalls)} questions)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency.")
+    parser.add_argument("--build", action="store_true",
+                        help="build the question set from field files instead of evaluating")
+    parser.add_argument("--questions", default=QUESTIONS_PATH,
+                        help=f"question set JSONL (default: {QUESTIONS_PATH})")
+    parser.add_argument("--metrics-dir", default="extraction_metrics",
+                        help="step5 *_fields.json folder used by --build")
+    parser.add_argument("--truth-dir", default=None,
+                        help="generate_poa_corpus.py ground-truth folder used by --build")
+    parser.add_argument("--max-per-doc", type=int, default=0,
+                        help="sample at most this many questions per document (default: all)")
+    parser.add_argument("--limit", type=int, default=0, help="evaluate only the first N questions")
+    parser.add_argument("--configs", default=",".join(CONFIGS),
+                        help=f"comma-separated configurations (default: {','.join(CONFIGS)})")
+    parser.add_argument("--top-k", default="5", help="comma-separated k values (default: 5)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="report path (default: eval_results/retrieval_<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    args = parser.parse_args()
+
+    if args.build:
+        questions = build_questions(args.metrics_dir, args.truth_dir, args.max_per_doc, args.seed)
+        with open(args.questions, "w", encoding="utf-8") as f:
+            for q in questions:
+                f.write(json.dumps(q) + "\n")
+        located = sum(1 for q in questions if q["expected_chunks"])
+        print(f"Wrote {len(questions)} question(s) to {args.questions} "
+              f"({located} with the answer located in a chunk)")
+        return
+
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    unknown = [c for c in configs if c not in CONFIGS]
+    if unknown:
+        parser.error(f"unknown configuration(s) {unknown}; choose from {list(CONFIGS)}")
+    top_ks = [int(k) for k in args.top_k.split(",")]
+
+    questions = load_questions(args.questions)
+    if args.limit:
+        questions = questions[:args.limit]
+
+    import step3_query
+
+    print("=" * 50)
+    print(f"RETRIEVAL EVALUATION: {len(questions)} question(s), "
+          f"{len(configs)} configuration(s), k={args.top_k}")
+    print("=" * 50)
+    rows = evaluate(step3_query, questions, configs, top_ks)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(rows, baseline)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "index": os.environ.get("AZURE_SEARCH_INDEX_NAME"),
+        "questions_file": args.questions,
+        "questions": len(questions),
+        "results": rows,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"retrieval_{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+field_store.py
+
+Local store of the POA fields step5 extracts (extraction_metrics/*_fields.json),
+backed by SQLite (same style as job_ledger.py), and a lookup fast path that
+answers factual questions - "who is the successor agent in the PA durable
+POA?" - straight from it, in milliseconds and without any Azure call.
+
+lookup(question) resolves a question to
+  a field     from the wording ("successor agent", "notary", "signed on" ...)
+  documents   narrowed by state (PA / IL), kind (health care / property or
+              financial), people named in the question, and words that
+              identify a form ("durable", "SERS", "short form" ...)
+and returns the stored values with a citation, or None when the question
+does not resolve cleanly (no field, no document, or too many documents), in
+which case the caller falls back to retrieval + GPT-4o.
+
+step5 reloads the store after each run; query_router.py sends the
+questions lookup() resolves down this path instead of search + GPT-4o.
+
+Usage:
+    python field_store.py load                 # (re)load extraction_metrics/
+    python field_store.py load --dir ground_truth
+    python field_store.py ask "Who is the successor agent in the PA durable POA?"
+    python field_store.py show PA_Durable_Power_of_Attorney.pdf
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+STORE_PATH = os.environ.get("FIELD_STORE_PATH", "ingest_state/fields.db")
+METRICS_DIR = "extraction_metrics"
+MAX_LOOKUP_DOCS = 3   # more matching documents than this -> not a lookup question
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id        TEXT PRIMARY KEY,
+    state         TEXT,
+    kind          TEXT,
+    document_type TEXT,
+    source_path   TEXT,
+    loaded_at     REAL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_state_kind ON documents(state, kind);
+
+CREATE TABLE IF NOT EXISTS fields (
+    doc_id  TEXT NOT NULL,
+    field   TEXT NOT NULL,
+    value   TEXT,
+    found   INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, field)
+);
+CREATE INDEX IF NOT EXISTS idx_fields_field ON fields(field, found);
+CREATE INDEX IF NOT EXISTS idx_fields_value ON fields(field, value COLLATE NOCASE);
+"""
+
+# field: wording that asks for it (checked in order - more specific first)
+FIELD_PATTERNS = [
+    ("successor_agent", r"successor|alternate agent|back-?up agent|second agent"),
+    ("agent_address", r"(address|live|lives|reside)\w*\b.*\bagent|agent'?s? (address|home)"),
+    ("principal_address", r"(address|live|lives|reside)\w*\b.*\bprincipal|principal'?s? (address|home)"),
+    ("agent_relationship", r"relationship|related to|how is the agent"),
+    ("witness_names", r"witness"),
+    ("notary_info", r"notar"),
+    ("governing_statute", r"statute|governing law|governed by|which law|under what law"),
+    ("effective_date", r"effective|take effect|become active"),
+    ("execution_date", r"when (was|did) .*(sign|execut)|date .*(sign|execut)|(signed|executed) on"),
+    ("powers_granted", r"what (powers|authority)|powers (granted|given)|authority (granted|given)"),
+    ("document_type", r"what (kind|type) of (document|form|poa)|document type"),
+    ("principal_name", r"who is the principal|principal'?s? name|name of the principal|who (signed|executed|created)"),
+    ("agent_name", r"who is the agent|agent'?s? name|name of the agent|attorney.in.fact|who (was|is) appointed"
+                   r"|who did .* appoint|who can (act|make)"),
+]
+
+# Shared with step3_query's state fan-out. Matched against the question as
+# typed: "IL" / "Ill." only in capitals, so "if I become ill" is not Illinois
+STATE_PATTERNS = {
+    "PA": r"(?i:\b(pa|penn(sylvania)?|commonwealth)\b)",
+    "IL": r"\bIL\b|\bIll\.|(?i:\billinois\b)",
+}
+KIND_PATTERNS = {
+    "healthcare": r"health|medical|advance directive",
+    "property": r"property|financ|durable|sers|money|bank",
+}
+
+STOPWORDS = set("""a an and are as at be by did do does for form forms from has have in is it
+of on or poa poas power powers attorney the this to was what when where which who whom whose
+with document documents agent agents principal successor""".split())
+
+
+def state_of(doc_id, governing_state):
+    text = f"{governing_state or ''} {doc_id}".lower()
+    if "pennsylvania" in text or doc_id.upper().startswith("PA_"):
+        return "PA"
+    if "illinois" in text or doc_id.upper().startswith("IL_"):
+        return "IL"
+    return None
+
+
+def states_in(question):
+    """The states a question names, in STATE_PATTERNS order."""
+    return [state for state, pattern in STATE_PATTERNS.items() if re.search(pattern, question)]
+
+
+def kind_of(doc_id, document_type):
+    text = f"{document_type or ''} {doc_id}".lower()
+    if re.search(r"health|medical|advance directive", text):
+        return "healthcare"
+    return "property"
+
+
+def field_entries(fields):
+    """step5 ({"found", "value"}) and ground-truth (plain value) fields -> (value, found)."""
+    entries = {}
+    for field, entry in fields.items():
+        if isinstance(entry, dict):
+            value = entry.get("value")
+            found = bool(entry.get("found")) and value not in (None, "", "NOT FOUND", "N/A")
+        else:
+            value = ", ".join(entry) if isinstance(entry, list) else entry
+            found = value not in (None, "", [])
+        entries[field] = (None if value is None else str(value), found)
+    return entries
+
+
+class FieldStore:
+    """SQLite-backed, indexed copy of the extracted POA fields."""
+
+    def __init__(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        self._conn.executescript(SCHEMA)
+
+    def put(self, doc_id, fields, source_path=None):
+        entries = field_entries(fields)
+        governing_state = entries.get("governing_state", (None, False))[0]
+        document_type = entries.get("document_type", (None, False))[0]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents "
+                    "(doc_id, state, kind, document_type, source_path, loaded_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc_id, state_of(doc_id, governing_state), kind_of(doc_id, document_type),
+                     document_type, source_path, time.time()),
+                )
+                self._conn.execute("DELETE FROM fields WHERE doc_id = ?", (doc_id,))
+                self._conn.executemany(
+                    "INSERT INTO fields (doc_id, field, value, found) VALUES (?, ?, ?, ?)",
+                    [(doc_id, field, value, int(found))
+                     for field, (value, found) in entries.items()],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def documents(self, state=None, kind=None):
+        sql, params = "SELECT * FROM documents WHERE 1 = 1", []
+        if state:
+            sql, params = sql + " AND state = ?", params + [state]
+        if kind:
+            sql, params = sql + " AND kind = ?", params + [kind]
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql + " ORDER BY doc_id", params)]
+
+    def values(self, field, doc_ids):
+        """{doc_id: value} for the documents where `field` was found."""
+        marks = ",".join("?" * len(doc_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_id, value FROM fields WHERE field = ? AND found = 1 "
+                f"AND doc_id IN ({marks})", [field, *doc_ids]
+            ).fetchall()
+        return {r["doc_id"]: r["value"] for r in rows}
+
+    def people(self):
+        """{doc_id: "principal agent successor" names} used to match names in questions."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, GROUP_CONCAT(value, ' ') AS names FROM fields "
+                "WHERE found = 1 AND field IN ('principal_name', 'agent_name', 'successor_agent') "
+                "GROUP BY doc_id"
+            ).fetchall()
+        return {r["doc_id"]: r["names"] or "" for r in rows}
+
+    def fields_of(self, doc_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field, value, found FROM fields WHERE doc_id = ? ORDER BY field", (doc_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """One FieldStore per process, loaded from extraction_metrics/ on first use if empty."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FieldStore()
+            if not _store.count() and os.path.isdir(METRICS_DIR):
+                load_dir(_store, METRICS_DIR)
+        return _store
+
+
+def load_dir(store, directory=METRICS_DIR):
+    """Load every *_fields.json (step5) or *.json ground-truth file in a folder."""
+    paths = glob.glob(os.path.join(directory, "*_fields.json")) or \
+        glob.glob(os.path.join(directory, "*.json"))
+    loaded = 0
+    for path in sorted(paths):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        fields = data.get("fields", data)
+        if not isinstance(fields, dict):
+            continue
+        name = os.path.basename(path)
+        doc_id = name[:-len("_fields.json")] if name.endswith("_fields.json") else name[:-len(".json")]
+        store.put(doc_id, fields, source_path=path)
+        loaded += 1
+    return loaded
+
+
+# -- Lookup --
+def words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def match_field(question):
+    text = question.lower()
+    for field, pattern in FIELD_PATTERNS:
+        if re.search(pattern, text):
+            return field
+    return None
+
+
+def match_documents(store, question):
+    """The documents a question is about (best matches only)."""
+    text = question.lower()
+    state = next(iter(states_in(question)), None)
+    kinds = [k for k, p in KIND_PATTERNS.items() if re.search(p, text)]
+    documents = store.documents(state=state, kind=kinds[0] if len(kinds) == 1 else None)
+    if not documents:
+        return []
+
+    # Names and form-identifying words narrow it further; ties are all kept
+    asked = words(question) - STOPWORDS
+    people = store.people()
+    scores = {}
+    for doc in documents:
+        named = asked & {w for w in words(people.get(doc["doc_id"], "")) if len(w) > 2}
+        described = asked & words(f"{doc['document_type'] or ''} {doc['doc_id'].replace('_', ' ')}")
+        scores[doc["doc_id"]] = 3 * len(named) + len(described)
+    best = max(scores.values())
+    return [doc_id for doc_id, score in scores.items() if score == best]
+
+
+def lookup(question, store=None):
+    """
+    Answer a factual question from the field store. Returns
+    {"field", "answers": [{"doc_id", "value"}], "answer", "latency_ms"} or None.
+    """
+    start = time.perf_counter()
+    field = match_field(question)
+    if field is None:
+        return None
+    store = store or get_store()
+    doc_ids = match_documents(store, question)
+    if not doc_ids or len(doc_ids) > MAX_LOOKUP_DOCS:
+        return None
+    values = store.values(field, doc_ids)
+    if not values:
+        return None
+
+    answers = [{"doc_id": doc_id, "value": values[doc_id]} for doc_id in doc_ids if doc_id in values]
+    label = field.replace("_", " ")
+    lines = [f"{a['value']}  [Source: {a['doc_id']}, {label}]" for a in answers]
+    return {
+        "field": field,
+        "answers": answers,
+        "answer": "\n".join(lines),
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Structured POA field store.")
+    parser.add_argument("command", choices=["load", "ask", "show"])
+    parser.add_argument("arg", nargs="?", help="question (ask) or document (show)")
+    parser.add_argument("--dir", default=METRICS_DIR, help="field files to load")
+    args = parser.parse_args()
+
+    store = FieldStore()
+    if args.command == "load":
+        print(f"Loaded {load_dir(store, args.dir)} document(s) from {args.dir}/ into {STORE_PATH}")
+    elif args.command == "ask" and args.arg:
+        result = lookup(args.arg, get_store())
+        if result is None:
+            print("Not a field lookup (would go to retrieval + GPT-4o)")
+            sys.exit(1)
+        print(f"{result['answer']}\n({result['field']}, {result['latency_ms']} ms)")
+    elif args.command == "show" and args.arg:
+        for row in store.fields_of(args.arg):
+            print(f"  {row['field']:<26} {'' if row['found'] else '(not found) '}{row['value']}")
+    else:
+        parser.print_help()
@@ -0,0 +1,378 @@
+"""
+fingerprints.py
+
+Near-duplicate document detection for the ingest pipeline, so a re-scan or
+re-upload of a POA we already have (a clean PDF and a phone JPEG of the same
+signed form, the same file saved twice) is linked to the document already
+processed instead of being extracted, embedded and indexed again.
+
+Two fingerprints per document, kept in SQLite (same style as job_ledger.py):
+  image  a 64-bit difference hash (dHash) of every page, taken in step1
+         before extraction - pages are rendered small and grayscale, so
+         JPEG noise, scan contrast and resolution barely move it. A document
+         whose pages are all within IMAGE_HASH_DISTANCE bits of an indexed
+         document's is not sent to Document Intelligence at all.
+         Needs Pillow, and pypdfium2 or pdf2image for PDFs (plus pypdf for
+         their text layer); without them only the text fingerprint is used.
+  text   a 64-bit SimHash of the extracted Markdown's word 3-grams, taken in
+         step2 before chunking. Catches duplicates the image hash cannot
+         (different layout, a re-typed copy, OCR of a skewed scan): within
+         TEXT_HASH_DISTANCE bits of a document that is already uploaded,
+         it is not chunked, embedded or uploaded (match and link are one
+         transaction, so concurrent copies never link to each other).
+Filled copies of one template (different principal, same form) are close
+on both hashes, so a match is only linked when the filled-in values - names,
+dates, addresses, numbers - also agree (VALUE_OVERLAP). Scans have no text
+to check before extraction: an image match on a scan is only reported, and
+the text fingerprint decides after extraction.
+
+Each duplicate is linked to the canonical document of its cluster (the
+first one indexed); `python fingerprints.py` reports the clusters.
+A changed file is fingerprinted again when the ledger sends it back through.
+
+Usage:
+    python fingerprints.py                     # duplicate clusters
+    python fingerprints.py unlink <doc_id>     # process a linked document normally
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+FINGERPRINT_PATH = os.environ.get("FINGERPRINT_PATH", "ingest_state/fingerprints.db")
+DEDUP_DOCUMENTS = os.environ.get("DEDUP_DOCUMENTS", "1") == "1"
+IMAGE_HASH_DISTANCE = int(os.environ.get("IMAGE_HASH_DISTANCE", "10"))   # of 64 bits, per page
+TEXT_HASH_DISTANCE = int(os.environ.get("TEXT_HASH_DISTANCE", "6"))      # of 64 bits, max 7
+MAX_HASH_PAGES = 20      # long packets are compared on their first pages only
+RENDER_DPI = 36
+MIN_TEXT_WORDS = 30      # near-empty extractions are never linked
+VALUE_OVERLAP = float(os.environ.get("VALUE_OVERLAP", "0.8"))  # Jaccard of filled-in values
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id       TEXT PRIMARY KEY,
+    page_hashes  TEXT,
+    pages        INTEGER,
+    simhash      TEXT,
+    value_tokens TEXT,
+    chars        INTEGER,
+    canonical_id TEXT,
+    method       TEXT,
+    distance     INTEGER,
+    updated_at   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_pages ON documents(pages);
+CREATE INDEX IF NOT EXISTS idx_documents_canonical ON documents(canonical_id);
+
+-- The SimHash split into 8-bit blocks: two hashes within 7 bits share one
+CREATE TABLE IF NOT EXISTS blocks (
+    position  INTEGER NOT NULL,
+    value     INTEGER NOT NULL,
+    doc_id    TEXT NOT NULL,
+    PRIMARY KEY (position, value, doc_id)
+);
+CREATE INDEX IF NOT EXISTS idx_blocks_doc ON blocks(doc_id);
+"""
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# -- Image fingerprint --
+def page_images(filepath):
+    """Every page as a PIL image (PDFs via pypdfium2, else pdf2image), or None."""
+    from PIL import Image, ImageSequence
+
+    if filepath.lower().endswith(".pdf"):
+        try:
+            import pypdfium2
+            pdf = pypdfium2.PdfDocument(filepath)
+            try:
+                return [pdf[i].render(scale=RENDER_DPI / 72).to_pil()
+                        for i in range(min(len(pdf), MAX_HASH_PAGES))]
+            finally:
+                pdf.close()
+        except ImportError:
+            pass
+        try:
+            from pdf2image import convert_from_path
+            return convert_from_path(filepath, dpi=RENDER_DPI, last_page=MAX_HASH_PAGES)
+        except ImportError:
+            return None
+    try:
+        with Image.open(filepath) as image:
+            return [frame.copy() for frame, _ in
+                    zip(ImageSequence.Iterator(image), range(MAX_HASH_PAGES))]
+    except OSError:
+        return None   # not an image (e.g. .docx)
+
+
+def dhash(image, size=8):
+    """Difference hash: is each pixel brighter than its right neighbour (9x8 grayscale)."""
+    from PIL import Image, ImageOps
+
+    gray = ImageOps.autocontrast(image.convert("L"))
+    pixels = list(gray.resize((size + 1, size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left, right = pixels[row * (size + 1) + col], pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def image_fingerprint(filepath):
+    """Per-page dHashes, or None when the file can't be rendered here."""
+    try:
+        images = page_images(filepath)
+    except ImportError:
+        return None
+    except Exception as e:
+        # Best effort: an unreadable file is left to Document Intelligence to judge
+        print(f"  -> Could not fingerprint {os.path.basename(filepath)}: {e}")
+        return None
+    if not images:
+        return None
+    return [dhash(image) for image in images]
+
+
+# -- Text fingerprint --
+def normalized_words(text):
+    # Markdown markup, page-break comments and table rules are not content
+    text = re.sub(r"<!--.*?-->", " ", text, flags=re.S)
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def simhash(text, width=3):
+    """64-bit SimHash of the word 3-grams, or None for near-empty text."""
+    words = normalized_words(text)
+    if len(words) < MIN_TEXT_WORDS:
+        return None
+    counts = [0] * 64
+    for i in range(len(words) - width + 1):
+        h = int.from_bytes(hashlib.blake2b(" ".join(words[i:i + width]).encode(),
+                                           digest_size=8).digest(), "little")
+        for bit in range(64):
+            counts[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if counts[bit] > 0)
+
+
+def value_tokens(text):
+    """
+    What a filled copy of a template has of its own: tokens with digits
+    (dates, zip codes, phone numbers) and proper nouns (capitalized words
+    that never appear in lower case in the text). Hashed, as a set.
+    """
+    text = re.sub(r"<!--.*?-->", " ", text, flags=re.S)
+    lower = set(re.findall(r"\b[a-z]+\b", text))
+    tokens = {w.lower() for w in re.findall(r"\b\w*\d\w*\b", text) if len(w) > 1}
+    tokens.update(w.lower() for w in re.findall(r"\b[A-Z][a-z]+\b", text) if w.lower() not in lower)
+    return {hashlib.blake2b(t.encode(), digest_size=4).hexdigest() for t in tokens}
+
+
+def same_values(tokens_a, tokens_b, threshold=VALUE_OVERLAP):
+    union = tokens_a | tokens_b
+    return not union or len(tokens_a & tokens_b) / len(union) >= threshold
+
+
+def pdf_text_layer(filepath):
+    """The embedded text of a born-digital PDF (pypdf), or None for scans."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    text = "\n".join(page.extract_text() or "" for page in PdfReader(filepath).pages)
+    return text if len(normalized_words(text)) >= MIN_TEXT_WORDS else None
+
+
+def blocks(value):
+    return [(value >> (8 * i)) & 0xFF for i in range(8)]
+
+
+class FingerprintStore:
+    """SQLite-backed fingerprints and duplicate links, one row per document."""
+
+    def __init__(self, path=FINGERPRINT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        self._conn.executescript(SCHEMA)
+
+    def _upsert(self, doc_id, **values):
+        with self._lock:
+            self._upsert_locked(doc_id, values)
+
+    def _upsert_locked(self, doc_id, values):
+        values["updated_at"] = time.time()
+        columns = ", ".join(values)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in values)
+        self._conn.execute(
+            f"INSERT INTO documents (doc_id, {columns}) "
+            f"VALUES (?, {', '.join('?' * len(values))}) "
+            f"ON CONFLICT(doc_id) DO UPDATE SET {updates}",
+            (doc_id, *values.values()),
+        )
+
+    def canonical_of(self, doc_id):
+        """Follow links to the document that was actually processed."""
+        seen = set()
+        with self._lock:
+            while doc_id not in seen:
+                seen.add(doc_id)
+                row = self._conn.execute("SELECT canonical_id FROM documents WHERE doc_id = ?",
+                                         (doc_id,)).fetchone()
+                if row is None or not row["canonical_id"]:
+                    break
+                doc_id = row["canonical_id"]
+        return doc_id
+
+    def link(self, doc_id, canonical_id, method, distance):
+        self._upsert(doc_id, canonical_id=self.canonical_of(canonical_id),
+                     method=method, distance=distance)
+
+    def unlink(self, doc_id):
+        self._upsert(doc_id, canonical_id=None, method=None, distance=None)
+
+    # -- Image side (step1) --
+    def match_image(self, doc_id, page_hashes, text_layer=None, max_distance=IMAGE_HASH_DISTANCE):
+        """
+        Record the page hashes of `doc_id` and find the closest indexed
+        document with the same page count whose every page is within
+        `max_distance`. Returns {"doc_id", "distance", "verified"} or None;
+        "verified" means `text_layer` carries the same filled-in values.
+        """
+        self._upsert(doc_id, page_hashes=json.dumps(page_hashes), pages=len(page_hashes),
+                     canonical_id=None, method=None, distance=None)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, page_hashes, value_tokens FROM documents "
+                "WHERE pages = ? AND doc_id != ? AND canonical_id IS NULL "
+                "AND value_tokens IS NOT NULL",
+                (len(page_hashes), doc_id),
+            ).fetchall()
+        tokens = value_tokens(text_layer) if text_layer else None
+        best = None
+        for row in rows:
+            distance = max(hamming(a, b) for a, b in zip(page_hashes, json.loads(row["page_hashes"])))
+            if distance > max_distance:
+                continue
+            verified = tokens is not None and same_values(tokens, set(json.loads(row["value_tokens"])))
+            if best is None or (verified, -distance) > (best["verified"], -best["distance"]):
+                best = {"doc_id": row["doc_id"], "distance": distance, "verified": verified}
+        return best
+
+    # -- Text side (step2) --
+    def match_text(self, doc_id, text, indexed, max_distance=TEXT_HASH_DISTANCE):
+        """
+        Record the SimHash of `doc_id` and link it to the closest other
+        document within `max_distance` that has the same filled-in values and
+        is already indexed (`indexed(doc_id)` is true). Matching and linking
+        are one transaction, so two workers on identical documents cannot link
+        to each other (or to a copy nobody indexed). Returns {"doc_id",
+        "distance"} of the canonical document, or None.
+        """
+        value = simhash(text)
+        if value is None:
+            return None
+        tokens = value_tokens(text)
+        parts = list(enumerate(blocks(value)))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._upsert_locked(doc_id, {
+                    "simhash": f"{value:016x}", "chars": len(text),
+                    "value_tokens": json.dumps(sorted(tokens)),
+                    "canonical_id": None, "method": None, "distance": None})
+                self._conn.execute("DELETE FROM blocks WHERE doc_id = ?", (doc_id,))
+                self._conn.executemany(
+                    "INSERT INTO blocks (position, value, doc_id) VALUES (?, ?, ?)",
+                    [(position, part, doc_id) for position, part in parts])
+                # Pigeonhole: within 7 bits of each other means at least one identical block
+                rows = self._conn.execute(
+                    "SELECT DISTINCT d.doc_id, d.simhash, d.value_tokens FROM blocks b "
+                    "JOIN documents d ON d.doc_id = b.doc_id "
+                    "WHERE (b.position, b.value) IN (VALUES "
+                    + ", ".join(["(?, ?)"] * len(parts)) + ") "
+                    "AND d.doc_id != ? AND d.canonical_id IS NULL",
+                    (*[x for pair in parts for x in pair], doc_id),
+                ).fetchall()
+                best = None
+                for row in rows:
+                    distance = hamming(value, int(row["simhash"], 16))
+                    if distance > max_distance or \
+                            not same_values(tokens, set(json.loads(row["value_tokens"]))):
+                        continue
+                    if (best is None or distance < best["distance"]) and indexed(row["doc_id"]):
+                        best = {"doc_id": row["doc_id"], "distance": distance}
+                if best:
+                    self._conn.execute(
+                        "UPDATE documents SET canonical_id = ?, method = 'text', distance = ? "
+                        "WHERE doc_id = ?", (best["doc_id"], best["distance"], doc_id))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return best
+
+    # -- Reporting --
+    def clusters(self):
+        """{canonical_id: [{"doc_id", "method", "distance"}]} for documents with duplicates."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, canonical_id, method, distance FROM documents "
+                "WHERE canonical_id IS NOT NULL ORDER BY canonical_id, doc_id"
+            ).fetchall()
+        clusters = {}
+        for row in rows:
+            clusters.setdefault(row["canonical_id"], []).append(
+                {"doc_id": row["doc_id"], "method": row["method"], "distance": row["distance"]})
+        return clusters
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """One FingerprintStore per process."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FingerprintStore()
+        return _store
+
+
+def print_clusters(store):
+    clusters = store.clusters()
+    duplicates = sum(len(members) for members in clusters.values())
+    print(f"\n{store.count()} fingerprinted document(s), {duplicates} duplicate(s) "
+          f"in {len(clusters)} cluster(s)")
+    for canonical, members in clusters.items():
+        print(f"\n  {canonical}")
+        for m in members:
+            print(f"    = {m['doc_id']}  ({m['method']}, {m['distance']} bit(s) apart)")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "clusters"
+    store = get_store()
+    if command == "clusters":
+        print_clusters(store)
+    elif command == "unlink" and len(sys.argv) > 2:
+        store.unlink(sys.argv[2])
+        print(f"{sys.argv[2]} unlinked; run 'python job_ledger.py reset {sys.argv[2]}' "
+              "to process it.")
+    else:
+        print(__doc__)
@@ -0,0 +1,433 @@
+"""
+generate_poa_corpus.py
+
+Generates a large synthetic Power of Attorney corpus from the four
+templates in generate_poa_documents.py (PA financial, PA health care,
+IL property, IL health care), with randomized parties, addresses, dates
+and struck-out powers, plus a ground-truth JSON of the expected field
+values for every document.
+
+The ground truth uses the same 16 fields that step5_extraction_metrics.py
+asks GPT-4o to find, so extraction and retrieval accuracy can be scored
+against known answers.
+
+Optionally a fraction of the documents are degraded into "scans"
+(rasterized, skewed, blurred, speckled, JPEG-compressed and written back
+as an image-only PDF). Rasterizing needs pypdfium2 or pdf2image; without
+either one the clean PDF is kept.
+
+Documents are rendered in parallel across processes. Every document is
+derived from (--seed, index), so a corpus is reproducible and can be
+grown later with --start.
+
+Usage:
+    pip install reportlab pillow pypdfium2
+    python generate_poa_corpus.py --count 10000 --workers 8
+    python generate_poa_corpus.py --count 500 --scan-rate 0.3 --output docs
+    python generate_poa_corpus.py --count 1000 --templates PA_Financial,IL_Property
+
+Output:
+    <output>/SYN_000000_PA_Financial.pdf, ...
+    <truth-dir>/SYN_000000_PA_Financial.pdf.json, ...
+    <truth-dir>/manifest.jsonl         (one line per document)
+"""
+
+import os
+import io
+import json
+import time
+import random
+import argparse
+from datetime import date, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import generate_poa_documents as templates
+
+# ─── Name and Address Pools ──────────────────────────────────────────────────
+
+FEMALE_FIRST = ["Margaret", "Patricia", "Jennifer", "Linda", "Susan", "Karen", "Nancy",
+                "Lisa", "Maria", "Sandra", "Donna", "Carol", "Michelle", "Angela",
+                "Rebecca", "Teresa", "Diane", "Janet", "Helen", "Rosa", "Aisha", "Mei"]
+MALE_FIRST = ["Robert", "Thomas", "David", "Michael", "James", "William", "Richard",
+              "Joseph", "Charles", "Anthony", "Daniel", "Mark", "Steven", "Paul",
+              "Kenneth", "George", "Edward", "Frank", "Raymond", "Luis", "Omar", "Wei"]
+LAST_NAMES = ["Whitfield", "Castellano", "Donovan", "Kowalski", "Thompson", "Rodriguez",
+              "Okonkwo", "Harrington", "Ferraro", "Nowak", "Marchetti", "Sullivan",
+              "Novak", "Brennan", "Washington", "Park", "Nguyen", "Patel", "Schmidt",
+              "O'Connor", "Jablonski", "Moretti", "Kim", "Alvarez", "Fitzgerald",
+              "Lindqvist", "Adeyemi", "Kaczmarek", "Russo", "Hoffman"]
+STREETS = ["Elmhurst Drive", "Oakmont Boulevard", "Cherry Lane", "Pine Street",
+           "Walnut Street", "North Lakewood Avenue", "West Barry Avenue",
+           "South Ridgeland Avenue", "West Diversey Parkway", "Maple Avenue",
+           "Chestnut Street", "Lincoln Highway", "Market Street", "Spruce Street",
+           "West Belmont Avenue", "North Clark Street", "Forbes Avenue", "Locust Lane"]
+
+# state: [(city, county, zip prefix)]
+CITIES = {
+    "PA": [("Philadelphia", "PHILADELPHIA", "191"), ("Pittsburgh", "ALLEGHENY", "152"),
+           ("Harrisburg", "DAUPHIN", "171"), ("Allentown", "LEHIGH", "181"),
+           ("Erie", "ERIE", "165"), ("Scranton", "LACKAWANNA", "185"),
+           ("Lancaster", "LANCASTER", "176")],
+    "IL": [("Chicago", "COOK", "606"), ("Oak Park", "COOK", "603"),
+           ("Evanston", "COOK", "602"), ("Naperville", "DUPAGE", "605"),
+           ("Springfield", "SANGAMON", "627"), ("Peoria", "PEORIA", "616"),
+           ("Rockford", "WINNEBAGO", "611")],
+}
+STATE_NAMES = {"PA": "Pennsylvania", "IL": "Illinois"}
+AREA_CODES = {"PA": ["215", "267", "412", "717", "610", "814"],
+              "IL": ["312", "773", "708", "630", "217", "309"]}
+
+RELATIONSHIPS = {"F": ["Daughter", "Sister", "Niece", "Friend"],
+                 "M": ["Son", "Brother", "Nephew", "Friend"]}
+SPOUSE = "Spouse"
+
+# ─── Templates ───────────────────────────────────────────────────────────────
+# name (see generate_poa_documents.GENERATORS): (state, document type, governing statute)
+
+TEMPLATES = {
+    "PA_Financial": ("PA", "DURABLE GENERAL POWER OF ATTORNEY", "20 Pa.C.S. Chapter 56"),
+    "PA_Healthcare": ("PA", "HEALTH CARE POWER OF ATTORNEY", "20 Pa.C.S. Sections 5451-5465"),
+    "IL_Property": ("IL", "ILLINOIS STATUTORY SHORT FORM POWER OF ATTORNEY FOR PROPERTY",
+                    "755 ILCS 45/3-3"),
+    "IL_Healthcare": ("IL", "ILLINOIS STATUTORY SHORT FORM POWER OF ATTORNEY FOR HEALTH CARE",
+                      "755 ILCS 45/4-10"),
+}
+
+HEALTHCARE_POWERS = {
+    "PA_Healthcare": ["Consent to or refuse medical treatment",
+                      "Admission to and discharge from facilities",
+                      "Access to medical records (HIPAA)",
+                      "Retain and dismiss health care providers",
+                      "Pain relief and palliative care",
+                      "Organ donation and disposition of remains"],
+    "IL_Healthcare": ["All decisions concerning personal care, medical treatment and hospitalization",
+                      "Require, withhold or withdraw medical treatment",
+                      "Access to medical records (HIPAA)",
+                      "Organ and tissue donation",
+                      "Disposition of remains"],
+}
+
+# Signature blocks besides the witnesses: principal, notary, agent acceptance
+FIXED_SIGNATURES = {"PA_Financial": 3, "PA_Healthcare": 1,
+                    "IL_Property": 3, "IL_Healthcare": 3}
+
+EFFECTIVE = {
+    "PA_Financial": None,     # effective immediately upon execution
+    "PA_Healthcare": "Upon determination of incapacity by attending physician",
+    "IL_Property": None,
+    "IL_Healthcare": "Upon inability to make or communicate health care decisions",
+}
+
+
+# ─── Random Parties ──────────────────────────────────────────────────────────
+
+def random_name(rng, sex, last=None):
+    first = rng.choice(FEMALE_FIRST if sex == "F" else MALE_FIRST)
+    return f"{first} {rng.choice('ABCDEFGHJKLMNPRSTW')}. {last or rng.choice(LAST_NAMES)}"
+
+
+def random_address(rng, state, long_state=True):
+    """Returns (full address, short address, county)."""
+    city, county, zip_prefix = rng.choice(CITIES[state])
+    street = f"{rng.randint(100, 9899)} {rng.choice(STREETS)}"
+    if rng.random() < 0.2:
+        street += rng.choice([f", Apt. {rng.randint(1, 20)}{rng.choice('ABCD')}",
+                              f", Unit {rng.randint(1, 12)}"])
+    zip_code = f"{zip_prefix}{rng.randint(0, 99):02d}"
+    full = f"{street}, {city}, {STATE_NAMES[state] if long_state else state} {zip_code}"
+    short = f"{street.split(',')[0]}, {city}, {state} {zip_code}"
+    return full, short, county
+
+
+def random_phone(rng, state):
+    return f"({rng.choice(AREA_CODES[state])}) 555-{rng.randint(0, 9999):04d}"
+
+
+def random_party(rng, state, relationship=None, family_name=None, address=None):
+    sex = rng.choice("FM")
+    relationship = relationship or rng.choice(RELATIONSHIPS[sex])
+    last = family_name if relationship != "Friend" else None
+    name = random_name(rng, sex, last)
+    first, middle, last_name = name.split(" ", 2)
+    handle = (first[0] + middle[0] + last_name.replace("'", "")).lower()
+    return {
+        "name": name,
+        "relationship": relationship,
+        "address": address or random_address(rng, state)[0],
+        "phone": random_phone(rng, state),
+        "email": f"{handle}@email.example.com",
+    }
+
+
+def random_date(rng):
+    start = date(2018, 1, 1)
+    return start + timedelta(days=rng.randint(0, (date(2025, 12, 31) - start).days))
+
+
+def random_data(rng, state, template):
+    """Build a data dict shaped like PA_SAMPLE / IL_SAMPLE."""
+    sex = rng.choice("FM")
+    family = rng.choice(LAST_NAMES)
+    name = random_name(rng, sex, family)
+    address, short_address, county = random_address(rng, state)
+    signed = random_date(rng)
+    born = signed - timedelta(days=365 * rng.randint(45, 90) + rng.randint(0, 364))
+
+    principal = {
+        "name": name,
+        "address": address,
+        "property_address": short_address,
+        "born": templates.long_date(born),
+        "ssn_last4": f"{rng.randint(0, 9999):04d}",
+        "initials": ".".join(part[0] for part in name.replace(".", "").split()) + ".",
+        "family_name": family,
+        "she": "she" if sex == "F" else "he",
+        "her": "her" if sex == "F" else "his",
+    }
+
+    # Spouses share the principal's address
+    if rng.random() < 0.5:
+        agent = random_party(rng, state, SPOUSE, family, address)
+    else:
+        agent = random_party(rng, state, family_name=family)
+    successor = random_party(rng, state, family_name=family)
+    second = random_party(rng, state, family_name=family)
+
+    witnesses = []
+    for _ in range(2 if state == "PA" else 1):
+        witnesses.append({"name": random_name(rng, rng.choice("FM")),
+                          "address": random_address(rng, state, long_state=False)[1]})
+
+    expires = date(signed.year + rng.randint(1, 4), rng.randint(1, 12), rng.randint(1, 28))
+    notary_id = (f"{signed.year - rng.randint(0, 6)}-PA-{rng.randint(0, 999999):06d}" if state == "PA"
+                 else f"{signed.year - rng.randint(0, 4)}-IL-NP-{rng.randint(0, 999999):06d}")
+
+    struck = []
+    if template == "PA_Financial" and rng.random() < 0.4:
+        codes = [code for code, _, _ in templates.PA_FINANCIAL_POWERS]
+        struck = sorted(rng.sample(codes, rng.randint(1, 3)))
+    elif template == "IL_Property" and rng.random() < 0.4:
+        codes = [code for code, _ in templates.IL_PROPERTY_POWERS]
+        struck = sorted(rng.sample(codes, rng.randint(1, 4)))
+
+    return {
+        "principal": principal,
+        "agent": agent,
+        "successor": successor,
+        "second_successor": second,
+        "healthcare_successor": second if rng.random() < 0.7 else successor,
+        "witnesses": witnesses,
+        "notary": {"name": random_name(rng, rng.choice("FM")),
+                   "expires": templates.long_date(expires), "id": notary_id},
+        "county": county,
+        "date": signed,
+        "struck_powers": struck,
+    }
+
+
+# ─── Ground Truth ────────────────────────────────────────────────────────────
+
+def ground_truth(template, data):
+    """Expected values for the 16 fields scored by step5_extraction_metrics.py."""
+    state, document_type, statute = TEMPLATES[template]
+    principal = data["principal"]
+    # The PA health care form names the financial successor as the agent
+    if template == "PA_Healthcare":
+        agent, successor = data["successor"], data["agent"]
+    elif template == "IL_Healthcare":
+        agent, successor = data["agent"], data["healthcare_successor"]
+    else:
+        agent, successor = data["agent"], data["successor"]
+
+    struck = data["struck_powers"]
+    if template == "PA_Financial":
+        powers = [title for code, title, _ in templates.PA_FINANCIAL_POWERS if code not in struck]
+    elif template == "IL_Property":
+        powers = [power for code, power in templates.IL_PROPERTY_POWERS if code not in struck]
+    else:
+        powers = HEALTHCARE_POWERS[template]
+
+    notary = data["notary"]
+    if template == "PA_Healthcare":
+        notary_info = None
+    elif template == "IL_Healthcare":
+        notary_info = f"{notary['name']}, Commission Expires: {notary['expires']}"
+    else:
+        label = "Notary ID" if state == "PA" else "Notary Seal No."
+        notary_info = f"{notary['name']}, Commission Expires: {notary['expires']}, {label} {notary['id']}"
+
+    executed = templates.long_date(data["date"])
+    successors = [successor["name"]]
+    if template == "IL_Property":
+        successors.append(data["second_successor"]["name"])
+
+    return {
+        "principal_name": principal["name"],
+        "principal_address": principal["address"],
+        "agent_name": agent["name"],
+        "agent_address": agent["address"],
+        "agent_relationship": agent["relationship"],
+        "successor_agent": successors,
+        "document_type": document_type,
+        "governing_state": STATE_NAMES[state],
+        "governing_statute": statute,
+        "powers_granted": powers,
+        "effective_date": EFFECTIVE[template] or executed,
+        "execution_date": executed,
+        "witness_names": [w["name"] for w in data["witnesses"]],
+        "notary_info": notary_info,
+        "signature_blocks": FIXED_SIGNATURES[template] + len(data["witnesses"]),
+        "checkboxes_or_selections": {"struck_powers": struck} if template in ("PA_Financial", "IL_Property") else None,
+    }
+
+
+# ─── Scan Degradation ────────────────────────────────────────────────────────
+
+def rasterize(pdf_bytes, dpi):
+    """Render every page of an in-memory PDF to a PIL image (pypdfium2, else pdf2image)."""
+    try:
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(pdf_bytes)
+        try:
+            return [page.render(scale=dpi / 72).to_pil() for page in pdf]
+        finally:
+            pdf.close()
+    except ImportError:
+        pass
+    try:
+        from pdf2image import convert_from_bytes
+        return convert_from_bytes(pdf_bytes, dpi=dpi)
+    except ImportError:
+        return None
+
+
+def degrade_page(image, rng):
+    """Make a clean render look like a mediocre office scan."""
+    from PIL import Image, ImageFilter
+
+    page = image.convert("L")
+    page = page.rotate(rng.uniform(-2.5, 2.5), resample=Image.BICUBIC,
+                       expand=False, fillcolor=255)
+    if rng.random() < 0.7:
+        page = page.filter(ImageFilter.GaussianBlur(rng.uniform(0.4, 1.2)))
+
+    # Salt-and-pepper speckle and a slightly grey, uneven background
+    speckle = Image.effect_noise(page.size, rng.uniform(8, 25))
+    page = Image.blend(page, speckle, rng.uniform(0.05, 0.15))
+    contrast = rng.uniform(0.85, 0.95)
+    page = page.point(lambda v: min(255, int(v * contrast) + 10))
+
+    # Round-trip through low-quality JPEG for compression artifacts
+    buf = io.BytesIO()
+    page.save(buf, format="JPEG", quality=rng.randint(25, 60))
+    buf.seek(0)
+    return Image.open(buf).convert("L")
+
+
+def degrade_pdf(pdf_bytes, rng, dpi=150):
+    """Image-only "scanned" version of a PDF, or None if no rasterizer is installed."""
+    pages = rasterize(pdf_bytes, dpi)
+    if pages is None:
+        return None
+    scanned = [degrade_page(page, rng) for page in pages]
+    buf = io.BytesIO()
+    scanned[0].save(buf, format="PDF", resolution=dpi,
+                    save_all=True, append_images=scanned[1:])
+    return buf.getvalue()
+
+
+# ─── Generation ──────────────────────────────────────────────────────────────
+
+def generate_one(job):
+    """Render one synthetic document and write its ground truth. Runs in a worker process."""
+    index, seed, template_names, output_dir, truth_dir, scan_rate = job
+    rng = random.Random(f"{seed}:{index}")
+    template = rng.choice(template_names)
+    state = TEMPLATES[template][0]
+    data = random_data(rng, state, template)
+
+    filename = f"SYN_{index:06d}_{template}.pdf"
+    start = time.perf_counter()
+    # Render and degrade in memory so each document is written to disk once
+    pdf_bytes = templates.render_pdf(template, data)
+    scanned = None
+    if rng.random() < scan_rate:
+        scanned = degrade_pdf(pdf_bytes, rng)
+    with open(os.path.join(output_dir, filename), "wb") as f:
+        f.write(scanned or pdf_bytes)
+
+    record = {
+        "filename": filename,
+        "template": template,
+        "index": index,
+        "seed": seed,
+        "scanned": scanned is not None,
+        "fields": ground_truth(template, data),
+    }
+    with open(os.path.join(truth_dir, f"{filename}.json"), "w") as f:
+        json.dump(record, f, indent=2)
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic POA corpus with ground truth.")
+    parser.add_argument("--count", type=int, default=100, help="number of documents (default: 100)")
+    parser.add_argument("--start", type=int, default=0,
+                        help="first document index, to grow an existing corpus (default: 0)")
+    parser.add_argument("--seed", type=int, default=42, help="corpus seed (default: 42)")
+    parser.add_argument("--output", default="docs", help="PDF output folder (default: docs)")
+    parser.add_argument("--truth-dir", default="ground_truth",
+                        help="ground-truth JSON folder (default: ground_truth)")
+    parser.add_argument("--templates", default=",".join(TEMPLATES),
+                        help="comma-separated template names (default: all four)")
+    parser.add_argument("--scan-rate", type=float, default=0.0,
+                        help="fraction of documents degraded into scans (default: 0)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    template_names = [t.strip() for t in args.templates.split(",") if t.strip()]
+    unknown = [t for t in template_names if t not in TEMPLATES]
+    if unknown:
+        parser.error(f"unknown template(s) {unknown}; choose from {list(TEMPLATES)}")
+
+    os.makedirs(args.output, exist_ok=True)
+    os.makedirs(args.truth_dir, exist_ok=True)
+
+    print("=" * 55)
+    print(f"  Generating {args.count} synthetic POA documents")
+    print(f"  Templates: {', '.join(template_names)}")
+    print(f"  Workers: {args.workers}   Scan rate: {args.scan_rate:.0%}")
+    print("=" * 55)
+
+    jobs = [(i, args.seed, template_names, args.output, args.truth_dir, args.scan_rate)
+            for i in range(args.start, args.start + args.count)]
+
+    start = time.perf_counter()
+    counts = {t: 0 for t in template_names}
+    scanned = 0
+    manifest_path = os.path.join(args.truth_dir, "manifest.jsonl")
+    with ProcessPoolExecutor(args.workers, initializer=templates.get_styles) as pool, open(manifest_path, "a") as manifest:
+        chunksize = max(1, min(64, args.count // (args.workers * 4) or 1))
+        for n, record in enumerate(pool.map(generate_one, jobs, chunksize=chunksize), 1):
+            counts[record["template"]] += 1
+            scanned += record["scanned"]
+            manifest.write(json.dumps({k: record[k] for k in
+                                       ("filename", "template", "index", "seed", "scanned")}) + "\n")
+            if n % 500 == 0 or n == args.count:
+                elapsed = time.perf_counter() - start
+                print(f"  -> {n}/{args.count} documents ({n / elapsed:.1f} docs/s)")
+
+    elapsed = time.perf_counter() - start
+    print()
+    for template, count in counts.items():
+        print(f"  {template:<15} {count}")
+    if args.scan_rate and scanned == 0:
+        print("  WARNING: no rasterizer found (pip install pypdfium2); no scans were made")
+    print(f"\n  {args.count} documents ({scanned} scanned) in {elapsed:.1f}s "
+          f"-> {args.output}/, ground truth -> {args.truth_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,12 @@ form structure. Uses fictional names and addresses.
 
 These are for TESTING/DEMONSTRATION purposes only — not legal documents.
 
+Each generate_* function takes the party/date data (PA_SAMPLE / IL_SAMPLE by
+default) and an output filename, so generate_poa_corpus.py can render
+randomized variants of the same templates. render_pdf() renders by template
+name, into memory when no filename is given; render_many() spreads
+documents over a process pool. The stylesheet is built once per process.
+
 Usage:
     pip install reportlab
     python generate_poa_documents.py
@@ -19,7 +25,10 @@ Output:
 """
 
 import os
-from datetime import datetime
+import io
+from datetime import date, datetime
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
@@ -30,11 +39,115 @@ from reportlab.platypus import (
 )
 from reportlab.lib import colors
 
-os.makedirs("docs", exist_ok=True)
+# ─── Sample Parties ──────────────────────────────────────────────────────────
+# The fixed sample documents. generate_poa_corpus.py passes randomized
+# dictionaries of the same shape to produce large synthetic corpora.
+
+PA_SAMPLE = {
+    "principal": {
+        "name": "Margaret A. Whitfield",
+        "address": "742 Elmhurst Drive, Apt. 3B, Philadelphia, Pennsylvania 19103",
+        "property_address": "742 Elmhurst Drive, Philadelphia, PA 19103",
+        "born": "June 14, 1958",
+        "ssn_last4": "4728",
+        "she": "she", "her": "her",
+    },
+    "agent": {
+        "name": "Robert J. Whitfield", "relationship": "Son",
+        "address": "1584 Oakmont Boulevard, Pittsburgh, Pennsylvania 15213",
+        "phone": "(412) 555-0193", "email": "rjwhitfield@email.example.com",
+    },
+    "successor": {
+        "name": "Patricia L. Donovan", "relationship": "Daughter",
+        "address": "239 Cherry Lane, Harrisburg, Pennsylvania 17101",
+        "phone": "(717) 555-0847", "email": "pldonovan@email.example.com",
+    },
+    "witnesses": [
+        {"name": "Jennifer M. Kowalski", "address": "891 Pine Street, Philadelphia, PA 19107"},
+        {"name": "David R. Thompson", "address": "4520 Walnut Street, Philadelphia, PA 19139"},
+    ],
+    "notary": {"name": "Anna C. Rodriguez", "expires": "December 31, 2027",
+               "id": "2019-PA-041582"},
+    "county": "PHILADELPHIA",
+    "date": date(2025, 3, 15),
+    "struck_powers": [],
+}
+
+IL_SAMPLE = {
+    "principal": {
+        "name": "Thomas R. Castellano",
+        "address": "2847 North Lakewood Avenue, Chicago, Illinois 60614",
+        "initials": "T.R.C.",
+        "family_name": "Castellano",
+        "she": "he", "her": "his",
+    },
+    "agent": {
+        "name": "Maria E. Castellano", "relationship": "Spouse",
+        "address": "2847 North Lakewood Avenue, Chicago, Illinois 60614",
+        "phone": "(312) 555-0726", "email": "mecastellano@email.example.com",
+    },
+    "successor": {
+        "name": "Anthony D. Castellano", "relationship": "Brother",
+        "address": "519 West Barry Avenue, Unit 4, Chicago, Illinois 60657",
+        "phone": "(312) 555-1394",
+    },
+    "second_successor": {
+        "name": "Lisa K. Ferraro", "relationship": "Sister",
+        "address": "1205 South Ridgeland Avenue, Oak Park, Illinois 60302",
+        "phone": "(708) 555-0215",
+    },
+    "healthcare_successor": {
+        "name": "Lisa K. Ferraro", "relationship": "Sister",
+        "address": "1205 South Ridgeland Avenue, Oak Park, Illinois 60302",
+        "phone": "(708) 555-0215",
+    },
+    "witnesses": [
+        {"name": "Sandra J. Okonkwo", "address": "1120 West Diversey Parkway, Chicago, IL 60614"},
+    ],
+    "notary": {"name": "Michael P. Harrington", "expires": "August 14, 2027",
+               "id": "2022-IL-NP-884210"},
+    "county": "COOK",
+    "date": date(2025, 1, 22),
+    "struck_powers": [],
+}
+
+# ─── Statutory Power Lists ───────────────────────────────────────────────────
+
+PA_FINANCIAL_POWERS = [
+    ("A", "Real Property Transactions", "To buy, sell, lease, exchange, mortgage, grant options, collect rent, and in all ways manage my real property, including but not limited to any residential property located at {property_address}."),
+    ("B", "Tangible Personal Property Transactions", "To buy, sell, lease, exchange, and otherwise manage my tangible personal property, including vehicles, furniture, equipment, and personal effects."),
+    ("C", "Stock, Bond, and Securities Transactions", "To buy, sell, exchange, and manage stocks, bonds, mutual funds, and other securities held in any brokerage or investment account in my name."),
+    ("D", "Banking and Financial Institution Transactions", "To conduct any and all banking transactions, including opening and closing accounts, making deposits and withdrawals, writing checks, accessing safe deposit boxes, and obtaining loans or lines of credit on my behalf."),
+    ("E", "Insurance and Annuity Transactions", "To purchase, modify, surrender, collect benefits from, and make claims under any insurance policies or annuity contracts, whether life, health, disability, casualty, or other type."),
+    ("F", "Retirement Plan Transactions", "To contribute to, withdraw from, change beneficiary designations on, and manage all retirement plans, pensions, IRAs, 401(k) plans, and similar accounts."),
+    ("G", "Tax Matters", "To prepare, sign, file, and amend federal, state, and local tax returns; receive confidential tax information; contest tax assessments; and claim refunds on my behalf."),
+    ("H", "Government Benefits", "To apply for, manage, and maintain eligibility for all government benefits, including Social Security, Medicare, Medicaid, Veterans Affairs benefits, and any other federal, state, or local programs."),
+    ("I", "Legal Actions and Proceedings", "To initiate, defend, settle, or otherwise participate in legal, administrative, or arbitration proceedings on my behalf, and to retain legal counsel as necessary."),
+    ("J", "Personal and Family Maintenance", "To pay for my personal care, support, maintenance, and the maintenance of my dependents from my assets."),
+]
+
+IL_PROPERTY_POWERS = [
+    ("(a)", "Real estate transactions"),
+    ("(b)", "Financial institution transactions"),
+    ("(c)", "Stock and bond transactions"),
+    ("(d)", "Tangible personal property transactions"),
+    ("(e)", "Safe deposit box transactions"),
+    ("(f)", "Insurance and annuity transactions"),
+    ("(g)", "Retirement plan transactions"),
+    ("(h)", "Social Security, employment, and military service benefits"),
+    ("(i)", "Tax matters"),
+    ("(j)", "Claims and litigation"),
+    ("(k)", "Commodity and option transactions"),
+    ("(l)", "Business operations transactions"),
+    ("(m)", "Borrowing transactions"),
+    ("(n)", "Estate transactions"),
+]
 
 # ─── Shared Styles ───────────────────────────────────────────────────────────
 
+@lru_cache(maxsize=None)
 def get_styles():
+    """Build the shared stylesheet once per process; every document reuses it."""
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(
         name="DocTitle", fontSize=14, leading=18, alignment=TA_CENTER,
@@ -75,10 +188,43 @@ def get_styles():
     return styles
 
 
+def long_date(d):
+    """date(2025, 3, 15) -> 'March 15, 2025'"""
+    return f"{d.strftime('%B')} {d.day}, {d.year}"
+
+
+def day_of(d):
+    """date(2025, 3, 15) -> '15th day of March, 2025'"""
+    suffix = "th" if 11 <= d.day % 100 <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(d.day % 10, "th")
+    return f"{d.day}{suffix} day of {d.strftime('%B')}, {d.year}"
+
+
+def party_lines(label, party, email=False):
+    """'<b>Agent:</b> Name (Relationship)<br/>Address: ...<br/>Telephone: ...'"""
+    text = (f"<b>{label}:</b> {party['name']} ({party['relationship']})<br/>"
+            f"Address: {party['address']}<br/>"
+            f"Telephone: {party['phone']}")
+    if email:
+        text += f"<br/>Email: {party['email']}"
+    return text
+
+
 def hr():
     return HRFlowable(width="100%", thickness=1, color=colors.black, spaceBefore=6, spaceAfter=6)
 
 
+def build_pdf(story, filename):
+    """Lay out a story into `filename`, or into memory when filename is None (returns the bytes)."""
+    target = io.BytesIO() if filename is None else filename
+    doc = SimpleDocTemplate(target, pagesize=letter,
+                            topMargin=0.75*inch, bottomMargin=0.75*inch,
+                            leftMargin=1*inch, rightMargin=1*inch)
+    doc.build(story)
+    if filename is None:
+        return target.getvalue()
+    print(f"  Created: {filename}")
+
+
 def signature_block(name, role, date_str, styles):
     """Generate a signature block with a line and typed name."""
     return [
@@ -95,11 +241,9 @@ def signature_block(name, role, date_str, styles):
 # Based on 20 Pa.C.S. Section 5601 et seq.
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generate_pa_financial_poa():
-    filename = "docs/PA_Durable_Power_of_Attorney.pdf"
-    doc = SimpleDocTemplate(filename, pagesize=letter,
-                            topMargin=0.75*inch, bottomMargin=0.75*inch,
-                            leftMargin=1*inch, rightMargin=1*inch)
+def generate_pa_financial_poa(data=PA_SAMPLE, filename="docs/PA_Durable_Power_of_Attorney.pdf"):
+    principal, agent, successor = data["principal"], data["agent"], data["successor"]
+    signed = long_date(data["date"])
     styles = get_styles()
     story = []
 
@@ -148,28 +292,25 @@ def generate_pa_financial_poa():
     ))
     story.append(Spacer(1, 6))
     story.append(Paragraph(
-        "_______________________________ &nbsp;&nbsp;&nbsp;&nbsp; Date: March 15, 2025",
+        f"_______________________________ &nbsp;&nbsp;&nbsp;&nbsp; Date: {signed}",
         styles["BodyText2"]
     ))
-    story.append(Paragraph("Margaret A. Whitfield (Principal)", styles["SmallText"]))
+    story.append(Paragraph(f"{principal['name']} (Principal)", styles["SmallText"]))
     story.append(hr())
 
     # Principal and Agent Designation
     story.append(Paragraph("ARTICLE I: DESIGNATION OF PRINCIPAL AND AGENT", styles["SectionHead"]))
     story.append(Paragraph(
-        "I, <b>Margaret A. Whitfield</b>, of 742 Elmhurst Drive, Apt. 3B, Philadelphia, "
-        "Pennsylvania 19103, born on June 14, 1958, Social Security Number ending in "
-        "XXX-XX-4728, being of sound mind and under no constraint or undue influence, "
+        f"I, <b>{principal['name']}</b>, of {principal['address']}, "
+        f"born on {principal['born']}, Social Security Number ending in "
+        f"XXX-XX-{principal['ssn_last4']}, being of sound mind and under no constraint or undue influence, "
         "do hereby appoint the following individual as my Attorney-in-Fact (hereinafter "
         "referred to as my \"Agent\"):",
         styles["BodyText2"]
     ))
     story.append(Spacer(1, 6))
     story.append(Paragraph(
-        "<b>Primary Agent:</b> Robert J. Whitfield (Son)<br/>"
-        "Address: 1584 Oakmont Boulevard, Pittsburgh, Pennsylvania 15213<br/>"
-        "Telephone: (412) 555-0193<br/>"
-        "Email: rjwhitfield@email.example.com",
+        party_lines("Primary Agent", agent, email=True),
         styles["IndentBody"]
     ))
     story.append(Spacer(1, 6))
@@ -180,9 +321,9 @@ def generate_pa_financial_poa():
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "Patricia L. Donovan (Daughter)<br/>"
-        "Address: 239 Cherry Lane, Harrisburg, Pennsylvania 17101<br/>"
-        "Telephone: (717) 555-0847",
+        f"{successor['name']} ({successor['relationship']})<br/>"
+        f"Address: {successor['address']}<br/>"
+        f"Telephone: {successor['phone']}",
         styles["IndentBody"]
     ))
 
@@ -205,24 +346,12 @@ def generate_pa_financial_poa():
         styles["BodyText2"]
     ))
 
-    powers = [
-        ("A", "Real Property Transactions", "To buy, sell, lease, exchange, mortgage, grant options, collect rent, and in all ways manage my real property, including but not limited to any residential property located at 742 Elmhurst Drive, Philadelphia, PA 19103."),
-        ("B", "Tangible Personal Property Transactions", "To buy, sell, lease, exchange, and otherwise manage my tangible personal property, including vehicles, furniture, equipment, and personal effects."),
-        ("C", "Stock, Bond, and Securities Transactions", "To buy, sell, exchange, and manage stocks, bonds, mutual funds, and other securities held in any brokerage or investment account in my name."),
-        ("D", "Banking and Financial Institution Transactions", "To conduct any and all banking transactions, including opening and closing accounts, making deposits and withdrawals, writing checks, accessing safe deposit boxes, and obtaining loans or lines of credit on my behalf."),
-        ("E", "Insurance and Annuity Transactions", "To purchase, modify, surrender, collect benefits from, and make claims under any insurance policies or annuity contracts, whether life, health, disability, casualty, or other type."),
-        ("F", "Retirement Plan Transactions", "To contribute to, withdraw from, change beneficiary designations on, and manage all retirement plans, pensions, IRAs, 401(k) plans, and similar accounts."),
-        ("G", "Tax Matters", "To prepare, sign, file, and amend federal, state, and local tax returns; receive confidential tax information; contest tax assessments; and claim refunds on my behalf."),
-        ("H", "Government Benefits", "To apply for, manage, and maintain eligibility for all government benefits, including Social Security, Medicare, Medicaid, Veterans Affairs benefits, and any other federal, state, or local programs."),
-        ("I", "Legal Actions and Proceedings", "To initiate, defend, settle, or otherwise participate in legal, administrative, or arbitration proceedings on my behalf, and to retain legal counsel as necessary."),
-        ("J", "Personal and Family Maintenance", "To pay for my personal care, support, maintenance, and the maintenance of my dependents from my assets."),
-    ]
 
-    for letter_code, title, desc in powers:
-        story.append(Paragraph(
-            f"<b>({letter_code}) {title}.</b> {desc}",
-            styles["IndentBody"]
-        ))
+    for letter_code, title, desc in PA_FINANCIAL_POWERS:
+        text = f"<b>({letter_code}) {title}.</b> {desc.format(**principal)}"
+        if letter_code in data["struck_powers"]:
+            text = f"<strike>{text}</strike> (NOT GRANTED)"
+        story.append(Paragraph(text, styles["IndentBody"]))
 
     # Special Instructions
     story.append(Paragraph("ARTICLE IV: SPECIAL INSTRUCTIONS AND LIMITATIONS", styles["SectionHead"]))
@@ -271,9 +400,9 @@ def generate_pa_financial_poa():
     story.append(Paragraph("ARTICLE VI: GUARDIAN NOMINATION", styles["SectionHead"]))
     story.append(Paragraph(
         "If a court decides that it is necessary to appoint a guardian of my estate or "
-        "guardian of my person, I hereby nominate my Agent, Robert J. Whitfield, to serve "
-        "in that capacity. If Robert J. Whitfield is unable or unwilling to serve, I "
-        "nominate Patricia L. Donovan as an alternative guardian.",
+        f"guardian of my person, I hereby nominate my Agent, {agent['name']}, to serve "
+        f"in that capacity. If {agent['name']} is unable or unwilling to serve, I "
+        f"nominate {successor['name']} as an alternative guardian.",
         styles["BodyText2"]
     ))
 
@@ -293,34 +422,34 @@ def generate_pa_financial_poa():
     # Execution
     story.append(Paragraph("EXECUTION", styles["SectionHead"]))
     story.append(Paragraph(
-        "IN WITNESS WHEREOF, I have hereunto set my hand this 15th day of March, 2025.",
+        f"IN WITNESS WHEREOF, I have hereunto set my hand this {day_of(data['date'])}.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Margaret A. Whitfield", "Principal", "March 15, 2025", styles))
+    story.extend(signature_block(principal["name"], "Principal", signed, styles))
 
     # Witnesses
     story.append(Paragraph("WITNESSES", styles["SectionHead"]))
     story.append(Paragraph(
         "The foregoing instrument was signed, sealed, and declared by the above-named "
-        "Principal as her Power of Attorney, in our presence, and we, at her request and "
-        "in her presence and in the presence of each other, have subscribed our names as "
+        f"Principal as {principal['her']} Power of Attorney, in our presence, and we, at "
+        f"{principal['her']} request and in {principal['her']} presence and in the presence of each other, have subscribed our names as "
         "witnesses thereto.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Jennifer M. Kowalski", "Witness #1 - 891 Pine Street, Philadelphia, PA 19107", "March 15, 2025", styles))
-    story.extend(signature_block("David R. Thompson", "Witness #2 - 4520 Walnut Street, Philadelphia, PA 19139", "March 15, 2025", styles))
+    for n, witness in enumerate(data["witnesses"], 1):
+        story.extend(signature_block(witness["name"], f"Witness #{n} - {witness['address']}", signed, styles))
 
     # Notary
     story.append(Paragraph("NOTARY ACKNOWLEDGMENT", styles["SectionHead"]))
     story.append(Paragraph(
         "COMMONWEALTH OF PENNSYLVANIA<br/>"
-        "COUNTY OF PHILADELPHIA",
+        f"COUNTY OF {data['county']}",
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "On this 15th day of March, 2025, before me, a Notary Public, personally appeared "
-        "Margaret A. Whitfield, known to me (or satisfactorily proven) to be the person "
-        "whose name is subscribed to the within instrument, and acknowledged that she "
+        f"On this {day_of(data['date'])}, before me, a Notary Public, personally appeared "
+        f"{principal['name']}, known to me (or satisfactorily proven) to be the person "
+        f"whose name is subscribed to the within instrument, and acknowledged that {principal['she']} "
         "executed the same for the purposes therein contained.",
         styles["BodyText2"]
     ))
@@ -328,7 +457,8 @@ def generate_pa_financial_poa():
         "IN WITNESS WHEREOF, I have hereunto set my hand and notarial seal.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Anna C. Rodriguez", "Notary Public\nMy Commission Expires: December 31, 2027\nNotary ID: 2019-PA-041582", "March 15, 2025", styles))
+    notary = data["notary"]
+    story.extend(signature_block(notary["name"], f"Notary Public\nMy Commission Expires: {notary['expires']}\nNotary ID: {notary['id']}", signed, styles))
 
     # Agent Acknowledgment (required by 20 Pa.C.S. Section 5601(d))
     story.append(PageBreak())
@@ -338,8 +468,8 @@ def generate_pa_financial_poa():
         styles["SmallText"]
     ))
     story.append(Paragraph(
-        "I, Robert J. Whitfield, have read the Power of Attorney dated March 15, 2025, "
-        "and am the person identified as the Agent for the Principal, Margaret A. Whitfield. "
+        f"I, {agent['name']}, have read the Power of Attorney dated {signed}, "
+        f"and am the person identified as the Agent for the Principal, {principal['name']}. "
         "I hereby acknowledge that when I act as Agent:",
         styles["BodyText2"]
     ))
@@ -356,7 +486,7 @@ def generate_pa_financial_poa():
         "authorized by the Principal in the Power of Attorney document.",
         styles["IndentBody"]
     ))
-    story.extend(signature_block("Robert J. Whitfield", "Agent", "March 15, 2025", styles))
+    story.extend(signature_block(agent["name"], "Agent", signed, styles))
 
     story.append(Spacer(1, 12))
     story.append(Paragraph(
@@ -366,8 +496,7 @@ def generate_pa_financial_poa():
         styles["SmallText"]
     ))
 
-    doc.build(story)
-    print(f"  Created: {filename}")
+    return build_pdf(story, filename)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -375,11 +504,10 @@ def generate_pa_financial_poa():
 # Based on 20 Pa.C.S. Section 5451 et seq.
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generate_pa_healthcare_poa():
-    filename = "docs/PA_Healthcare_Power_of_Attorney.pdf"
-    doc = SimpleDocTemplate(filename, pagesize=letter,
-                            topMargin=0.75*inch, bottomMargin=0.75*inch,
-                            leftMargin=1*inch, rightMargin=1*inch)
+def generate_pa_healthcare_poa(data=PA_SAMPLE, filename="docs/PA_Healthcare_Power_of_Attorney.pdf"):
+    # The financial POA's successor agent is the health care agent, and vice versa
+    principal, agent, alternate = data["principal"], data["successor"], data["agent"]
+    signed = long_date(data["date"])
     styles = get_styles()
     story = []
 
@@ -390,24 +518,19 @@ def generate_pa_healthcare_poa():
 
     story.append(Paragraph("PART I: APPOINTMENT OF HEALTH CARE AGENT", styles["SectionHead"]))
     story.append(Paragraph(
-        "I, <b>Margaret A. Whitfield</b>, of 742 Elmhurst Drive, Apt. 3B, Philadelphia, "
-        "Pennsylvania 19103, born June 14, 1958, being of sound mind, willfully and "
+        f"I, <b>{principal['name']}</b>, of {principal['address']}, "
+        f"born {principal['born']}, being of sound mind, willfully and "
         "voluntarily appoint the following individual as my Health Care Agent to make "
         "health care decisions for me if I become unable to make or communicate my own "
         "health care decisions:",
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "<b>Health Care Agent:</b> Patricia L. Donovan (Daughter)<br/>"
-        "Address: 239 Cherry Lane, Harrisburg, Pennsylvania 17101<br/>"
-        "Telephone: (717) 555-0847<br/>"
-        "Email: pldonovan@email.example.com",
+        party_lines("Health Care Agent", agent, email=True),
         styles["IndentBody"]
     ))
     story.append(Paragraph(
-        "<b>Alternate Health Care Agent:</b> Robert J. Whitfield (Son)<br/>"
-        "Address: 1584 Oakmont Boulevard, Pittsburgh, Pennsylvania 15213<br/>"
-        "Telephone: (412) 555-0193",
+        party_lines("Alternate Health Care Agent", alternate),
         styles["IndentBody"]
     ))
 
@@ -489,14 +612,14 @@ def generate_pa_healthcare_poa():
     # Execution
     story.append(Paragraph("EXECUTION", styles["SectionHead"]))
     story.append(Paragraph(
-        "IN WITNESS WHEREOF, I have hereunto set my hand this 15th day of March, 2025.",
+        f"IN WITNESS WHEREOF, I have hereunto set my hand this {day_of(data['date'])}.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Margaret A. Whitfield", "Principal", "March 15, 2025", styles))
+    story.extend(signature_block(principal["name"], "Principal", signed, styles))
 
     story.append(Paragraph("WITNESSES", styles["SectionHead"]))
-    story.extend(signature_block("Jennifer M. Kowalski", "Witness #1 - 891 Pine Street, Philadelphia, PA 19107", "March 15, 2025", styles))
-    story.extend(signature_block("David R. Thompson", "Witness #2 - 4520 Walnut Street, Philadelphia, PA 19139", "March 15, 2025", styles))
+    for n, witness in enumerate(data["witnesses"], 1):
+        story.extend(signature_block(witness["name"], f"Witness #{n} - {witness['address']}", signed, styles))
 
     story.append(Spacer(1, 12))
     story.append(Paragraph(
@@ -506,8 +629,7 @@ def generate_pa_healthcare_poa():
         styles["SmallText"]
     ))
 
-    doc.build(story)
-    print(f"  Created: {filename}")
+    return build_pdf(story, filename)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -515,11 +637,9 @@ def generate_pa_healthcare_poa():
 # Based on 755 ILCS 45/3-3
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generate_il_property_poa():
-    filename = "docs/IL_Statutory_Short_Form_POA_Property.pdf"
-    doc = SimpleDocTemplate(filename, pagesize=letter,
-                            topMargin=0.75*inch, bottomMargin=0.75*inch,
-                            leftMargin=1*inch, rightMargin=1*inch)
+def generate_il_property_poa(data=IL_SAMPLE, filename="docs/IL_Statutory_Short_Form_POA_Property.pdf"):
+    principal, agent = data["principal"], data["agent"]
+    signed = long_date(data["date"])
     styles = get_styles()
     story = []
 
@@ -587,7 +707,7 @@ def generate_il_property_poa():
     story.append(Spacer(1, 6))
     story.append(Paragraph(
         "Please place your initials on the following line indicating that you have read "
-        "this Notice: &nbsp;&nbsp;&nbsp; <b>T.R.C.</b> &nbsp;&nbsp; Principal's initials",
+        f"this Notice: &nbsp;&nbsp;&nbsp; <b>{principal['initials']}</b> &nbsp;&nbsp; Principal's initials",
         styles["BodyText2"]
     ))
 
@@ -599,15 +719,13 @@ def generate_il_property_poa():
     story.append(hr())
 
     story.append(Paragraph(
-        "1. I, <b>Thomas R. Castellano</b>, residing at 2847 North Lakewood Avenue, "
-        "Chicago, Illinois 60614, hereby revoke all prior statutory powers of attorney "
+        f"1. I, <b>{principal['name']}</b>, residing at {principal['address']}, "
+        "hereby revoke all prior statutory powers of attorney "
         "for property executed by me and appoint:",
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "<b>Agent:</b> Maria E. Castellano (Spouse)<br/>"
-        "Address: 2847 North Lakewood Avenue, Chicago, Illinois 60614<br/>"
-        "Telephone: (312) 555-0726",
+        party_lines("Agent", agent),
         styles["IndentBody"]
     ))
     story.append(Paragraph(
@@ -620,31 +738,19 @@ def generate_il_property_poa():
     ))
 
     # Powers List
+    struck = data["struck_powers"]
+    struck_note = (f"The following have been struck out: {', '.join(struck)}." if struck
+                   else "None have been struck out.")
     story.append(Paragraph(
         "2. <b>POWERS GRANTED</b> (NOTE: The following categories of powers are authorized. "
-        "None have been struck out.)",
+        f"{struck_note})",
         styles["BodyText2"]
     ))
 
-    il_powers = [
-        ("(a)", "Real estate transactions"),
-        ("(b)", "Financial institution transactions"),
-        ("(c)", "Stock and bond transactions"),
-        ("(d)", "Tangible personal property transactions"),
-        ("(e)", "Safe deposit box transactions"),
-        ("(f)", "Insurance and annuity transactions"),
-        ("(g)", "Retirement plan transactions"),
-        ("(h)", "Social Security, employment, and military service benefits"),
-        ("(i)", "Tax matters"),
-        ("(j)", "Claims and litigation"),
-        ("(k)", "Commodity and option transactions"),
-        ("(l)", "Business operations transactions"),
-        ("(m)", "Borrowing transactions"),
-        ("(n)", "Estate transactions"),
-    ]
 
-    for code, power in il_powers:
-        story.append(Paragraph(f"&nbsp;&nbsp;&nbsp;&nbsp;{code} {power}", styles["BodyText2"]))
+    for code, power in IL_PROPERTY_POWERS:
+        text = f"{code} {power}" if code not in struck else f"<strike>{code} {power}</strike>"
+        story.append(Paragraph(f"&nbsp;&nbsp;&nbsp;&nbsp;{text}", styles["BodyText2"]))
 
     story.append(Spacer(1, 6))
     story.append(Paragraph(
@@ -679,15 +785,11 @@ def generate_il_property_poa():
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "<b>Successor Agent:</b> Anthony D. Castellano (Brother)<br/>"
-        "Address: 519 West Barry Avenue, Unit 4, Chicago, Illinois 60657<br/>"
-        "Telephone: (312) 555-1394",
+        party_lines("Successor Agent", data["successor"]),
         styles["IndentBody"]
     ))
     story.append(Paragraph(
-        "<b>Second Successor Agent:</b> Lisa K. Ferraro (Sister)<br/>"
-        "Address: 1205 South Ridgeland Avenue, Oak Park, Illinois 60302<br/>"
-        "Telephone: (708) 555-0215",
+        party_lines("Second Successor Agent", data["second_successor"]),
         styles["IndentBody"]
     ))
 
@@ -703,14 +805,14 @@ def generate_il_property_poa():
     # Execution
     story.append(Spacer(1, 12))
     story.append(Paragraph(
-        "I, Thomas R. Castellano, the Principal, sign my name to this Statutory Short "
-        "Form Power of Attorney for Property on January 22, 2025, and, being first "
+        f"I, {principal['name']}, the Principal, sign my name to this Statutory Short "
+        f"Form Power of Attorney for Property on {signed}, and, being first "
         "duly sworn, do hereby declare that I sign and execute this instrument as my "
         "Power of Attorney and that I sign it willingly, and that I execute it as my "
         "free and voluntary act for the purposes therein expressed.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Thomas R. Castellano", "Principal", "January 22, 2025", styles))
+    story.extend(signature_block(principal["name"], "Principal", signed, styles))
 
     # Witness
     story.append(Paragraph("WITNESS", styles["SectionHead"]))
@@ -721,22 +823,24 @@ def generate_il_property_poa():
         "fraud, or undue influence.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Sandra J. Okonkwo", "Witness - 1120 West Diversey Parkway, Chicago, IL 60614", "January 22, 2025", styles))
+    for witness in data["witnesses"]:
+        story.extend(signature_block(witness["name"], f"Witness - {witness['address']}", signed, styles))
 
     # Notary
     story.append(Paragraph("NOTARY ACKNOWLEDGMENT", styles["SectionHead"]))
     story.append(Paragraph(
-        "STATE OF ILLINOIS<br/>COUNTY OF COOK",
+        f"STATE OF ILLINOIS<br/>COUNTY OF {data['county']}",
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "On this 22nd day of January, 2025, before me, a Notary Public in and for said "
-        "County and State, personally appeared Thomas R. Castellano, known to me to be "
+        f"On this {day_of(data['date'])}, before me, a Notary Public in and for said "
+        f"County and State, personally appeared {principal['name']}, known to me to be "
         "the person whose name is subscribed to the within instrument, and acknowledged "
-        "that he executed the same of his own free will.",
+        f"that {principal['she']} executed the same of {principal['her']} own free will.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Michael P. Harrington", "Notary Public, State of Illinois\nMy Commission Expires: August 14, 2027\nNotary Seal No. 2022-IL-NP-884210", "January 22, 2025", styles))
+    notary = data["notary"]
+    story.extend(signature_block(notary["name"], f"Notary Public, State of Illinois\nMy Commission Expires: {notary['expires']}\nNotary Seal No. {notary['id']}", signed, styles))
 
     story.append(PageBreak())
 
@@ -759,13 +863,13 @@ def generate_il_property_poa():
     ))
     story.append(Paragraph("AGENT'S ACCEPTANCE", styles["SectionHead"]))
     story.append(Paragraph(
-        "I, Maria E. Castellano, accept my appointment as Agent under this Statutory "
+        f"I, {agent['name']}, accept my appointment as Agent under this Statutory "
         "Short Form Power of Attorney for Property. I have read the Notice to Agent and "
         "understand my duties and obligations. I agree to act in the best interest of "
         "the Principal.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Maria E. Castellano", "Agent", "January 22, 2025", styles))
+    story.extend(signature_block(agent["name"], "Agent", signed, styles))
 
     story.append(Spacer(1, 12))
     story.append(Paragraph(
@@ -775,8 +879,7 @@ def generate_il_property_poa():
         styles["SmallText"]
     ))
 
-    doc.build(story)
-    print(f"  Created: {filename}")
+    return build_pdf(story, filename)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -784,11 +887,9 @@ def generate_il_property_poa():
 # Based on 755 ILCS 45/4-10
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generate_il_healthcare_poa():
-    filename = "docs/IL_Statutory_Short_Form_POA_Healthcare.pdf"
-    doc = SimpleDocTemplate(filename, pagesize=letter,
-                            topMargin=0.75*inch, bottomMargin=0.75*inch,
-                            leftMargin=1*inch, rightMargin=1*inch)
+def generate_il_healthcare_poa(data=IL_SAMPLE, filename="docs/IL_Statutory_Short_Form_POA_Healthcare.pdf"):
+    principal, agent = data["principal"], data["agent"]
+    signed = long_date(data["date"])
     styles = get_styles()
     story = []
 
@@ -831,7 +932,7 @@ def generate_il_healthcare_poa():
     story.append(Spacer(1, 6))
     story.append(Paragraph(
         "Please place your initials on the following line indicating that you have read "
-        "this Notice: &nbsp;&nbsp;&nbsp; <b>T.R.C.</b> &nbsp;&nbsp; Principal's initials",
+        f"this Notice: &nbsp;&nbsp;&nbsp; <b>{principal['initials']}</b> &nbsp;&nbsp; Principal's initials",
         styles["BodyText2"]
     ))
 
@@ -843,16 +944,13 @@ def generate_il_healthcare_poa():
     story.append(hr())
 
     story.append(Paragraph(
-        "1. I, <b>Thomas R. Castellano</b>, residing at 2847 North Lakewood Avenue, "
-        "Chicago, Illinois 60614, hereby revoke all prior powers of attorney for health "
+        f"1. I, <b>{principal['name']}</b>, residing at {principal['address']}, "
+        "hereby revoke all prior powers of attorney for health "
         "care executed by me and appoint:",
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "<b>Health Care Agent:</b> Maria E. Castellano (Spouse)<br/>"
-        "Address: 2847 North Lakewood Avenue, Chicago, Illinois 60614<br/>"
-        "Telephone: (312) 555-0726<br/>"
-        "Email: mecastellano@email.example.com",
+        party_lines("Health Care Agent", agent, email=True),
         styles["IndentBody"]
     ))
     story.append(Paragraph(
@@ -874,9 +972,7 @@ def generate_il_healthcare_poa():
         styles["BodyText2"]
     ))
     story.append(Paragraph(
-        "<b>Successor Health Care Agent:</b> Lisa K. Ferraro (Sister)<br/>"
-        "Address: 1205 South Ridgeland Avenue, Oak Park, Illinois 60302<br/>"
-        "Telephone: (708) 555-0215",
+        party_lines("Successor Health Care Agent", data["healthcare_successor"]),
         styles["IndentBody"]
     ))
 
@@ -914,7 +1010,7 @@ def generate_il_healthcare_poa():
     story.append(Paragraph("<b>Disposition of Remains:</b>", styles["BodyText2"]))
     story.append(Paragraph(
         "(d) I direct that my remains be cremated. My ashes shall be interred at "
-        "Holy Sepulchre Cemetery in Alsip, Illinois, in the Castellano family plot. "
+        f"Holy Sepulchre Cemetery in Alsip, Illinois, in the {principal['family_name']} family plot. "
         "All decisions made by my agent with respect to the disposition of my remains, "
         "including cremation, shall be binding pursuant to the Disposition of Remains "
         "Act, 755 ILCS 65/1 et seq.",
@@ -966,11 +1062,11 @@ def generate_il_healthcare_poa():
     # Execution
     story.append(Spacer(1, 8))
     story.append(Paragraph(
-        "I, Thomas R. Castellano, the Principal, sign my name to this Statutory Short "
-        "Form Power of Attorney for Health Care on January 22, 2025.",
+        f"I, {principal['name']}, the Principal, sign my name to this Statutory Short "
+        f"Form Power of Attorney for Health Care on {signed}.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Thomas R. Castellano", "Principal", "January 22, 2025", styles))
+    story.extend(signature_block(principal["name"], "Principal", signed, styles))
 
     # Witness
     story.append(Paragraph("WITNESS", styles["SectionHead"]))
@@ -982,30 +1078,31 @@ def generate_il_healthcare_poa():
         "of age, and I am not the agent designated in this Power of Attorney.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Sandra J. Okonkwo", "Witness - 1120 West Diversey Parkway, Chicago, IL 60614", "January 22, 2025", styles))
+    for witness in data["witnesses"]:
+        story.extend(signature_block(witness["name"], f"Witness - {witness['address']}", signed, styles))
 
     # Notary
     story.append(Paragraph("NOTARY ACKNOWLEDGMENT", styles["SectionHead"]))
-    story.append(Paragraph("STATE OF ILLINOIS<br/>COUNTY OF COOK", styles["BodyText2"]))
+    story.append(Paragraph(f"STATE OF ILLINOIS<br/>COUNTY OF {data['county']}", styles["BodyText2"]))
     story.append(Paragraph(
-        "On this 22nd day of January, 2025, before me, a Notary Public in and for said "
-        "County and State, personally appeared Thomas R. Castellano, known to me to be "
+        f"On this {day_of(data['date'])}, before me, a Notary Public in and for said "
+        f"County and State, personally appeared {principal['name']}, known to me to be "
         "the person whose name is subscribed to the within instrument, and acknowledged "
-        "that he executed the same of his own free will, for the purposes therein stated.",
+        f"that {principal['she']} executed the same of {principal['her']} own free will, for the purposes therein stated.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Michael P. Harrington", "Notary Public, State of Illinois\nMy Commission Expires: August 14, 2027", "January 22, 2025", styles))
+    story.extend(signature_block(data["notary"]["name"], f"Notary Public, State of Illinois\nMy Commission Expires: {data['notary']['expires']}", signed, styles))
 
     # Agent Acceptance
     story.append(Paragraph("AGENT'S ACCEPTANCE", styles["SectionHead"]))
     story.append(Paragraph(
-        "I, Maria E. Castellano, accept my appointment as Health Care Agent under this "
+        f"I, {agent['name']}, accept my appointment as Health Care Agent under this "
         "Statutory Short Form Power of Attorney for Health Care. I understand my "
         "responsibilities and agree to act in the best interest of the Principal, "
         "following the instructions and wishes set forth in this document.",
         styles["BodyText2"]
     ))
-    story.extend(signature_block("Maria E. Castellano", "Health Care Agent", "January 22, 2025", styles))
+    story.extend(signature_block(agent["name"], "Health Care Agent", signed, styles))
 
     story.append(Spacer(1, 12))
     story.append(Paragraph(
@@ -1015,8 +1112,45 @@ def generate_il_healthcare_poa():
         styles["SmallText"]
     ))
 
-    doc.build(story)
-    print(f"  Created: {filename}")
+    return build_pdf(story, filename)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Rendering Engine
+# ═══════════════════════════════════════════════════════════════════════════════
+
+GENERATORS = {
+    "PA_Financial": generate_pa_financial_poa,
+    "PA_Healthcare": generate_pa_healthcare_poa,
+    "IL_Property": generate_il_property_poa,
+    "IL_Healthcare": generate_il_healthcare_poa,
+}
+
+
+def render_pdf(template, data=None, filename=None):
+    """
+    Render one document from a template name. With no filename the PDF is
+    built in memory and its bytes are returned, ready to hand straight to
+    step1_extract.analyze() without touching disk.
+    """
+    generate = GENERATORS[template]
+    if data is None:
+        return generate(filename=filename)
+    return generate(data, filename)
+
+
+def _render_job(job):
+    return render_pdf(*job)
+
+
+def render_many(jobs, workers=None, chunksize=8):
+    """
+    Render (template, data, filename) jobs across a process pool, yielding
+    results in order (bytes for in-memory jobs, None for files). Each worker
+    builds the stylesheet once, when it starts.
+    """
+    with ProcessPoolExecutor(workers, initializer=get_styles) as pool:
+        yield from pool.map(_render_job, jobs, chunksize=chunksize)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -1030,10 +1164,15 @@ if __name__ == "__main__":
     print("=" * 55)
     print()
 
-    generate_pa_financial_poa()
-    generate_pa_healthcare_poa()
-    generate_il_property_poa()
-    generate_il_healthcare_poa()
+    os.makedirs("docs", exist_ok=True)
+    jobs = [
+        ("PA_Financial", None, "docs/PA_Durable_Power_of_Attorney.pdf"),
+        ("PA_Healthcare", None, "docs/PA_Healthcare_Power_of_Attorney.pdf"),
+        ("IL_Property", None, "docs/IL_Statutory_Short_Form_POA_Property.pdf"),
+        ("IL_Healthcare", None, "docs/IL_Statutory_Short_Form_POA_Healthcare.pdf"),
+    ]
+    for _ in render_many(jobs, workers=len(jobs)):
+        pass
 
     print()
     print("=" * 55)
@@ -0,0 +1,252 @@
+"""
+hnsw_sweep.py
+
+Latency vs. recall sweep over the vector index parameters of step2_index.py
+(HNSW m / efConstruction / efSearch, exhaustive KNN) and the query-side
+oversampling of step3_query.py, on our own corpus.
+
+For every (m, efConstruction) a scratch index "<AZURE_SEARCH_INDEX_NAME>-sweep-..."
+is created and loaded with the chunks step2 already embedded (read from the
+job ledger - no embedding calls), then each efSearch value is applied and the
+question set of eval_retrieval.py is run as pure vector queries. Each row
+reports
+  recall@k   overlap with the exact (exhaustive) top k on the same index
+  answer     recall of the answer-bearing chunks, as in eval_retrieval
+  latency    p50 / p95 per query, and the time to load the index
+
+The best configuration is the fastest one (p50) that reaches --target-recall;
+it is written to eval_results/hnsw_best.env as settings to copy into .env.
+Scratch indexes are deleted afterwards unless --keep is given. Values outside
+what Azure AI Search accepts (m 4-10, efConstruction / efSearch 100-1000) are
+rejected before any index is created.
+
+Usage:
+    python hnsw_sweep.py
+    python hnsw_sweep.py --m 4,6,10 --ef-construction 400,800 --ef-search 100,500,1000
+    python hnsw_sweep.py --oversampling 1,2,4 --top-k 5 --target-recall 0.99
+"""
+
+import os
+import json
+import math
+import time
+import argparse
+from datetime import datetime
+
+import clients
+import step2_index
+from tracing import percentile
+from embedding_dims import EMBEDDING_DIMENSIONS
+from eval_retrieval import QUESTIONS_PATH, RESULTS_DIR, load_questions, score_query
+from job_ledger import JobLedger
+from rate_limiter import get_limiter, limited_call
+
+BEST_PATH = os.path.join(RESULTS_DIR, "hnsw_best.env")
+
+# Parameter ranges Azure AI Search accepts for HNSW
+LIMITS = {"m": (4, 10), "ef_construction": (100, 1000), "ef_search": (100, 1000)}
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def load_corpus(ledger):
+    """Embedded chunks checkpointed by step2, at the index's vector size."""
+    documents = []
+    for _, docs in ledger.artifacts("embedded"):
+        documents.extend(d for d in docs
+                         if len(d.get("content_vector") or ()) == EMBEDDING_DIMENSIONS)
+    return documents
+
+
+def load_index(index_name, vector_search, documents):
+    """Create a scratch index and upload the chunks. Returns (client, seconds)."""
+    step2_index.create_search_index(index_name, vector_search)
+    client = step2_index.index_client(index_name)
+    start = time.perf_counter()
+    for i in range(0, len(documents), 100):
+        result = limited_call(get_limiter("search"), client.upload_documents,
+                              documents=documents[i:i + 100])
+        failed = sum(1 for r in result if not r.succeeded)
+        if failed:
+            raise RuntimeError(f"{failed} chunk(s) failed to upload to {index_name}")
+    # Uploads become searchable shortly after they are accepted
+    while limited_call(get_limiter("search"), client.get_document_count) < len(documents):
+        time.sleep(0.5)
+    return client, time.perf_counter() - start
+
+
+def vector_search(client, vector, top_k, oversampling=1.0, exhaustive=False):
+    from azure.search.documents.models import VectorizedQuery
+
+    query = VectorizedQuery(
+        vector=vector,
+        k_nearest_neighbors=max(top_k, math.ceil(top_k * oversampling)),
+        fields="content_vector",
+        exhaustive=exhaustive or None,
+    )
+    return limited_call(get_limiter("search"), lambda: list(client.search(
+        search_text=None, vector_queries=[query], top=top_k,
+        select=["id", "source_file", "chunk_index", "shared_by", "content"],
+    )))
+
+
+def run_queries(client, questions, vectors, top_k, oversampling, exact):
+    """Score one configuration against the exact neighbours in `exact`."""
+    overlaps, answers, latencies = [], [], []
+    for q, vector, reference in zip(questions, vectors, exact):
+        start = time.perf_counter()
+        results = vector_search(client, vector, top_k, oversampling)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids = {r["id"] for r in results}
+        overlaps.append(len(ids & reference) / max(1, len(reference)))
+        answers.append(score_query(
+            [{"source": r["source_file"], "chunk_index": r["chunk_index"],
+              "shared_by": r.get("shared_by"), "content": r.get("content")} for r in results],
+            q, top_k)["recall"])
+    n = len(questions) or 1
+    return {
+        "recall": round(sum(overlaps) / n, 4),
+        "answer_recall": round(sum(answers) / n, 4),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+
+
+def sweep(documents, questions, vectors, args):
+    base = f"{step2_index.INDEX_NAME}-sweep"
+    rows, created = [], []
+    try:
+        # Exhaustive KNN: the reference neighbours, and a candidate in its own right
+        name = f"{base}-exhaustive"
+        created.append(name)
+        client, load_s = load_index(name, step2_index.vector_search_config(
+            "exhaustive", metric=args.metric), documents)
+        exact = [{r["id"] for r in vector_search(client, v, args.top_k, exhaustive=True)}
+                 for v in vectors]
+        row = run_queries(client, questions, vectors, args.top_k, 1.0, exact)
+        rows.append(dict(row, algorithm="exhaustive", m=None, ef_construction=None,
+                         ef_search=None, oversampling=1.0, load_s=round(load_s, 2)))
+        print(f"  -> exhaustive: p50={row['p50_ms']}ms")
+
+        for m in args.m:
+            for ef_construction in args.ef_construction:
+                name = f"{base}-m{m}-efc{ef_construction}"
+                created.append(name)
+                client = load_s = None
+                for ef_search in args.ef_search:
+                    config = step2_index.vector_search_config(
+                        "hnsw", args.metric, m, ef_construction, ef_search)
+                    if client is None:
+                        client, load_s = load_index(name, config, documents)
+                    else:
+                        # efSearch is a query-time setting: update in place, no reload
+                        step2_index.create_search_index(name, config)
+                    for oversampling in args.oversampling:
+                        row = run_queries(client, questions, vectors, args.top_k,
+                                          oversampling, exact)
+                        rows.append(dict(row, algorithm="hnsw", m=m,
+                                         ef_construction=ef_construction, ef_search=ef_search,
+                                         oversampling=oversampling, load_s=round(load_s, 2)))
+                        print(f"  -> m={m} efC={ef_construction} efS={ef_search} "
+                              f"x{oversampling}: recall={row['recall']} p50={row['p50_ms']}ms")
+    finally:
+        if not args.keep:
+            for name in created:
+                limited_call(get_limiter("search"),
+                             clients.search_index().delete_index, name)
+    return rows
+
+
+def pick_best(rows, target):
+    good = [r for r in rows if r["recall"] >= target]
+    if good:
+        return min(good, key=lambda r: (r["p50_ms"], -r["recall"]))
+    return max(rows, key=lambda r: (r["recall"], -r["p50_ms"]))
+
+
+def best_settings(row, metric):
+    settings = {"VECTOR_ALGORITHM": row["algorithm"], "VECTOR_METRIC": metric}
+    if row["algorithm"] == "hnsw":
+        settings.update(HNSW_M=row["m"], HNSW_EF_CONSTRUCTION=row["ef_construction"],
+                        HNSW_EF_SEARCH=row["ef_search"], VECTOR_OVERSAMPLING=row["oversampling"])
+    return settings
+
+
+def print_report(rows, best):
+    print(f"\n{'Algorithm':<11} {'m':>3} {'efC':>5} {'efS':>5} {'Over':>5} {'Recall':>7} "
+          f"{'Answer':>7} {'p50 ms':>8} {'p95 ms':>8} {'Load s':>7}")
+    print("-" * 78)
+    for r in rows:
+        marker = "  <- best" if r is best else ""
+        print(f"{r['algorithm']:<11} {r['m'] or '-':>3} {r['ef_construction'] or '-':>5} "
+              f"{r['ef_search'] or '-':>5} {r['oversampling']:>5g} {r['recall']:>7.3f} "
+              f"{r['answer_recall']:>7.3f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['load_s']:>7.1f}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep vector index parameters.")
+    parser.add_argument("--questions", default=QUESTIONS_PATH,
+                        help=f"question set JSONL (default: {QUESTIONS_PATH})")
+    parser.add_argument("--m", type=int_list, default=[4, 6, 10])
+    parser.add_argument("--ef-construction", type=int_list, default=[400, 800])
+    parser.add_argument("--ef-search", type=int_list, default=[100, 500, 1000])
+    parser.add_argument("--oversampling", type=lambda v: [float(x) for x in v.split(",")],
+                        default=[1.0, 2.0])
+    parser.add_argument("--metric", default=step2_index.VECTOR_METRIC)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--target-recall", type=float, default=0.98,
+                        help="recall against exact search the best configuration must reach")
+    parser.add_argument("--limit", type=int, default=0, help="use only the first N questions")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch indexes")
+    args = parser.parse_args()
+    for name, (low, high) in LIMITS.items():
+        bad = [v for v in getattr(args, name) if not low <= v <= high]
+        if bad:
+            parser.error(f"--{name.replace('_', '-')} must be within {low}-{high}, got {bad}")
+
+    documents = load_corpus(JobLedger())
+    if not documents:
+        print(f"No {EMBEDDING_DIMENSIONS}-dimension chunks in the ledger; run step2 first.")
+        return
+    questions = load_questions(args.questions)
+    if args.limit:
+        questions = questions[:args.limit]
+
+    import step3_query
+
+    print("=" * 50)
+    print(f"HNSW SWEEP: {len(documents)} chunk(s), {len(questions)} question(s)")
+    print("=" * 50)
+    vectors = [step3_query.get_embedding(q["question"]) for q in questions]
+    rows = sweep(documents, questions, vectors, args)
+    best = pick_best(rows, args.target_recall)
+    print_report(rows, best)
+
+    settings = best_settings(best, args.metric)
+    timestamp = datetime.now()
+    report = {
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "chunks": len(documents),
+        "questions": len(questions),
+        "top_k": args.top_k,
+        "target_recall": args.target_recall,
+        "best": settings,
+        "results": rows,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"hnsw_sweep_{timestamp:%Y%m%d-%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(BEST_PATH, "w", encoding="utf-8") as f:
+        f.write(f"# hnsw_sweep.py {report['timestamp']}: recall {best['recall']} "
+                f"@ p50 {best['p50_ms']}ms\n")
+        f.writelines(f"{key}={value}\n" for key, value in settings.items())
+    print(f"\nReport saved to {output}")
+    print(f"Best configuration written to {BEST_PATH} - copy it into .env and re-run step2")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+image_preprocess.py
+
+Local clean-up for low-quality scans before they are re-sent to
+Document Intelligence. Uses Pillow only (no numpy):
+- Grayscale + auto-contrast
+- Upscale small scans so thin strokes survive OCR
+- Deskew using a projection-profile search
+- Binarize using Otsu's threshold
+
+Usage:
+    pip install pillow
+"""
+
+import io
+
+
+def otsu_threshold(gray):
+    """Pick the threshold that best separates ink from paper (Otsu's method)."""
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+
+    best_threshold, best_variance = 128, -1.0
+    weight_bg, sum_bg = 0, 0
+    for t in range(256):
+        weight_bg += histogram[t]
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += t * histogram[t]
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = t, variance
+    return best_threshold
+
+
+def binarize(gray):
+    """Convert a grayscale image to pure black/white."""
+    threshold = otsu_threshold(gray)
+    return gray.point(lambda p: 255 if p > threshold else 0)
+
+
+def _row_profile_score(binary):
+    """Variance of the row ink profile - highest when text lines are level."""
+    from PIL import Image
+
+    rows = binary.resize((1, binary.height), Image.BOX)
+    values = list(rows.getdata())
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / len(values)
+
+
+def estimate_skew(gray, max_angle=5.0, step=0.5):
+    """Estimate the skew angle (degrees) by trying small rotations."""
+    from PIL import Image
+
+    # Work on a small copy - the profile only needs the coarse line structure
+    preview = gray.copy()
+    preview.thumbnail((800, 800))
+    preview = binarize(preview)
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_angle / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rotated = preview.rotate(angle, resample=Image.NEAREST, expand=False, fillcolor=255)
+        score = _row_profile_score(rotated)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def clean_page(frame, min_width=2000):
+    """Run the full clean-up on a single page image."""
+    from PIL import Image, ImageOps
+
+    gray = ImageOps.autocontrast(ImageOps.grayscale(frame), cutoff=1)
+
+    if gray.width < min_width:
+        scale = min_width / gray.width
+        gray = gray.resize((min_width, int(gray.height * scale)), Image.LANCZOS)
+
+    angle = estimate_skew(gray)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    return binarize(gray)
+
+
+def clean_scan(image_bytes, min_width=2000):
+    """
+    Clean up a scanned image (all frames of a multi-page TIFF) and return
+    (bytes, content_type) ready to send back to Document Intelligence.
+    """
+    from PIL import Image, ImageSequence
+
+    image = Image.open(io.BytesIO(image_bytes))
+    pages = [clean_page(frame, min_width) for frame in ImageSequence.Iterator(image)]
+
+    out = io.BytesIO()
+    if len(pages) == 1:
+        pages[0].save(out, format="PNG", optimize=True)
+        return out.getvalue(), "image/png"
+
+    pages = [p.convert("1") for p in pages]  # group4 needs 1-bit images
+    pages[0].save(out, format="TIFF", save_all=True, append_images=pages[1:],
+                  compression="group4")
+    return out.getvalue(), "image/tiff"
@@ -0,0 +1,409 @@
+"""
+index_aliases.py
+
+Blue/green reindexing: AZURE_SEARCH_INDEX_NAME is a logical name (alias)
+that points at one of several versioned physical indexes
+"<alias>-v1", "<alias>-v2", ... A schema change (EMBEDDING_DIMENSIONS,
+VECTOR_ALGORITHM / HNSW_* ...) is built into a new version next to the live
+one, checked, and then switched to in one step, while step3_query.py keeps
+serving the old version until the switch.
+
+The pointer is a small JSON file (INDEX_POINTER_PATH), replaced atomically
+(write + rename), so it works the same against Azure AI Search, the mock
+service (mock_azure.py) or any other backend step2 can talk to. step2 and
+step3 resolve the alias through it on every upload / search (a stat() call;
+the file is only re-read when it changes), so a switch takes effect in
+running processes without a restart. With INDEX_SERVICE_ALIAS=1 the switch
+also updates an Azure AI Search index alias of the same name, for clients
+outside this repo (needs an SDK with alias support, and no physical index
+named like the alias).
+
+Without a pointer the alias resolves to itself - the single in-place index
+of older setups; the first `build` adopts it as the previous version.
+
+  build     create the next version with the current schema and fill it
+            from the newest snapshot (snapshot.py, no embedding calls), or
+            with --reembed re-embed every uploaded chunk (needed when the
+            vector size or model changes), then snapshot it
+  validate  document count matches what was loaded, and the smoke queries
+            (the first SMOKE_QUERIES questions of eval_retrieval.py) all
+            return results with answer recall no worse than the live
+            version's by more than SMOKE_TOLERANCE
+  switch    point the alias at a validated version (refused if any document
+            reached 'uploaded' in the job ledger after the data the version
+            was built from - step2, ingest_worker and ingest_daemon all
+            upload to the live version only; rebuild, or --force)
+  rollback  point the alias back at the previous version
+  gc        delete retired versions beyond the newest INDEX_KEEP_VERSIONS
+
+Usage:
+    python index_aliases.py                       # alias, live version, all versions
+    python index_aliases.py build --switch        # build + validate + switch
+    python index_aliases.py build --reembed
+    python index_aliases.py validate poa-index-v3
+    python index_aliases.py switch poa-index-v3
+    python index_aliases.py rollback
+    python index_aliases.py gc --keep 2
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+ALIAS = os.environ.get("AZURE_SEARCH_INDEX_NAME", "")
+POINTER_PATH = os.environ.get("INDEX_POINTER_PATH", "ingest_state/index_alias.json")
+INDEX_SERVICE_ALIAS = os.environ.get("INDEX_SERVICE_ALIAS", "0") == "1"
+INDEX_KEEP_VERSIONS = int(os.environ.get("INDEX_KEEP_VERSIONS", "2"))   # live + previous
+SMOKE_QUERIES = int(os.environ.get("SMOKE_QUERIES", "20"))
+SMOKE_TOLERANCE = float(os.environ.get("SMOKE_TOLERANCE", "0.05"))
+COUNT_TIMEOUT = 120      # seconds to wait for uploads to become visible
+
+_cache = {"mtime": None, "pointer": None}
+_cache_lock = threading.Lock()
+
+
+# -- Pointer --
+def load_pointer(path=POINTER_PATH):
+    """The pointer file, re-read only when it has changed; None when there is none."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _cache_lock:
+        if _cache["mtime"] != mtime:
+            with open(path, encoding="utf-8") as f:
+                _cache["pointer"], _cache["mtime"] = json.load(f), mtime
+        return _cache["pointer"]
+
+
+def save_pointer(pointer, path=POINTER_PATH):
+    """Replace the pointer atomically: readers see the old or the new file, never half."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "w", encoding="utf-8") as f:
+        json.dump(pointer, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging, path)
+
+
+def editable_pointer():
+    """A copy of the pointer (or a new one) to change and save_pointer()."""
+    return copy.deepcopy(load_pointer()) or new_pointer()
+
+
+def resolve(alias=ALIAS):
+    """The physical index behind `alias` (the alias itself when there is no pointer)."""
+    pointer = load_pointer()
+    if pointer and pointer["alias"] == alias and pointer.get("current"):
+        return pointer["current"]
+    return alias
+
+
+def new_pointer(alias=ALIAS):
+    # An existing in-place index becomes version 0, so it can be rolled back to and GC'd
+    return {"alias": alias, "current": alias, "previous": None, "switched_at": None,
+            "versions": [{"name": alias, "status": "live", "created_at": None}]}
+
+
+def get_version(pointer, name):
+    version = next((v for v in pointer["versions"] if v["name"] == name), None)
+    if version is None:
+        raise ValueError(f"{name} is not a version of {pointer['alias']}")
+    return version
+
+
+def update_version(name, **fields):
+    pointer = editable_pointer()
+    get_version(pointer, name).update(fields)
+    save_pointer(pointer)
+    return pointer
+
+
+# -- Build --
+def next_name(pointer):
+    numbers = [int(v["name"].rsplit("-v", 1)[1]) for v in pointer["versions"]
+               if v["name"].rsplit("-v", 1)[-1].isdigit() and v["name"] != pointer["alias"]]
+    return f"{pointer['alias']}-v{max(numbers, default=0) + 1}"
+
+
+def build(reembed=False, snapshot_path=None):
+    """Create and fill the next version. Returns its name."""
+    import snapshot
+    import step2_index
+    from embedding_dims import EMBEDDING_DIMENSIONS, describe
+    from job_ledger import JobLedger
+
+    pointer = editable_pointer()
+    name = next_name(pointer)
+    pointer["versions"].append({
+        "name": name, "status": "building",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "embeddings": describe(), "algorithm": step2_index.VECTOR_ALGORITHM,
+    })
+    save_pointer(pointer)
+    print(f"Building {name} ({describe()}, {step2_index.VECTOR_ALGORITHM})")
+
+    try:
+        step2_index.create_search_index(name)
+        if reembed:
+            data_as_of = datetime.now().isoformat(timespec="milliseconds")
+            rows = list(step2_index.indexed_documents(JobLedger()))
+            print(f"  -> Re-embedding {len(rows)} row(s)")
+            for row, vector in zip(rows, step2_index.get_embeddings([r["content"] for r in rows])):
+                row["content_vector"] = vector
+            loaded, seconds = snapshot.upload_rows(name, rows)
+            source = snapshot.write_snapshot(rows, name)
+        else:
+            source = snapshot_path or snapshot.latest_snapshot()
+            if source is None:
+                raise RuntimeError("no snapshot to build from; run step2 (or "
+                                   "'python snapshot.py write') first, or use --reembed")
+            manifest = snapshot.read_manifest(source)
+            data_as_of = manifest["created_at"]
+            dimensions = manifest["dimensions"]
+            if dimensions != EMBEDDING_DIMENSIONS:
+                raise RuntimeError(f"{source} has {dimensions}-dimension vectors and the new "
+                                   f"schema {EMBEDDING_DIMENSIONS}; use --reembed")
+            loaded, seconds = snapshot.bulk_load(source, name, create=False)
+    except Exception as e:
+        update_version(name, status="failed", error=str(e))
+        raise
+
+    update_version(name, status="built", rows=loaded, snapshot=source, data_as_of=data_as_of,
+                   load_seconds=round(seconds, 1))
+    print(f"  -> {loaded} row(s) loaded in {seconds:.1f}s")
+    return name
+
+
+# -- Validation --
+def wait_for_count(name, expected, timeout=COUNT_TIMEOUT):
+    import step2_index
+    from rate_limiter import get_limiter, limited_call
+
+    client = step2_index.index_client(name)
+    deadline = time.time() + timeout
+    while True:
+        count = limited_call(get_limiter("search"), client.get_document_count)
+        if count >= expected or time.time() > deadline:
+            return count
+        time.sleep(1)
+
+
+def smoke_test(name, questions, top_k=5):
+    """{"queries", "empty", "recall"} for the questions against one physical index."""
+    import step3_query
+    from eval_retrieval import score_query
+
+    empty, recalls = 0, []
+    for q in questions:
+        results = step3_query.search_documents(q["question"], top_k=top_k, index_name=name)
+        empty += not results
+        if "source_file" in q:
+            recalls.append(score_query(results, q, top_k)["recall"])
+    return {"queries": len(questions), "empty": empty,
+            "recall": round(sum(recalls) / len(recalls), 4) if recalls else None}
+
+
+def smoke_questions():
+    from eval_retrieval import QUESTIONS_PATH, load_questions
+
+    if os.path.exists(QUESTIONS_PATH):
+        return load_questions(QUESTIONS_PATH)[:SMOKE_QUERIES]
+    return [{"question": q} for q in (
+        "Who is the agent?",
+        "Who is the principal?",
+        "When does the power of attorney become effective?",
+        "What powers are granted to the agent?",
+        "Who witnessed the document?",
+    )]
+
+
+def validate(name):
+    """Check a built version before it goes live. Returns True if it passed."""
+    pointer = editable_pointer()
+    version = get_version(pointer, name)
+    problems = []
+
+    count = wait_for_count(name, version.get("rows") or 0)
+    print(f"  -> Documents: {count} (expected {version.get('rows')})")
+    if count != version.get("rows"):
+        problems.append(f"{count} document(s) in the index, {version.get('rows')} loaded")
+
+    questions = smoke_questions()
+    smoke = smoke_test(name, questions)
+    print(f"  -> Smoke queries: {smoke['queries']}, {smoke['empty']} without results, "
+          f"recall {smoke['recall']}")
+    if smoke["empty"]:
+        problems.append(f"{smoke['empty']} smoke query(ies) returned nothing")
+
+    live = pointer["current"]
+    if smoke["recall"] is not None and live != name:
+        try:
+            baseline = smoke_test(live, questions)["recall"]
+        except Exception as e:
+            # e.g. the live index has the old vector size: nothing comparable to check against
+            print(f"  -> Live version {live} not comparable ({e}); recall check skipped")
+            baseline = None
+        if baseline is not None:
+            print(f"  -> Live version {live}: recall {baseline}")
+            if smoke["recall"] < baseline - SMOKE_TOLERANCE:
+                problems.append(f"recall {smoke['recall']} vs {baseline} on {live}")
+
+    update_version(name, status="failed" if problems else "validated", document_count=count,
+                   smoke=smoke, problems=problems)
+    for problem in problems:
+        print(f"  FAILED: {problem}")
+    return not problems
+
+
+# -- Switch / rollback / GC --
+def sync_service_alias(alias, name):
+    """Point the Azure AI Search alias of the same name at `name`, when enabled."""
+    if not INDEX_SERVICE_ALIAS:
+        return
+    try:
+        from azure.search.documents.indexes.models import SearchAlias
+    except ImportError:
+        print("  -> This azure-search-documents has no index aliases; pointer file only")
+        return
+    import clients
+    from rate_limiter import get_limiter, limited_call
+
+    limited_call(get_limiter("search"), clients.search_index().create_or_update_alias,
+                 SearchAlias(name=alias, indexes=[name]))
+    print(f"  -> Service alias {alias} -> {name}")
+
+
+def switch(name, force=False):
+    from job_ledger import JobLedger
+
+    pointer = editable_pointer()
+    version = get_version(pointer, name)
+    if version["status"] not in ("validated", "retired", "live") and not force:
+        raise RuntimeError(f"{name} is '{version['status']}', not validated; "
+                           f"run 'validate {name}' first (or --force)")
+    as_of = version.get("data_as_of") or version.get("created_at")
+    if as_of and not force:
+        # Uploads (step2, ingest_worker, ingest_daemon) go to the live version only
+        missing = JobLedger().uploaded_since(datetime.fromisoformat(as_of).timestamp())
+        if missing:
+            raise RuntimeError(f"{len(missing)} document(s) uploaded since {name}'s data "
+                               f"({as_of}), e.g. {', '.join(missing[:3])}; build again so "
+                               "they are included (or --force)")
+    if pointer["current"] == name:
+        print(f"{pointer['alias']} already points at {name}")
+        return
+
+    for v in pointer["versions"]:
+        if v["name"] == pointer["current"]:
+            v["status"] = "retired"
+    version["status"] = "live"
+    pointer["previous"], pointer["current"] = pointer["current"], name
+    pointer["switched_at"] = datetime.now().isoformat(timespec="seconds")
+    save_pointer(pointer)
+    print(f"{pointer['alias']} -> {name} (previous: {pointer['previous']})")
+    sync_service_alias(pointer["alias"], name)
+
+
+def rollback():
+    pointer = load_pointer()
+    if not pointer or not pointer.get("previous"):
+        raise RuntimeError("no previous version to roll back to")
+    switch(pointer["previous"], force=True)
+
+
+def gc(keep=INDEX_KEEP_VERSIONS):
+    """
+    Delete retired and failed versions, keeping the newest `keep` (live
+    included). Versions still being built, validated or waiting for a
+    switch are never touched.
+    """
+    from azure.core.exceptions import ResourceNotFoundError
+
+    import clients
+    from rate_limiter import get_limiter, limited_call
+
+    if not load_pointer():
+        return []
+    pointer = editable_pointer()
+    ordered = [v for v in pointer["versions"] if v["status"] != "deleted"]
+    # Live first, then the previous version, then the newest builds
+    keep_names = set()
+    for name in [pointer["current"], pointer.get("previous")] + [v["name"] for v in reversed(ordered)]:
+        if name and len(keep_names) < max(keep, 1):
+            keep_names.add(name)
+
+    deleted = []
+    for v in ordered:
+        if v["name"] in keep_names or v["status"] not in ("retired", "failed"):
+            continue
+        try:
+            limited_call(get_limiter("search"), clients.search_index().delete_index,
+                         v["name"])
+        except ResourceNotFoundError:
+            pass
+        v["status"] = "deleted"
+        if pointer.get("previous") == v["name"]:
+            pointer["previous"] = None
+        deleted.append(v["name"])
+        print(f"  -> Deleted {v['name']}")
+    save_pointer(pointer)
+    return deleted
+
+
+def print_status():
+    pointer = load_pointer()
+    if not pointer:
+        print(f"No pointer at {POINTER_PATH}: '{ALIAS}' is used as a single in-place index.")
+        return
+    print(f"\nAlias {pointer['alias']} -> {pointer['current']} "
+          f"(previous: {pointer.get('previous') or '-'}, switched {pointer.get('switched_at') or '-'})")
+    print(f"\n{'Version':<32} {'Status':<10} {'Rows':>7} {'Recall':>7}  Created / embeddings")
+    print("-" * 100)
+    for v in pointer["versions"]:
+        recall = (v.get("smoke") or {}).get("recall")
+        print(f"{v['name']:<32} {v['status']:<10} {v.get('rows') or '-':>7} "
+              f"{recall if recall is not None else '-':>7}  "
+              f"{v.get('created_at') or '-'}  {v.get('embeddings') or ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blue/green index versions behind an alias.")
+    parser.add_argument("command", nargs="?", default="status",
+                        choices=["status", "build", "validate", "switch", "rollback", "gc"])
+    parser.add_argument("name", nargs="?", help="version (validate / switch)")
+    parser.add_argument("--reembed", action="store_true", help="build by re-embedding every chunk")
+    parser.add_argument("--snapshot", default=None, help="build from this snapshot")
+    parser.add_argument("--switch", action="store_true", help="build: validate and switch too")
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--keep", type=int, default=INDEX_KEEP_VERSIONS)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "status":
+            print_status()
+        elif args.command == "build":
+            name = build(args.reembed, args.snapshot)
+            if args.switch:
+                if not validate(name):
+                    sys.exit(1)
+                switch(name)
+        elif args.command in ("validate", "switch") and not args.name:
+            parser.error(f"{args.command} needs a version name")
+        elif args.command == "validate":
+            sys.exit(0 if validate(args.name) else 1)
+        elif args.command == "switch":
+            switch(args.name, args.force)
+        elif args.command == "rollback":
+            rollback()
+        elif args.command == "gc":
+            print(f"Deleted {len(gc(args.keep))} version(s)")
+    except (RuntimeError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
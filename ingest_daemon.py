@@ -0,0 +1,381 @@
+"""
+ingest_daemon.py
+
+Long-running watch-folder ingest: new or changed files dropped into
+WATCH_DIR are pushed through extract -> chunk -> embed -> upload as soon as
+they have finished being written, without anyone running step1/step2.
+
+Detection:
+- Watching uses watchdog (inotify / FSEvents / ReadDirectoryChangesW) when
+  it is installed, to wake up the moment something changes; without it the
+  folder is polled every POLL_SECONDS with a single os.scandir(), which
+  only stats the directory entries - nothing is read or hashed until a
+  file looks finished.
+- Writes are debounced: a file is ready once its size and mtime have not
+  changed for DEBOUNCE_SECONDS. Hidden files and partial downloads
+  (.tmp, .part, .crdownload, ~$ lock files) are ignored.
+- Ready files are registered in the job ledger (job_ledger.py) with their
+  content hash, so an unchanged file is never re-processed and a changed
+  one starts over; the daemon's worker threads then claim them exactly
+  like ingest_worker.py does (and the two can run side by side).
+
+Latency:
+Every document is timed from the moment its file was last written (its
+mtime) until one of its chunks can be fetched from the live index, and the
+split is appended to LATENCY_LOG_PATH (JSONL):
+  detect    written -> the watcher saw it
+  debounce  seen -> stable for DEBOUNCE_SECONDS
+  queue     ready -> a worker picked it up
+  extract   Document Intelligence (or duplicate linking)
+  index     chunk + embed + upload
+  visible   upload accepted -> returned by a lookup in the index
+`report` prints p50 / p95 / max of each and the share of documents that
+were searchable within INGEST_SLA_SECONDS. Files already in the folder
+when the daemon starts are marked as backlog and left out of the figures.
+
+Usage:
+    python ingest_daemon.py                    # watch docs/ until Ctrl+C
+    python ingest_daemon.py run --create-index --threads 4
+    python ingest_daemon.py report             # "searchable within N seconds"
+"""
+
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+
+from job_ledger import Heartbeat, JobLedger, file_sha256, worker_id
+from ingest_worker import process_job
+from tracing import percentile, span
+import usage_ledger
+
+WATCH_DIR = os.environ.get("INGEST_WATCH_DIR", "docs")
+DEBOUNCE_SECONDS = float(os.environ.get("INGEST_DEBOUNCE_SECONDS", "2.0"))
+POLL_SECONDS = float(os.environ.get("INGEST_POLL_SECONDS", "1.0"))
+DAEMON_THREADS = int(os.environ.get("INGEST_DAEMON_THREADS", "2"))
+SEARCHABLE_TIMEOUT = float(os.environ.get("INGEST_SEARCHABLE_TIMEOUT", "30"))
+LATENCY_LOG_PATH = os.environ.get("INGEST_LATENCY_LOG_PATH", "traces/ingest_latency.jsonl")
+INGEST_SLA_SECONDS = float(os.environ.get("INGEST_SLA_SECONDS", "60"))
+
+IGNORED_SUFFIXES = (".tmp", ".part", ".crdownload", ".download", ".swp")
+CLAIM_STAGES = ["new", "extracted", "chunked", "embedded"]
+
+_log_lock = threading.Lock()
+
+
+# -- Watching --
+def ignored(name):
+    return name.startswith((".", "~$")) or name.lower().endswith(IGNORED_SUFFIXES)
+
+
+class Watcher:
+    """
+    Tracks WATCH_DIR by (size, mtime) and reports files whose writes have
+    settled. Nothing is hashed until a file is ready.
+    """
+
+    def __init__(self, directory=WATCH_DIR, debounce=DEBOUNCE_SECONDS):
+        self.directory = directory
+        self.debounce = debounce
+        self.known = {}      # name -> signature already handed out
+        self.pending = {}    # name -> {"signature", "seen_at", "changed_at"}
+        self.wake = threading.Event()
+        self.observer = None
+
+    def start(self):
+        """Use watchdog for change notifications when it is installed."""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print(f"  -> watchdog not installed; polling {self.directory}/ "
+                  f"every {POLL_SECONDS:g}s")
+            return
+        wake = self.wake
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), self.directory, recursive=False)
+        self.observer.daemon = True
+        self.observer.start()
+        print(f"  -> Watching {self.directory}/ for changes")
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+
+    def scan(self):
+        """Files whose size and mtime have been stable for the debounce period."""
+        now = time.time()
+        ready, present = [], set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if ignored(entry.name) or not entry.is_file():
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if self.known.get(entry.name) == signature:
+                    continue
+                seen = self.pending.get(entry.name)
+                if seen is None:
+                    self.pending[entry.name] = {"signature": signature, "seen_at": now,
+                                                "changed_at": now, "written_at": stat.st_mtime}
+                elif seen["signature"] != signature:
+                    seen.update(signature=signature, changed_at=now, written_at=stat.st_mtime)
+                elif now - seen["changed_at"] >= self.debounce and stat.st_size:
+                    ready.append((entry.name, dict(seen, ready_at=now)))
+        for name in set(self.pending) - present:
+            del self.pending[name]    # deleted or renamed before it settled
+        for name, _ in ready:
+            self.known[name] = self.pending.pop(name)["signature"]
+        return ready
+
+    def wait(self):
+        """Sleep until the next scan is due: sooner if a change was notified."""
+        timeout = POLL_SECONDS
+        if self.pending:
+            # Re-check exactly when the oldest pending file could be ready
+            due = min(p["changed_at"] for p in self.pending.values()) + self.debounce
+            timeout = min(timeout, max(0.05, due - time.time()))
+        self.wake.wait(timeout)
+        self.wake.clear()
+
+
+# -- Searchability --
+def first_chunk(ledger, doc_id):
+    """One index document uploaded for doc_id, or None if it has none of its own."""
+    import step2_index
+
+    documents = ledger.get_artifact(doc_id, "embedded") or []
+    own = step2_index.split_merges(documents)[0]
+    return own[0] if own else None
+
+
+def wait_searchable(ledger, doc_id, timeout=SEARCHABLE_TIMEOUT):
+    """
+    Poll the live index until a chunk of doc_id can be fetched. Returns the
+    seconds waited, or None on timeout. Documents linked to a duplicate are
+    answered by the canonical copy's chunks and count as searchable at once.
+    """
+    import step2_index
+    from azure.core.exceptions import ResourceNotFoundError
+    from rate_limiter import get_limiter, limited_call
+
+    chunk = first_chunk(ledger, doc_id)
+    if chunk is None:
+        return 0.0
+    client = step2_index.live_client()
+    start = time.perf_counter()
+    delay = 0.1
+    while time.perf_counter() - start < timeout:
+        try:
+            found = limited_call(get_limiter("search"), client.get_document,
+                                 key=chunk["id"], selected_fields=["id", "content"])
+            # An updated document: the old version of the chunk doesn't count
+            if found.get("content") == chunk["content"]:
+                return time.perf_counter() - start
+        except ResourceNotFoundError:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return None
+
+
+# -- Latency log --
+def log_latency(record):
+    with _log_lock:
+        os.makedirs(os.path.dirname(LATENCY_LOG_PATH) or ".", exist_ok=True)
+        with open(LATENCY_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def latency_record(doc_id, arrival, picked_at, timings, visible_s, chunks):
+    done_at = time.time()
+    return {
+        "doc_id": doc_id,
+        "at": round(done_at, 3),
+        "backlog": arrival.get("backlog", False),
+        "chunks": chunks,
+        "duplicate": bool(timings.get("duplicate")),
+        "searchable": visible_s is not None,
+        "detect_s": round(arrival["seen_at"] - arrival["written_at"], 3),
+        "debounce_s": round(arrival["ready_at"] - arrival["seen_at"], 3),
+        "queue_s": round(picked_at - arrival["ready_at"], 3),
+        "extract_s": round(timings.get("extract_s", 0.0), 3),
+        "index_s": round(timings.get("index_s", 0.0), 3),
+        "visible_s": round(visible_s, 3) if visible_s is not None else None,
+        "total_s": round(done_at - arrival["written_at"], 3),
+    }
+
+
+# -- Daemon --
+class IngestDaemon:
+    """Watcher thread feeding a small pool of ledger workers."""
+
+    def __init__(self, directory=WATCH_DIR, threads=DAEMON_THREADS):
+        self.directory = directory
+        self.threads = threads
+        self.ledger = JobLedger()
+        self.owner = worker_id()
+        self.heartbeat = Heartbeat(self.ledger, self.owner)
+        self.watcher = Watcher(directory)
+        self.work = queue.Queue()
+        self.arrivals = {}   # doc_id -> timestamps of its latest version
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def register_ready(self, ready, backlog=False):
+        for name, arrival in ready:
+            path = os.path.join(self.directory, name)
+            try:
+                content_hash = file_sha256(path)
+            except OSError:
+                continue   # removed between the scan and now
+            if not self.ledger.register(name, path, content_hash):
+                continue   # same content as what is already indexed (e.g. touched)
+            with self.lock:
+                self.arrivals[name] = dict(arrival, backlog=backlog)
+            print(f"  -> {'Backlog' if backlog else 'New'}: {name}")
+            self.work.put(name)
+
+    def watch(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.watcher.start()
+        # Whatever is already there is registered right away, without debouncing
+        self.watcher.debounce, debounce = 0, self.watcher.debounce
+        self.watcher.scan()
+        self.register_ready(self.watcher.scan(), backlog=True)
+        self.watcher.debounce = debounce
+        # Work left in the ledger by an earlier run (or failed retries) too
+        self.work.put(None)
+        while not self.stopped.is_set():
+            self.watcher.wait()
+            self.register_ready(self.watcher.scan())
+        self.watcher.stop()
+
+    def work_loop(self):
+        while not self.stopped.is_set():
+            try:
+                self.work.get(timeout=POLL_SECONDS * 5)
+            except queue.Empty:
+                pass   # look for retries that have come due
+            while not self.stopped.is_set():
+                job = self.ledger.claim(CLAIM_STAGES, self.owner)
+                if job is None:
+                    break
+                self.run_job(job)
+
+    def run_job(self, job):
+        doc_id = job["doc_id"]
+        picked_at = time.time()
+        with self.lock:
+            arrival = self.arrivals.pop(doc_id, None)
+        self.heartbeat.add(doc_id)
+        timings = {}
+        try:
+            with span("ingest_daemon.document", doc_id=doc_id):
+                chunks = process_job(self.ledger, job, timings)
+                self.ledger.release(doc_id)
+                visible_s = wait_searchable(self.ledger, doc_id)
+        except Exception as e:
+            self.ledger.fail(doc_id, e)
+            print(f"  [{self.owner}] ERROR processing {doc_id} at stage '{job['stage']}': {e}")
+            return
+        finally:
+            self.heartbeat.remove(doc_id)
+
+        if arrival is None:
+            # Resumed from the ledger: there is no write time to measure from
+            print(f"  -> {doc_id} done (resumed after '{job['stage']}')")
+            return
+        record = latency_record(doc_id, arrival, picked_at, timings, visible_s, chunks)
+        log_latency(record)
+        if record["searchable"]:
+            print(f"  -> {doc_id} searchable {record['total_s']:.1f}s after it was written "
+                  f"(extract {record['extract_s']:.1f}s, index {record['index_s']:.1f}s, "
+                  f"visible {record['visible_s']:.1f}s)")
+        else:
+            print(f"  -> {doc_id} uploaded but not searchable after {SEARCHABLE_TIMEOUT:g}s")
+
+    def run(self):
+        self.heartbeat.start()
+        workers = [threading.Thread(target=self.work_loop, daemon=True)
+                   for _ in range(self.threads)]
+        for t in workers:
+            t.start()
+        try:
+            self.watch()
+        except KeyboardInterrupt:
+            print("\nStopping: finishing the documents in progress...")
+        finally:
+            self.stopped.set()
+            for _ in workers:
+                self.work.put(None)
+            for t in workers:
+                t.join()
+            self.heartbeat.stopped.set()
+
+
+# -- Report --
+def print_report(path=LATENCY_LOG_PATH, sla=INGEST_SLA_SECONDS):
+    if not os.path.exists(path):
+        print(f"No ingest latencies logged at {path}")
+        return
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    live = [r for r in records if not r["backlog"]]
+    print(f"\n{len(records)} document(s) ingested, {len(records) - len(live)} of them backlog "
+          f"(left out below)")
+    if not live:
+        return
+
+    print(f"\n{'Stage':<10} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+    print("-" * 37)
+    for stage in ("detect", "debounce", "queue", "extract", "index", "visible", "total"):
+        values = [r[f"{stage}_s"] for r in live if r[f"{stage}_s"] is not None]
+        if values:
+            print(f"{stage:<10} {percentile(values, 50):>8.1f} {percentile(values, 95):>8.1f} "
+                  f"{max(values):>8.1f}")
+
+    within = sum(1 for r in live if r["searchable"] and r["total_s"] <= sla)
+    missing = sum(1 for r in live if not r["searchable"])
+    print(f"\nSearchable within {sla:g}s of being written: {within}/{len(live)} "
+          f"({within / len(live):.1%})")
+    if missing:
+        print(f"Not searchable within {SEARCHABLE_TIMEOUT:g}s of upload: {missing}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a folder and ingest new files.")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "report"])
+    parser.add_argument("--dir", default=WATCH_DIR, help=f"folder to watch (default: {WATCH_DIR})")
+    parser.add_argument("--threads", type=int, default=DAEMON_THREADS,
+                        help=f"documents processed at once (default: {DAEMON_THREADS})")
+    parser.add_argument("--create-index", action="store_true",
+                        help="create/update the search index before starting")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print_report()
+        return
+
+    print("=" * 50)
+    print(f"INGEST DAEMON: {args.dir}/ (debounce {DEBOUNCE_SECONDS:g}s, "
+          f"{args.threads} thread(s))")
+    print("=" * 50)
+    if args.create_index:
+        import step2_index
+        step2_index.create_search_index()
+
+    IngestDaemon(args.dir, args.threads).run()
+    usage_ledger.print_usage_summary()
+
+
+if __name__ == "__main__":
+    main()
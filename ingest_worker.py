@@ -0,0 +1,169 @@
+"""
+ingest_worker.py
+
+Runs the whole ingest pipeline (extract -> chunk -> embed -> upload) as a
+pool of workers sharing the job ledger (job_ledger.py).
+
+Start as many of these as you like - several processes on one host, or on
+several hosts pointing INGEST_LEDGER_PATH at the same file on a shared
+filesystem. Each worker claims one document at a time with a lease, keeps
+the lease alive with a heartbeat while it works, and checkpoints after every
+stage. If a worker dies, its document is reclaimed by another worker once
+the lease runs out.
+
+Parallelism:
+- Processes (--processes) run chunking/tokenization on separate cores.
+- Threads per process (--threads) keep several network-bound extractions
+  and uploads in flight; embeddings are additionally batched and fanned
+  out inside step2_index.get_embeddings().
+
+Usage:
+    python ingest_worker.py --processes 4 --threads 4
+    python ingest_worker.py --processes 8 --follow      # keep polling for new work
+
+When sharing the ledger over a network filesystem, set INGEST_LEDGER_WAL=0.
+"""
+
+import os
+import glob
+import time
+import argparse
+import threading
+import multiprocessing
+
+from job_ledger import Heartbeat, JobLedger, file_sha256, print_status, worker_id
+from tracing import span
+import usage_ledger
+
+IDLE_POLL_SECONDS = 5
+
+
+def register_docs(ledger):
+    """Add every file in docs/ to the ledger (safe to run from many workers)."""
+    doc_files = glob.glob("docs/*")
+    for filepath in doc_files:
+        ledger.register(os.path.basename(filepath), filepath, file_sha256(filepath))
+    return len(doc_files)
+
+
+def process_job(ledger, job, timings=None):
+    """
+    Drive one claimed document through all of its remaining stages.
+    Seconds spent extracting and indexing are added to `timings` if given.
+    """
+    # Imported here so each spawned process builds its own SDK clients
+    import step1_extract
+    import step2_index
+
+    timings = {} if timings is None else timings
+    with span("ingest.document", doc_id=job["doc_id"], stage=job["stage"]), \
+            usage_ledger.attribute("document", job["doc_id"]):
+        if job["stage"] == "new":
+            start = time.perf_counter()
+            if step1_extract.link_duplicate_scan(ledger, job["doc_id"], job["source_path"]):
+                timings["duplicate"] = True
+                return 0
+            step1_extract.extract_document(job["source_path"])
+            ledger.advance(job["doc_id"], "extracted")
+            job = dict(job, stage="extracted")
+            timings["extract_s"] = time.perf_counter() - start
+        start = time.perf_counter()
+        chunks = step2_index.process_document(ledger, job) or 0
+        timings["index_s"] = time.perf_counter() - start
+        return chunks
+
+
+def worker_thread(ledger, heartbeat, owner, follow, totals):
+    stages = ["new", "extracted", "chunked", "embedded"]
+    while True:
+        job = ledger.claim(stages, owner)
+        if job is None:
+            if not follow:
+                return
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+
+        heartbeat.add(job["doc_id"])
+        try:
+            chunks = process_job(ledger, job)
+            ledger.release(job["doc_id"])
+            with heartbeat.lock:
+                totals["documents"] += 1
+                totals["chunks"] += chunks
+        except Exception as e:
+            ledger.fail(job["doc_id"], e)
+            print(f"  [{owner}] ERROR processing {job['doc_id']} "
+                  f"at stage '{job['stage']}': {e}")
+            with heartbeat.lock:
+                totals["failed"] += 1
+        finally:
+            heartbeat.remove(job["doc_id"])
+
+
+def worker_main(threads, follow):
+    """Entry point for one worker process. Returns its totals."""
+    ledger = JobLedger()
+    owner = worker_id()
+    heartbeat = Heartbeat(ledger, owner)
+    heartbeat.start()
+
+    totals = {"documents": 0, "chunks": 0, "failed": 0}
+    pool = [threading.Thread(target=worker_thread,
+                             args=(ledger, heartbeat, owner, follow, totals))
+            for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    heartbeat.stopped.set()
+
+    print(f"  [{owner}] done: {totals['documents']} document(s), "
+          f"{totals['chunks']} chunk(s), {totals['failed']} failed")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ingest workers against the job ledger.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes on this host (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="concurrent documents per process (default: 4)")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep polling for new work instead of exiting when idle")
+    parser.add_argument("--create-index", action="store_true",
+                        help="create/update the search index before starting")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("INGEST WORKERS")
+    print("=" * 50)
+
+    ledger = JobLedger()
+    print(f"Registered {register_docs(ledger)} file(s) from docs/")
+
+    if args.create_index:
+        import step2_index
+        step2_index.create_search_index()
+
+    # Token usage from every worker process is reported as one run
+    os.environ["USAGE_RUN_ID"] = usage_ledger.RUN_ID
+
+    start = time.perf_counter()
+    # spawn: every process opens its own SQLite connection and SDK clients
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        results = pool.starmap(worker_main, [(args.threads, args.follow)] * args.processes)
+    elapsed = time.perf_counter() - start
+
+    documents = sum(r["documents"] for r in results)
+    chunks = sum(r["chunks"] for r in results)
+    failed = sum(r["failed"] for r in results)
+    print(f"\n{documents} document(s) / {chunks} chunk(s) in {elapsed:.1f}s "
+          f"({documents / elapsed:.2f} docs/s) across {args.processes} process(es), "
+          f"{failed} failed")
+    print_status(ledger)
+    usage_ledger.print_usage_summary()
+
+
+if __name__ == "__main__":
+    main()
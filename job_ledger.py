@@ -0,0 +1,496 @@
+"""
+job_ledger.py
+
+Durable job ledger for the ingest pipeline, backed by SQLite.
+
+Each document moves through:
+    new -> extracted -> chunked -> embedded -> uploaded
+
+step1_extract.py and step2_index.py claim jobs from the ledger, checkpoint
+after every stage, and record failures (with the error) instead of stopping.
+If a run crashes or gets throttled, the next run picks up where it left off:
+finished stages are not redone, and jobs left 'running' by a dead process
+are reclaimed once their lease expires. Long-running workers keep their
+claims alive with heartbeat().
+
+Several processes - on one host, or on several hosts sharing the ledger file
+over a network filesystem - can claim from the same ledger (see
+ingest_worker.py). WAL journaling is used by default; set
+INGEST_LEDGER_WAL=0 when the ledger lives on a network share, where WAL
+is not supported.
+
+Intermediate results (chunks, embeddings) are stored as artifacts so a
+document can resume from the last completed stage.
+
+A file that changes while its job is running is not reset under the running
+worker (a second worker would claim it, and the first one's release would
+mark the new content done): the new hash is parked in next_hash and the job
+starts over for it when the running claim is released or fails.
+
+Usage:
+    python job_ledger.py status          # counts per stage/status + failures
+    python job_ledger.py retry           # make failed jobs claimable again
+    python job_ledger.py reset <doc_id>  # start a document over from 'new'
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import sqlite3
+import threading
+
+LEDGER_PATH = os.environ.get("INGEST_LEDGER_PATH", "ingest_state/ledger.db")
+STAGES = ["new", "extracted", "chunked", "embedded", "uploaded"]
+LEDGER_WAL = os.environ.get("INGEST_LEDGER_WAL", "1") == "1"
+LEASE_SECONDS = 600
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3
+# The 'embedded' artifact of the last uploaded version of a changed document
+PREVIOUS_EMBEDDED = "embedded.previous"
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    doc_id        TEXT PRIMARY KEY,
+    source_path   TEXT,
+    content_hash  TEXT,
+    stage         TEXT NOT NULL DEFAULT 'new',
+    status        TEXT NOT NULL DEFAULT 'pending',
+    owner         TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    not_before    REAL NOT NULL DEFAULT 0,
+    last_error    TEXT,
+    next_hash     TEXT,
+    next_source   TEXT,
+    updated_at    REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_stage_status ON jobs(stage, status);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    doc_id  TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (doc_id, kind)
+);
+
+CREATE TABLE IF NOT EXISTS failures (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id  TEXT NOT NULL,
+    stage   TEXT NOT NULL,
+    owner   TEXT,
+    error   TEXT,
+    at      REAL
+);
+"""
+
+
+def file_sha256(path):
+    """Content hash used to notice when a source file has changed."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def worker_id():
+    """Identifies the claiming process, e.g. 'ingest-01:4312'."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def dead_local_owner(owner):
+    """True if `owner` is a process on this host that is no longer running."""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit() or os.name == "nt":
+        return False   # another host, or no safe liveness check (os.kill terminates on Windows)
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class JobLedger:
+    """SQLite-backed ledger of documents and the stage each has reached."""
+
+    def __init__(self, path=LEDGER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # Other workers may hold the write lock briefly - wait instead of failing
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        if LEDGER_WAL:
+            self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("next_hash", "next_source"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    # -- Registration --
+    def register(self, doc_id, source_path=None, content_hash=None, stage="new"):
+        """
+        Add a document to the ledger. If it is already there with a different
+        content hash, it starts over from `stage` and its artifacts are dropped,
+        except that what was last uploaded is kept as PREVIOUS_EMBEDDED so
+        step2 can reuse the vectors of unchanged chunks and remove stale ones.
+        A job that is running keeps going; the new hash waits in next_hash
+        until release() or fail(). Returns True if there is new work.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, stage, status, next_hash FROM jobs WHERE doc_id = ?",
+                (doc_id,),
+            ).fetchone()
+            if row is None:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO jobs "
+                    "(doc_id, source_path, content_hash, stage, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, source_path, content_hash, stage, now),
+                )
+                return cursor.rowcount == 1
+            latest = row["next_hash"] or row["content_hash"]
+            if not (content_hash and latest and latest != content_hash):
+                return False
+            if row["status"] == "running":
+                # Don't pull the job out from under its worker; release() restarts it
+                next_hash = None if content_hash == row["content_hash"] else content_hash
+                self._conn.execute(
+                    "UPDATE jobs SET next_hash = ?, next_source = ? WHERE doc_id = ?",
+                    (next_hash, source_path if next_hash else None, doc_id),
+                )
+                return next_hash is not None
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._restart(doc_id, content_hash, source_path, stage, row["stage"], now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return True
+
+    def _restart(self, doc_id, content_hash, source_path, stage, reached, now):
+        """Start a changed document over (caller holds the lock and a transaction)."""
+        self._conn.execute(
+            "UPDATE jobs SET content_hash = ?, source_path = COALESCE(?, source_path), "
+            "stage = ?, status = 'pending', owner = NULL, lease_expires = NULL, attempts = 0, "
+            "not_before = 0, last_error = NULL, next_hash = NULL, next_source = NULL, "
+            "updated_at = ? WHERE doc_id = ?",
+            (content_hash, source_path, stage, now, doc_id),
+        )
+        if reached == STAGES[-1]:
+            self._conn.execute(
+                "DELETE FROM artifacts WHERE doc_id = ? AND kind = ?",
+                (doc_id, PREVIOUS_EMBEDDED))
+            self._conn.execute(
+                "UPDATE artifacts SET kind = ? WHERE doc_id = ? AND kind = 'embedded'",
+                (PREVIOUS_EMBEDDED, doc_id))
+        self._conn.execute("DELETE FROM artifacts WHERE doc_id = ? AND kind != ?",
+                           (doc_id, PREVIOUS_EMBEDDED))
+
+    def _restart_changed(self, doc_id, now):
+        """
+        If the file changed while the job ran, start it over for the new
+        content and return True (caller holds the lock and a transaction).
+        """
+        row = self._conn.execute(
+            "SELECT stage, next_hash, next_source FROM jobs WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if row is None or not row["next_hash"]:
+            return False
+        self._restart(doc_id, row["next_hash"], row["next_source"], STAGES[0], row["stage"], now)
+        return True
+
+    # -- Claiming --
+    def claim(self, stages, owner=None, lease_seconds=LEASE_SECONDS):
+        """
+        Claim the next job sitting at one of `stages`. Pending jobs, failed
+        jobs that are due for a retry, and running jobs whose lease has
+        expired - or whose owner is a process on this host that has died -
+        are all claimable. Returns the job as a dict, or None.
+        """
+        owner = owner or worker_id()
+        now = time.time()
+        placeholders = ",".join("?" for _ in stages)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A crashed local run shouldn't hold its documents until the lease runs out
+                owners = self._conn.execute(
+                    "SELECT DISTINCT owner FROM jobs WHERE status = 'running' AND owner LIKE ?",
+                    (f"{socket.gethostname()}:%",),
+                ).fetchall()
+                dead = [r["owner"] for r in owners if dead_local_owner(r["owner"])]
+                row = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE stage IN ({placeholders}) AND ("
+                    "  status = 'pending'"
+                    "  OR (status = 'failed' AND attempts < ? AND not_before <= ?)"
+                    "  OR (status = 'running' AND lease_expires < ?)"
+                    f"  OR (status = 'running' AND owner IN ({','.join('?' for _ in dead) or 'NULL'}))"
+                    ") ORDER BY updated_at LIMIT 1",
+                    (*stages, MAX_ATTEMPTS, now, now, *dead),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_expires = ?, "
+                    "updated_at = ? WHERE doc_id = ?",
+                    (owner, now + lease_seconds, now, row["doc_id"]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row, status="running", owner=owner)
+
+    def heartbeat(self, doc_ids, owner, lease_seconds=LEASE_SECONDS):
+        """
+        Extend the lease on jobs this worker holds. Returns the doc_ids that
+        are still owned by `owner` (a job whose lease lapsed may have been
+        reclaimed by another worker).
+        """
+        now = time.time()
+        held = set()
+        with self._lock:
+            for doc_id in doc_ids:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET lease_expires = ? "
+                    "WHERE doc_id = ? AND owner = ? AND status = 'running'",
+                    (now + lease_seconds, doc_id, owner),
+                )
+                if cursor.rowcount:
+                    held.add(doc_id)
+        return held
+
+    def advance(self, doc_id, stage):
+        """Checkpoint a claimed job at `stage` (the claim is kept)."""
+        self._write(
+            "UPDATE jobs SET stage = ?, updated_at = ? WHERE doc_id = ?",
+            (stage, time.time(), doc_id),
+        )
+
+    def release(self, doc_id):
+        """
+        Give up the claim: the job is 'done' at the last stage, else
+        'pending' - or back at 'new' if the file changed while it ran.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._restart_changed(doc_id, now):
+                    self._conn.execute(
+                        "UPDATE jobs SET "
+                        "status = CASE WHEN stage = ? THEN 'done' ELSE 'pending' END, "
+                        "owner = NULL, lease_expires = NULL, attempts = 0, last_error = NULL, "
+                        "updated_at = ? WHERE doc_id = ?",
+                        (STAGES[-1], now, doc_id),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def fail(self, doc_id, error):
+        """
+        Record a failure; the job becomes claimable again after a backoff
+        (or right away for new content, if the file changed while it ran).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT stage, owner, attempts FROM jobs WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT INTO failures (doc_id, stage, owner, error, at) VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, row["stage"] if row else "?", row["owner"] if row else None,
+                     str(error), now),
+                )
+                if not self._restart_changed(doc_id, now):
+                    attempts = (row["attempts"] if row else 0) + 1
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', owner = NULL, lease_expires = NULL, "
+                        "attempts = ?, not_before = ?, last_error = ?, updated_at = ? "
+                        "WHERE doc_id = ?",
+                        (attempts, now + 30 * 2 ** (attempts - 1), str(error), now, doc_id),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # -- Artifacts --
+    def put_artifact(self, doc_id, kind, obj):
+        self._write(
+            "INSERT OR REPLACE INTO artifacts (doc_id, kind, payload) VALUES (?, ?, ?)",
+            (doc_id, kind, json.dumps(obj)),
+        )
+
+    def get_artifact(self, doc_id, kind):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM artifacts WHERE doc_id = ? AND kind = ?", (doc_id, kind)
+            ).fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def delete_artifact(self, doc_id, kind):
+        self._write("DELETE FROM artifacts WHERE doc_id = ? AND kind = ?", (doc_id, kind))
+
+    def artifacts(self, kind):
+        """Yield (doc_id, obj) for every stored artifact of one kind."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, payload FROM artifacts WHERE kind = ? ORDER BY doc_id", (kind,)
+            ).fetchall()
+        for row in rows:
+            yield row["doc_id"], json.loads(row["payload"])
+
+    # -- Reporting / maintenance --
+    def get(self, doc_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE doc_id = ?", (doc_id,)).fetchone()
+        return dict(row) if row else None
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, status, COUNT(*) AS n FROM jobs GROUP BY stage, status"
+            ).fetchall()
+        return {(r["stage"], r["status"]): r["n"] for r in rows}
+
+    def uploaded_since(self, timestamp):
+        """doc_ids that reached the last stage after `timestamp` (epoch seconds)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id FROM jobs WHERE stage = ? AND updated_at > ? ORDER BY doc_id",
+                (STAGES[-1], timestamp),
+            ).fetchall()
+        return [r["doc_id"] for r in rows]
+
+    def failed_jobs(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, stage, attempts, last_error FROM jobs "
+                "WHERE status = 'failed' ORDER BY doc_id"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def retry_failed(self):
+        return self._write(
+            "UPDATE jobs SET status = 'pending', attempts = 0, not_before = 0 "
+            "WHERE status = 'failed'"
+        ).rowcount
+
+    def reset(self, doc_id, stage="new"):
+        self._write(
+            "UPDATE jobs SET stage = ?, status = 'pending', owner = NULL, attempts = 0, "
+            "not_before = 0, last_error = NULL, updated_at = ? WHERE doc_id = ?",
+            (stage, time.time(), doc_id),
+        )
+
+
+class Heartbeat(threading.Thread):
+    """Renews the lease on every job this process is working on."""
+
+    def __init__(self, ledger, owner):
+        super().__init__(daemon=True)
+        self.ledger = ledger
+        self.owner = owner
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add(self, doc_id):
+        with self.lock:
+            self.held.add(doc_id)
+
+    def remove(self, doc_id):
+        with self.lock:
+            self.held.discard(doc_id)
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_SECONDS):
+            with self.lock:
+                held = set(self.held)
+            lost = held - self.ledger.heartbeat(held, self.owner)
+            for doc_id in lost:
+                print(f"  [{self.owner}] lease lost on {doc_id}; another worker may redo it")
+
+
+def run_jobs(ledger, stages, handler, owner=None):
+    """
+    Claim and process jobs at `stages` until none are left. `handler(job)`
+    does the work and checkpoints with ledger.advance(). Failures are
+    recorded and the loop moves on to the next document. The lease is kept
+    alive while a document takes longer than LEASE_SECONDS.
+    Returns (succeeded, failed) counts.
+    """
+    owner = owner or worker_id()
+    heartbeat = Heartbeat(ledger, owner)
+    heartbeat.start()
+    succeeded = failed = 0
+    try:
+        while True:
+            job = ledger.claim(stages, owner)
+            if job is None:
+                return succeeded, failed
+            heartbeat.add(job["doc_id"])
+            try:
+                handler(job)
+                ledger.release(job["doc_id"])
+                succeeded += 1
+            except Exception as e:
+                ledger.fail(job["doc_id"], e)
+                print(f"  ERROR processing {job['doc_id']} at stage '{job['stage']}': {e}")
+                failed += 1
+            finally:
+                heartbeat.remove(job["doc_id"])
+    finally:
+        heartbeat.stopped.set()
+
+
+def print_status(ledger):
+    counts = ledger.counts()
+    print(f"\n{'Stage':<12} {'pending':>8} {'running':>8} {'failed':>8} {'done':>8}")
+    print("-" * 48)
+    for stage in STAGES:
+        row = [counts.get((stage, s), 0) for s in ("pending", "running", "failed", "done")]
+        print(f"{stage:<12} {row[0]:>8} {row[1]:>8} {row[2]:>8} {row[3]:>8}")
+
+    failed = ledger.failed_jobs()
+    if failed:
+        print(f"\nFailed jobs ({len(failed)}):")
+        for job in failed:
+            print(f"  {job['doc_id']} at '{job['stage']}' "
+                  f"(attempt {job['attempts']}/{MAX_ATTEMPTS}): {job['last_error']}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    ledger = JobLedger()
+    if command == "status":
+        print_status(ledger)
+    elif command == "retry":
+        print(f"{ledger.retry_failed()} failed job(s) queued for retry.")
+    elif command == "reset" and len(sys.argv) > 2:
+        ledger.reset(sys.argv[2])
+        print(f"{sys.argv[2]} reset to 'new'.")
+    else:
+        print(__doc__)
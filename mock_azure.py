@@ -0,0 +1,627 @@
+"""
+mock_azure.py
+
+Offline stand-in for the Azure services the pipeline calls, so step1/2/3/5
+can be load-tested and profiled on a laptop or in CI without credentials.
+
+One local HTTP server implements the REST endpoints the real SDK clients use:
+- Document Intelligence: analyze (long-running) + result polling
+- Azure OpenAI: embeddings, chat completions
+- Azure AI Search: create/get/delete/list index, upload documents,
+  document count, get document, hybrid (keyword + vector) search
+
+Responses are deterministic: embeddings are hashed bag-of-words vectors (so
+similar text gets similar vectors), extraction returns the text of the
+uploaded file, and search ranks with BM25-style keyword scoring fused with
+cosine similarity (reciprocal rank fusion, like the real hybrid query).
+
+Per-service latency, requests-per-minute limits, and random 429s (with
+Retry-After and x-ratelimit-* headers) are configurable.
+
+Point the scripts at it through the normal environment variables:
+    python mock_azure.py --port 8765 --latency-ms 20 --rpm 600
+    # then, in another shell, export the variables it prints and run
+    python step2_index.py
+
+Or in-process (see bench_pipeline.py):
+    server, env = start_mock_server({"latency_ms": {"openai": 5}})
+    os.environ.update(env)
+"""
+
+import re
+import io
+import sys
+import json
+import math
+import time
+import uuid
+import base64
+import random
+import struct
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+DEFAULT_CONFIG = {
+    "latency_ms": {"docintel": 50, "openai": 20, "search": 10},
+    "rpm": {"docintel": None, "openai": None, "search": None},
+    "throttle_rate": 0.0,        # fraction of requests answered with a random 429
+    "retry_after_ms": 500,
+    "embedding_dimensions": 1536,
+    "word_confidence": 0.97,     # average confidence reported for extracted words
+    "seed": 0,
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def count_tokens(text):
+    return len(text or "") // 4 + 1
+
+
+# -- Deterministic embeddings --
+def embed(text, dimensions):
+    """Feature-hashed unigrams + bigrams, L2-normalised."""
+    vector = [0.0] * dimensions
+    words = tokenize(text)
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        digest = hashlib.md5(feature.encode()).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+# -- Document text for analyze --
+def document_pages(body, content_type):
+    """
+    Text of each page of an uploaded file: text files split on form feeds,
+    PDFs via pypdf when installed, anything else gets deterministic filler.
+    """
+    if body.startswith(b"%PDF"):
+        try:
+            from pypdf import PdfReader
+            return [page.extract_text() or "" for page in PdfReader(io.BytesIO(body)).pages]
+        except ImportError:
+            pass
+    elif not content_type.startswith("image/"):
+        try:
+            return body.decode("utf-8").split("\f")
+        except UnicodeDecodeError:
+            pass
+
+    digest = hashlib.sha256(body).hexdigest()
+    return [f"# Scanned document {digest[:8]}\n\nPrincipal {digest[8:14]} appoints "
+            f"agent {digest[14:20]} under this power of attorney."]
+
+
+def parse_page_selection(pages, page_count):
+    """'1-3,5' -> [1, 2, 3, 5] (1-based)."""
+    if not pages:
+        return list(range(1, page_count + 1))
+    selected = []
+    for part in pages.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            selected.extend(range(int(first), int(last) + 1))
+        elif part.strip():
+            selected.append(int(part))
+    return [p for p in selected if 1 <= p <= page_count]
+
+
+def build_analyze_result(body, content_type, pages_param, features, config):
+    texts = document_pages(body, content_type)
+    content_parts, pages, offset = [], [], 0
+    high_res = "ocrHighResolution" in (features or "")
+    for n, page_number in enumerate(parse_page_selection(pages_param, len(texts))):
+        if n:
+            separator = "\n\n<!-- PageBreak -->\n\n"
+            content_parts.append(separator)
+            offset += len(separator)
+        text = texts[page_number - 1].strip()
+        words = []
+        for match in re.finditer(r"\S+", text):
+            jitter = (hashlib.md5(match.group().encode()).digest()[0] / 255 - 0.5) * 0.06
+            confidence = min(1.0, config["word_confidence"] + jitter + (0.02 if high_res else 0))
+            words.append({
+                "content": match.group(),
+                "polygon": [],
+                "confidence": round(max(0.0, confidence), 3),
+                "span": {"offset": offset + match.start(), "length": len(match.group())},
+            })
+        pages.append({
+            "pageNumber": page_number,
+            "width": 8.5, "height": 11, "unit": "inch",
+            "spans": [{"offset": offset, "length": len(text)}],
+            "words": words, "lines": [], "selectionMarks": [],
+        })
+        content_parts.append(text)
+        offset += len(text)
+
+    return {
+        "apiVersion": "2024-11-30",
+        "modelId": "prebuilt-layout",
+        "stringIndexType": "textElements",
+        "content": "".join(content_parts),
+        "contentFormat": "markdown",
+        "pages": pages,
+    }
+
+
+# -- Search --
+def parse_filter(expression):
+    """
+    Tiny OData subset: `field eq 'x'`, `field ne 3`, `search.in(field, 'a,b')`,
+    `coll/any(t: t eq 'x')`, joined with `and` / `or` (no parentheses).
+    Returns a predicate over a document dict.
+    """
+    if not expression:
+        return lambda doc: True
+
+    def clause(text):
+        text = text.strip()
+        m = re.match(r"search\.in\((\w+),\s*'([^']*)'(?:,\s*'([^']*)')?\)$", text)
+        if m:
+            field, values, delimiter = m.group(1), m.group(2), m.group(3) or ","
+            allowed = {v.strip() for v in re.split("[" + re.escape(delimiter) + "]", values)}
+            return lambda doc: str(doc.get(field)) in allowed
+        m = re.match(r"(\w+)/any\(\w+:\s*\w+\s+eq\s+'([^']*)'\)$", text)
+        if m:
+            field, value = m.group(1), m.group(2)
+            return lambda doc: value in (doc.get(field) or [])
+        m = re.match(r"(\w+)\s+(eq|ne|gt|ge|lt|le)\s+(.+)$", text)
+        if not m:
+            raise ValueError(f"Unsupported filter clause: {text}")
+        field, op, raw = m.groups()
+        value = raw[1:-1] if raw.startswith("'") else (None if raw == "null" else float(raw))
+        ops = {
+            "eq": lambda a: a == value, "ne": lambda a: a != value,
+            "gt": lambda a: a is not None and a > value, "ge": lambda a: a is not None and a >= value,
+            "lt": lambda a: a is not None and a < value, "le": lambda a: a is not None and a <= value,
+        }
+        return lambda doc: ops[op](doc.get(field))
+
+    alternatives = [[clause(c) for c in re.split(r"\s+and\s+", part)]
+                    for part in re.split(r"\s+or\s+", expression)]
+    return lambda doc: any(all(c(doc) for c in group) for group in alternatives)
+
+
+class MockIndex:
+    """In-memory search index: documents + a lazily rebuilt keyword index."""
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.documents = {}
+        self.key_field = next((f["name"] for f in definition.get("fields", []) if f.get("key")), "id")
+        self.text_fields = [f["name"] for f in definition.get("fields", [])
+                            if f.get("searchable", True) and f.get("type") == "Edm.String"]
+
+    def upload(self, actions):
+        results = []
+        for action in actions:
+            kind = action.pop("@search.action", "upload")
+            key = action.get(self.key_field)
+            if kind == "delete":
+                self.documents.pop(key, None)
+            elif kind in ("merge", "mergeOrUpload") and key in self.documents:
+                self.documents[key].update(action)
+            else:
+                self.documents[key] = action
+            results.append({"key": key, "status": True, "errorMessage": None, "statusCode": 200})
+        return results
+
+    def keyword_ranking(self, query, candidates):
+        terms = tokenize(query)
+        if not terms or query.strip() == "*":
+            return []
+        n = len(candidates) or 1
+        doc_terms = {key: Counter(tokenize(" ".join(str(doc.get(f, "")) for f in self.text_fields)))
+                     for key, doc in candidates.items()}
+        df = Counter(t for counts in doc_terms.values() for t in set(counts))
+        avg_len = sum(sum(c.values()) for c in doc_terms.values()) / n or 1
+        scores = {}
+        for key, counts in doc_terms.items():
+            length = sum(counts.values())
+            score = 0.0
+            for t in terms:
+                if counts[t]:
+                    idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                    score += idf * counts[t] * 2.2 / (counts[t] + 1.2 * (0.25 + 0.75 * length / avg_len))
+            if score > 0:
+                scores[key] = score
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def vector_ranking(self, vector_query, candidates):
+        field = vector_query.get("fields", "content_vector").split(",")[0]
+        vector = vector_query["vector"]
+        scored = [(cosine(vector, doc[field]), key) for key, doc in candidates.items()
+                  if doc.get(field)]
+        scored.sort(reverse=True)
+        return [key for _, key in scored[:vector_query.get("k", 50)]]
+
+    def search(self, request):
+        predicate = parse_filter(request.get("filter"))
+        candidates = {k: d for k, d in self.documents.items() if predicate(d)}
+
+        rankings = []
+        keyword = self.keyword_ranking(request.get("search") or "", candidates)
+        if keyword:
+            rankings.append(keyword)
+        for vector_query in request.get("vectorQueries") or []:
+            rankings.append(self.vector_ranking(vector_query, candidates))
+        if not rankings:
+            rankings.append(list(candidates))
+
+        # Reciprocal rank fusion, as used by hybrid search
+        fused = Counter()
+        for ranking in rankings:
+            for rank, key in enumerate(ranking):
+                fused[key] += 1 / (60 + rank + 1)
+
+        top = request.get("top") or 50
+        select = request.get("select")
+        fields = [f.strip() for f in select.split(",")] if select else None
+        results = []
+        for key, score in fused.most_common(top):
+            doc = self.documents[key]
+            item = {f: doc.get(f) for f in fields} if fields else dict(doc)
+            item["@search.score"] = round(score, 6)
+            if request.get("queryType") == "semantic":
+                item["@search.rerankerScore"] = round(score * 60, 4)
+            results.append(item)
+        return results
+
+
+# -- Throttling --
+class ServiceLimiter:
+    """Server-side requests-per-minute window for one mock service."""
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.window_start = time.monotonic()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        """Returns (allowed, remaining, seconds_until_reset)."""
+        if not self.rpm:
+            return True, 1000000, 0
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start, self.count = now, 0
+            if self.count >= self.rpm:
+                return False, 0, 60 - (now - self.window_start)
+            self.count += 1
+            return True, self.rpm - self.count, 60 - (now - self.window_start)
+
+
+class MockState:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.analyze_results = {}
+        self.limiters = {name: ServiceLimiter(rpm) for name, rpm in config["rpm"].items()}
+        self.random = random.Random(config["seed"])
+        self.stats = Counter()
+
+
+# -- HTTP handler --
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    # Plumbing
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, payload=None, headers=None, content_type="application/json"):
+        data = b""
+        if payload is not None:
+            data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _service(self, path):
+        if path.startswith("/documentintelligence"):
+            return "docintel"
+        if path.startswith("/openai"):
+            return "openai"
+        return "search"
+
+    def _gate(self, service, tokens=0):
+        """Latency + throttling shared by every route. Returns headers or None if 429 sent."""
+        state = self.state
+        config = state.config
+        latency = config["latency_ms"].get(service) or 0
+        if latency:
+            time.sleep(latency / 1000 * (0.8 + 0.4 * state.random.random()))
+
+        allowed, remaining, reset = state.limiters[service].check()
+        headers = {"x-ratelimit-remaining-requests": remaining,
+                   "x-ratelimit-remaining-tokens": max(0, remaining * 1000 - tokens)}
+        with state.lock:
+            injected = state.random.random() < config["throttle_rate"]
+        if not allowed or injected:
+            retry_ms = config["retry_after_ms"] if allowed else int(reset * 1000)
+            state.stats[f"{service}.429"] += 1
+            self._send(429, {"error": {"code": "429", "message": "Rate limit exceeded (mock)"}},
+                       headers={"Retry-After": max(1, math.ceil(retry_ms / 1000)),
+                                "retry-after-ms": retry_ms, **headers})
+            return None
+        return headers
+
+    def _route(self, method):
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        body = self._body() if method in ("POST", "PUT") else b""
+        service = self._service(path)
+
+        if path == "/_mock/stats":
+            return self._send(200, dict(self.state.stats))
+        if path == "/_mock/reset" and method == "POST":
+            self.state.stats.clear()
+            return self._send(204)
+
+        headers = self._gate(service, tokens=len(body) // 4)
+        if headers is None:
+            return
+        self.state.stats[f"{service}.{method}"] += 1
+
+        try:
+            if service == "docintel":
+                return self._docintel(method, path, query, body, headers)
+            if service == "openai":
+                return self._openai(path, json.loads(body or b"{}"), headers)
+            return self._search(method, path, query, body, headers)
+        except (KeyError, ValueError) as e:
+            return self._send(400, {"error": {"code": "BadRequest", "message": str(e)}})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    # Document Intelligence
+    def _docintel(self, method, path, query, body, headers):
+        state = self.state
+        m = re.match(r"/documentintelligence/documentModels/([^/:]+):analyze$", path)
+        if m and method == "POST":
+            result = build_analyze_result(body, self.headers.get("Content-Type", ""),
+                                          query.get("pages"), query.get("features"), state.config)
+            result_id = str(uuid.uuid4())
+            with state.lock:
+                state.analyze_results[result_id] = result
+            state.stats["docintel.pages"] += len(result["pages"])
+            location = (f"http://{self.headers['Host']}/documentintelligence/documentModels/"
+                        f"{m.group(1)}/analyzeResults/{result_id}?api-version={query.get('api-version', '')}")
+            return self._send(202, None, headers={"Operation-Location": location,
+                                                  "Retry-After": 0, **headers})
+
+        m = re.match(r"/documentintelligence/documentModels/[^/]+/analyzeResults/([^/]+)$", path)
+        if m and method == "GET":
+            with state.lock:
+                result = state.analyze_results.pop(m.group(1), None)
+            if result is None:
+                return self._send(404, {"error": {"code": "NotFound", "message": "result expired"}})
+            now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            return self._send(200, {"status": "succeeded", "createdDateTime": now,
+                                    "lastUpdatedDateTime": now, "analyzeResult": result},
+                              headers=headers)
+        return self._send(404, {"error": {"code": "NotFound", "message": path}})
+
+    # Azure OpenAI
+    def _openai(self, path, request, headers):
+        m = re.match(r"/openai/deployments/([^/]+)/(embeddings|chat/completions)$", path)
+        if not m:
+            return self._send(404, {"error": {"code": "NotFound", "message": path}})
+        deployment, operation = m.groups()
+
+        if operation == "embeddings":
+            inputs = request["input"]
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            dimensions = request.get("dimensions") or self.state.config["embedding_dimensions"]
+            data = []
+            for i, text in enumerate(inputs):
+                vector = embed(text, dimensions)
+                if request.get("encoding_format") == "base64":
+                    vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            tokens = sum(count_tokens(t) for t in inputs)
+            self.state.stats["openai.embedding_inputs"] += len(inputs)
+            return self._send(200, {"object": "list", "data": data, "model": deployment,
+                                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}},
+                              headers=headers)
+
+        messages = request.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        if "valid JSON" in prompt:
+            answer = json.dumps({"fields": {}, "fields_found": 0, "fields_total": 16,
+                                 "completeness_pct": 0, "quality_notes": "mock assessment"})
+        else:
+            context = messages[-1].get("content", "") if messages else ""
+            sources = sorted(set(re.findall(r"\[Source: ([^\]]+)\]", context)))
+            answer = (f"(mock answer) Based on {len(sources)} source(s): "
+                      f"{', '.join(sources) or 'none'}.")
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(answer)
+        return self._send(200, {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }, headers=headers)
+
+    # Azure AI Search
+    def _search(self, method, path, query, body, headers):
+        state = self.state
+        if path == "/indexes" and method == "GET":
+            with state.lock:
+                value = [idx.definition for idx in state.indexes.values()]
+            return self._send(200, {"value": value}, headers=headers)
+
+        m = re.match(r"/indexes(?:\('([^']+)'\)|/([^/]+))(/.*)?$", path)
+        if not m:
+            return self._send(404, {"error": {"code": "NotFound", "message": path}})
+        name, rest = m.group(1) or m.group(2), m.group(3) or ""
+
+        with state.lock:
+            index = state.indexes.get(name)
+
+        if rest == "":
+            if method == "PUT":
+                definition = json.loads(body)
+                with state.lock:
+                    existing = state.indexes.get(name)
+                    if existing:
+                        existing.definition = definition
+                    else:
+                        state.indexes[name] = MockIndex(definition)
+                return self._send(200 if existing else 201, definition, headers=headers)
+            if method == "DELETE":
+                with state.lock:
+                    state.indexes.pop(name, None)
+                return self._send(204, headers=headers)
+            if index is None:
+                return self._send(404, {"error": {"code": "NotFound", "message": f"index {name}"}})
+            return self._send(200, index.definition, headers=headers)
+
+        if index is None:
+            return self._send(404, {"error": {"code": "NotFound", "message": f"index {name}"}})
+
+        if rest == "/docs/search.index":
+            with state.lock:
+                results = index.upload(json.loads(body)["value"])
+            state.stats["search.documents_uploaded"] += len(results)
+            return self._send(200, {"value": results}, headers=headers)
+
+        if rest == "/docs/search.post.search":
+            with state.lock:
+                results = index.search(json.loads(body))
+            return self._send(200, {"value": results}, headers=headers)
+
+        if rest == "/docs/$count":
+            return self._send(200, str(len(index.documents)).encode(), headers=headers)
+
+        m = re.match(r"/docs(?:\('([^']+)'\)|/([^/]+))$", rest)
+        if m and method == "GET":
+            doc = index.documents.get(m.group(1) or m.group(2))
+            if doc is None:
+                return self._send(404, {"error": {"code": "NotFound", "message": "document"}})
+            return self._send(200, doc, headers=headers)
+
+        return self._send(404, {"error": {"code": "NotFound", "message": path}})
+
+
+# -- Server lifecycle --
+def merge_config(overrides=None):
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+    return config
+
+
+def make_server(config=None, host="127.0.0.1", port=0):
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(merge_config(config))})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def mock_env(server, index_name="poa-index"):
+    """Environment variables that point the step scripts at this server."""
+    host, port = server.server_address[:2]
+    endpoint = f"http://{host}:{port}"
+    return {
+        "AZURE_DOCINTEL_ENDPOINT": endpoint,
+        "AZURE_DOCINTEL_KEY": "mock-key",
+        "AZURE_OPENAI_ENDPOINT": endpoint,
+        "AZURE_OPENAI_API_KEY": "mock-key",
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "mock-embedding",
+        "AZURE_OPENAI_CHAT_DEPLOYMENT": "mock-chat",
+        "AZURE_SEARCH_ENDPOINT": endpoint,
+        "AZURE_SEARCH_ADMIN_KEY": "mock-key",
+        "AZURE_SEARCH_INDEX_NAME": index_name,
+    }
+
+
+def start_mock_server(config=None, port=0):
+    """Start the mock in a background thread. Returns (server, env)."""
+    server = make_server(config, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, mock_env(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline mock of the Azure services used by the pipeline.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=None,
+                        help="latency for every service (default: per-service defaults)")
+    parser.add_argument("--rpm", type=int, default=None,
+                        help="requests-per-minute limit per service (default: unlimited)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="fraction of requests answered with a random 429")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = {"throttle_rate": args.throttle_rate, "embedding_dimensions": args.dimensions,
+              "seed": args.seed}
+    if args.latency_ms is not None:
+        config["latency_ms"] = {s: args.latency_ms for s in DEFAULT_CONFIG["latency_ms"]}
+    if args.rpm is not None:
+        config["rpm"] = {s: args.rpm for s in DEFAULT_CONFIG["rpm"]}
+
+    server = make_server(config, port=args.port)
+    print("Mock Azure services listening. Point the scripts at it with:\n")
+    for name, value in mock_env(server).items():
+        print(f"  export {name}={value}")
+    print("\nStats: GET /_mock/stats   (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
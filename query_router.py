@@ -0,0 +1,274 @@
+"""
+query_router.py
+
+Cheap local routing stage in front of step3_query.ask_question: each
+question goes down the least expensive path that can answer it.
+
+    lookup     a factual question that resolves in field_store.py
+               (milliseconds, no Azure calls)
+    retrieval  "show me the clause ..." - the retrieved passages are the
+               answer, no GPT-4o call
+    rag        everything that needs synthesis: search + GPT-4o
+
+Routing is rules first (unambiguous wording), then a small naive Bayes
+model over word unigrams/bigrams for the rest. The model is trained on the
+seed examples below plus any labelled questions in ROUTER_TRAINING_PATH
+(JSONL: {"question": "...", "route": "retrieval"}), cached on disk in
+ROUTER_MODEL_PATH and retrained only when that training data changes.
+A "lookup" verdict only stands if field_store.lookup() actually resolves
+the question, and a model verdict below ROUTER_MIN_CONFIDENCE is not
+trusted to skip GPT-4o; both fall back to rag.
+
+Every decision is logged to ROUTER_LOG_PATH (JSONL) with its reason,
+confidence, classification time and the end-to-end latency of the route,
+so the rules and training data can be tuned. To correct a route, copy the
+logged question into the training file with the right label.
+
+Usage:
+    python query_router.py classify "Show me the hot powers clause in the PA POA"
+    python query_router.py report              # routes, reasons, latency per route
+    python query_router.py train               # rebuild the cached model
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+import threading
+from collections import Counter
+
+import field_store
+from tracing import percentile
+
+ROUTER_LOG_PATH = os.environ.get("ROUTER_LOG_PATH", "traces/routing.jsonl")
+ROUTER_MODEL_PATH = os.environ.get("ROUTER_MODEL_PATH", "ingest_state/router_model.json")
+ROUTER_TRAINING_PATH = os.environ.get("ROUTER_TRAINING_PATH", "router_training.jsonl")
+ROUTER_MIN_CONFIDENCE = float(os.environ.get("ROUTER_MIN_CONFIDENCE", "0.8"))
+ROUTES = ("lookup", "retrieval", "rag")
+
+# -- Rules (checked in order) --
+RULES = [
+    ("retrieval", "show-clause",
+     r"^(please )?(show|quote|display|print|give|find|pull up|where is)\b.*"
+     r"\b(clause|section|text|paragraph|language|wording|provision|notice|page)s?\b"),
+    ("retrieval", "exact-wording", r"\b(exact|verbatim|word for word|full text)\b"),
+    ("rag", "synthesis",
+     r"\b(compar\w*|differ\w*|versus|vs\.?|explain\w*|why|summar\w*"
+     r"|implications?|should|recommend\w*|pros and cons|what happens if|how does)\b"),
+]
+
+SEED_EXAMPLES = [
+    ("lookup", "Who is the successor agent in the PA durable POA?"),
+    ("lookup", "Who is the agent in the Illinois health care power of attorney?"),
+    ("lookup", "When was the Pennsylvania power of attorney signed?"),
+    ("lookup", "Which statute governs the IL property POA?"),
+    ("lookup", "Who notarized the SERS power of attorney?"),
+    ("lookup", "What is the principal's address?"),
+    ("lookup", "Who witnessed the health care POA?"),
+    ("lookup", "What is the agent's relationship to the principal?"),
+    ("lookup", "When does the power of attorney become effective?"),
+    ("lookup", "Who is the principal of the durable power of attorney?"),
+    ("retrieval", "Show me the clause about gifting powers"),
+    ("retrieval", "Quote the notice to the agent"),
+    ("retrieval", "Where is the section on revocation?"),
+    ("retrieval", "Find the language about organ donation"),
+    ("retrieval", "Give me the text of the HIPAA authorization"),
+    ("retrieval", "Display the paragraph on compensation of the agent"),
+    ("retrieval", "Pull up the signature page of the IL property form"),
+    ("retrieval", "What does the hot powers provision say exactly"),
+    ("rag", "Compare the agent's duties under PA and IL law"),
+    ("rag", "What are the differences between the PA and IL health care forms?"),
+    ("rag", "Explain what the agent can do with real estate"),
+    ("rag", "Can the agent make gifts to themselves?"),
+    ("rag", "What happens if the agent becomes unable to serve?"),
+    ("rag", "Summarize the powers granted in the durable POA"),
+    ("rag", "Is the principal's consent needed before the agent sells the house?"),
+    ("rag", "How do the witnessing requirements differ between the states?"),
+    ("rag", "What limits are placed on the agent's authority?"),
+    ("rag", "Does the health care agent have authority over life support?"),
+]
+
+_model = None
+_model_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+# -- Model --
+def features(question):
+    tokens = re.findall(r"[a-z0-9']+", question.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def load_examples():
+    examples = list(SEED_EXAMPLES)
+    if os.path.exists(ROUTER_TRAINING_PATH):
+        with open(ROUTER_TRAINING_PATH, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    if item.get("route") in ROUTES:
+                        examples.append((item["route"], item["question"]))
+    return examples
+
+
+def train(examples):
+    """Multinomial naive Bayes: per-route priors and feature counts."""
+    counts = {name: Counter() for name in ROUTES}
+    docs = Counter()
+    for name, question in examples:
+        counts[name].update(features(question))
+        docs[name] += 1
+    return {
+        "priors": {r: math.log((docs[r] + 1) / (len(examples) + len(ROUTES))) for r in ROUTES},
+        "counts": {r: dict(c) for r, c in counts.items()},
+        "totals": {r: sum(c.values()) for r, c in counts.items()},
+        "vocabulary": len({f for c in counts.values() for f in c}),
+    }
+
+
+def get_model():
+    """The trained model: in memory, else from disk, else trained and cached."""
+    global _model
+    with _model_lock:
+        if _model is not None:
+            return _model
+        examples = load_examples()
+        digest = hashlib.sha256(json.dumps(examples).encode("utf-8")).hexdigest()
+        if os.path.exists(ROUTER_MODEL_PATH):
+            with open(ROUTER_MODEL_PATH, encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("digest") == digest:
+                _model = cached
+                return _model
+        _model = dict(train(examples), digest=digest, examples=len(examples))
+        os.makedirs(os.path.dirname(ROUTER_MODEL_PATH) or ".", exist_ok=True)
+        with open(ROUTER_MODEL_PATH, "w", encoding="utf-8") as f:
+            json.dump(_model, f)
+        return _model
+
+
+def predict(question, model=None):
+    """(route, probability) from the model."""
+    model = model or get_model()
+    scores = {}
+    for name in ROUTES:
+        counts, total = model["counts"][name], model["totals"][name]
+        denominator = math.log(total + model["vocabulary"] + 1)
+        scores[name] = model["priors"][name] + sum(
+            math.log(counts.get(f, 0) + 1) - denominator for f in features(question))
+    best = max(scores, key=scores.get)
+    norm = sum(math.exp(s - scores[best]) for s in scores.values())
+    return best, 1 / norm
+
+
+# -- Routing --
+def route(question):
+    """
+    Decide how to answer `question`. Returns {"route", "reason", "confidence",
+    "classify_ms", "lookup"} where "lookup" holds the field_store hit, if any.
+    """
+    start = time.perf_counter()
+    decision = {"route": None, "reason": None, "confidence": 1.0, "lookup": None}
+    text = question.strip().lower()
+
+    for target, name, pattern in RULES:
+        if re.search(pattern, text):
+            decision.update(route=target, reason=f"rule:{name}")
+            break
+
+    if decision["route"] is None:
+        hit = field_store.lookup(question) if field_store.match_field(question) else None
+        if hit:
+            decision.update(route="lookup", reason="rule:field", lookup=hit)
+        else:
+            target, confidence = predict(question)
+            reason = "model"
+            # The model can't answer a lookup the field store can't resolve
+            if target == "lookup":
+                target, reason = "rag", "model:unresolved-lookup"
+            elif target == "retrieval" and confidence < ROUTER_MIN_CONFIDENCE:
+                target, reason = "rag", "model:low-confidence"
+            decision.update(route=target, reason=reason, confidence=round(confidence, 3))
+
+    decision["classify_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return decision
+
+
+def log_decision(question, decision, total_ms, **extra):
+    """Append one routing decision (and how long the route took) to ROUTER_LOG_PATH."""
+    record = {
+        "at": round(time.time(), 3),
+        "question": question[:500],
+        "route": decision["route"],
+        "reason": decision["reason"],
+        "confidence": decision["confidence"],
+        "classify_ms": decision["classify_ms"],
+        "total_ms": round(total_ms, 2),
+        **extra,
+    }
+    with _log_lock:
+        os.makedirs(os.path.dirname(ROUTER_LOG_PATH) or ".", exist_ok=True)
+        with open(ROUTER_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+# -- Reporting --
+def print_report(path=ROUTER_LOG_PATH):
+    if not os.path.exists(path):
+        print(f"No routing decisions logged at {path}")
+        return
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    print(f"\n{len(records)} routed question(s)")
+    print(f"\n{'Route':<10} {'Count':>6} {'Share':>7} {'Classify p50':>13} "
+          f"{'p50 ms':>9} {'p95 ms':>9}")
+    print("-" * 60)
+    for name in ROUTES:
+        rows = [r for r in records if r["route"] == name]
+        if not rows:
+            continue
+        totals = [r["total_ms"] for r in rows]
+        print(f"{name:<10} {len(rows):>6} {len(rows) / len(records):>7.1%} "
+              f"{percentile([r['classify_ms'] for r in rows], 50):>13.2f} "
+              f"{percentile(totals, 50):>9.0f} {percentile(totals, 95):>9.0f}")
+
+    print("\nReasons:")
+    for (name, reason), n in Counter((r["route"], r["reason"]) for r in records).most_common():
+        print(f"  {name:<10} {reason:<22} {n:>6}")
+
+    unsure = [r for r in records if r["reason"].startswith("model")
+              and r["confidence"] < ROUTER_MIN_CONFIDENCE]
+    if unsure:
+        print(f"\nLow-confidence model decisions ({len(unsure)}) - candidates for "
+              f"{ROUTER_TRAINING_PATH}:")
+        for r in unsure[-10:]:
+            print(f"  {r['route']:<10} {r['confidence']:.2f}  {r['question'][:70]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Question router for step3_query.")
+    parser.add_argument("command", choices=["classify", "report", "train"])
+    parser.add_argument("question", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "classify" and args.question:
+        decision = route(args.question)
+        print(f"{decision['route']} ({decision['reason']}, confidence {decision['confidence']}, "
+              f"{decision['classify_ms']} ms)")
+        if decision["lookup"]:
+            print(decision["lookup"]["answer"])
+    elif args.command == "report":
+        print_report()
+    elif args.command == "train":
+        if os.path.exists(ROUTER_MODEL_PATH):
+            os.remove(ROUTER_MODEL_PATH)
+        model = get_model()
+        print(f"Trained on {model['examples']} example(s) -> {ROUTER_MODEL_PATH}")
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,233 @@
+"""
+rate_limiter.py
+
+Adaptive client-side rate limiting shared by every Azure call in the
+pipeline (Document Intelligence analyze, OpenAI embeddings/chat, AI Search).
+
+Each service gets one AdaptiveRateLimiter per process, a pair of token
+buckets for requests-per-minute and tokens-per-minute. Calls go through
+limited_call(), which:
+- waits for both buckets before sending (so we pace instead of bursting),
+- reads the x-ratelimit-remaining-* headers on every response and pulls the
+  local buckets down to what the service says is left,
+- on a 429/503 honours retry-after / retry-after-ms, halves the send rate
+  and retries with jittered backoff (no lockstep retries), then slowly
+  recovers the rate as calls succeed.
+
+SDK-level status retries are turned off on the clients (max_retries=0 for
+OpenAI, retry_status=0 for azure-core) so retries only happen here.
+
+Limits come from the environment, e.g. AZURE_OPENAI_EMBEDDING_RPM /
+AZURE_OPENAI_EMBEDDING_TPM. When several processes share one deployment,
+divide the quota between them.
+
+Time spent waiting on the limiter is tracked per service; see
+limiter_stats() / print_limiter_stats(). Each call also adds its attempts,
+retries and throttle wait to the current tracing span (tracing.py).
+"""
+
+import os
+import time
+import random
+import threading
+
+from tracing import current_span
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 6
+
+# name: (rpm env var, default rpm, tpm env var, default tpm)
+LIMITS = {
+    "openai-embeddings": ("AZURE_OPENAI_EMBEDDING_RPM", 720,
+                          "AZURE_OPENAI_EMBEDDING_TPM", 120000),
+    "openai-chat": ("AZURE_OPENAI_CHAT_RPM", 60,
+                    "AZURE_OPENAI_CHAT_TPM", 10000),
+    "docintel": ("AZURE_DOCINTEL_RPM", 900, None, None),
+    "search": ("AZURE_SEARCH_RPM", 3000, None, None),
+}
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute` / 60 per second."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now, scale=1.0):
+        self.level = min(self.capacity,
+                         self.level + (now - self.updated) * self.capacity / 60 * scale)
+        self.updated = now
+
+    def wait_for(self, amount, scale=1.0):
+        """Seconds until `amount` is available (0 if it already is)."""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.capacity / 60 * scale)
+
+
+class AdaptiveRateLimiter:
+    """Requests-per-minute + tokens-per-minute limiter that adapts to 429s and headers."""
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute=None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.scale = 1.0            # multiplicative slow-down after throttling
+        self.blocked_until = 0.0    # set from retry-after
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "throttled": 0, "wait_seconds": 0.0}
+
+    def _buckets(self):
+        return [b for b in (self.requests, self.tokens) if b is not None]
+
+    def acquire(self, tokens=1):
+        """Block until one request (and `tokens` tokens) may be sent."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                for bucket in self._buckets():
+                    bucket.refill(now, self.scale)
+
+                wait = max(self.blocked_until - now,
+                           self.requests.wait_for(1, self.scale),
+                           self.tokens.wait_for(tokens, self.scale) if self.tokens else 0.0)
+                if wait <= 0:
+                    self.requests.level -= 1
+                    if self.tokens:
+                        self.tokens.level -= min(tokens, self.tokens.capacity)
+                    self.stats["calls"] += 1
+                    self.stats["wait_seconds"] += waited
+                    return waited
+
+            # Small jitter so threads woken together don't all fire at once
+            wait += random.uniform(0, 0.05)
+            time.sleep(wait)
+            waited += wait
+
+    def observe_headers(self, headers):
+        """Pull the local buckets down to what the service reports is left."""
+        if not headers:
+            return
+        with self.lock:
+            for header, bucket in (("x-ratelimit-remaining-requests", self.requests),
+                                   ("x-ratelimit-remaining-tokens", self.tokens)):
+                value = headers.get(header)
+                if bucket is not None and value is not None:
+                    try:
+                        bucket.level = min(bucket.level, float(value))
+                    except ValueError:
+                        pass
+
+    def observe_response(self, pipeline_response):
+        """azure-core raw_response_hook: read rate-limit headers off every response."""
+        self.observe_headers(pipeline_response.http_response.headers)
+
+    def throttled(self, retry_after):
+        """Back off after a 429: pause everyone until retry-after and halve the rate."""
+        with self.lock:
+            self.stats["throttled"] += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.scale = max(0.1, self.scale * 0.5)
+
+    def succeeded(self):
+        """Additive recovery towards the full configured rate."""
+        with self.lock:
+            self.scale = min(1.0, self.scale + 0.05)
+
+
+# -- Shared limiters (one per service per process) --
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(name):
+    with _registry_lock:
+        if name not in _limiters:
+            rpm_var, rpm, tpm_var, tpm = LIMITS[name]
+            rpm = int(os.environ.get(rpm_var, rpm))
+            if tpm_var:
+                tpm = int(os.environ.get(tpm_var, tpm))
+            _limiters[name] = AdaptiveRateLimiter(name, rpm, tpm)
+        return _limiters[name]
+
+
+def azure_client_kwargs(name):
+    """Extra kwargs for azure-core clients: header hook + no SDK status retries."""
+    return {"raw_response_hook": get_limiter(name).observe_response, "retry_status": 0}
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for pacing before the call."""
+    if isinstance(text, (list, tuple)):
+        return sum(estimate_tokens(t) for t in text)
+    return len(text or "") // 4 + 1
+
+
+def _retry_after(headers, attempt):
+    """Seconds to wait: retry-after-ms / retry-after, else jittered exponential backoff."""
+    headers = headers or {}
+    for header, divisor in (("retry-after-ms", 1000), ("x-ms-retry-after-ms", 1000),
+                            ("retry-after", 1)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) / divisor + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+    return random.uniform(0, min(60, 2 ** attempt))
+
+
+def limited_call(limiter, fn, *args, tokens=1, max_retries=MAX_RETRIES, **kwargs):
+    """
+    Call `fn(*args, **kwargs)` under `limiter`, retrying throttled calls.
+
+    OpenAI calls should pass the `with_raw_response` variant of the method
+    (e.g. client.embeddings.with_raw_response.create) so the rate-limit
+    headers can be read; the parsed result is returned.
+    """
+    span = current_span()
+    for attempt in range(max_retries + 1):
+        waited = limiter.acquire(tokens)
+        span.add("attempts")
+        if waited:
+            span.add("throttle_wait_ms", round(waited * 1000, 1))
+        try:
+            response = fn(*args, **kwargs)
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            if status not in RETRY_STATUSES or attempt == max_retries:
+                raise
+            span.add("retries")
+            if status == 429:
+                span.add("throttled")
+            headers = getattr(getattr(e, "response", None), "headers", None)
+            limiter.observe_headers(headers)
+            limiter.throttled(_retry_after(headers, attempt))
+            continue
+
+        if hasattr(response, "parse") and hasattr(response, "headers"):
+            limiter.observe_headers(response.headers)
+            response = response.parse()
+        limiter.succeeded()
+        return response
+
+
+def limiter_stats():
+    """Per-service call counts, 429s and total throttle wait time."""
+    with _registry_lock:
+        return {name: dict(l.stats, wait_seconds=round(l.stats["wait_seconds"], 3))
+                for name, l in _limiters.items()}
+
+
+def print_limiter_stats():
+    stats = limiter_stats()
+    if not stats:
+        return
+    print("\nRate limiting:")
+    for name, s in stats.items():
+        print(f"  {name:<18} calls={s['calls']:<6} throttled={s['throttled']:<4} "
+              f"wait={s['wait_seconds']:.1f}s")
@@ -0,0 +1,273 @@
+"""
+snapshot.py
+
+Columnar snapshot of everything step2_index.py put in the search index -
+ids, content, metadata and vectors - so the index can be recreated, or a
+new index / service loaded, without a single embedding call.
+
+A snapshot is a directory under SNAPSHOT_DIR:
+  vectors.npy     float32 matrix, one row per index document (standard .npy:
+                  numpy.load(..., mmap_mode="r") reads it, numpy is not needed
+                  to write or load it here)
+  columns.json    every other field as one list per field, row-aligned with
+                  the vectors (null where a field does not apply, e.g.
+                  parent_id on a parent chunk)
+  manifest.json   row count, dimensions, the embedding settings
+                  (embedding_dims.py), the index it was taken from and a
+                  sha256 of both data files
+
+step2 writes one after every run that uploaded something (SNAPSHOT_ON_UPLOAD),
+from the chunks checkpointed in the job ledger, and keeps the newest
+SNAPSHOT_KEEP. Snapshots are written to a temporary directory and renamed,
+so a crash never leaves a half-written "latest".
+
+`load` creates the target index with step2's schema and uploads the rows in
+parallel batches (SNAPSHOT_UPLOAD_CONCURRENCY requests in flight), limited
+only by the search rate limiter. The snapshot's dimensions must match the
+index's EMBEDDING_DIMENSIONS.
+
+Usage:
+    python snapshot.py                         # list snapshots
+    python snapshot.py write                   # snapshot the ledger now
+    python snapshot.py load                    # newest snapshot -> the live index
+                                               # (new versions: index_aliases.py build)
+    python snapshot.py load --snapshot ingest_state/snapshots/20250101-120000 --index poa-v2
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import array
+import shutil
+import struct
+import hashlib
+import argparse
+from datetime import datetime
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "ingest_state/snapshots")
+SNAPSHOT_ON_UPLOAD = os.environ.get("SNAPSHOT_ON_UPLOAD", "1") == "1"
+SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", "3"))
+SNAPSHOT_UPLOAD_CONCURRENCY = int(os.environ.get("SNAPSHOT_UPLOAD_CONCURRENCY", "8"))
+UPLOAD_BATCH_SIZE = 100
+VECTOR_FIELD = "content_vector"
+NPY_MAGIC = b"\x93NUMPY"
+
+
+# -- .npy without numpy --
+def write_npy(path, rows, dimensions):
+    """Write rows of floats as a little-endian float32 (N, dimensions) .npy file."""
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d, %d), }" % (
+        len(rows), dimensions)
+    # Format 1.0: magic, version, uint16 header length; data starts 64-byte aligned
+    header += " " * (63 - (len(NPY_MAGIC) + 4 + len(header)) % 64) + "\n"
+    with open(path, "wb") as f:
+        f.write(NPY_MAGIC + b"\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        for row in rows:
+            if len(row) != dimensions:
+                raise ValueError(f"vector of length {len(row)} in a {dimensions}-dimension snapshot")
+            values = array.array("f", row)
+            if sys.byteorder == "big":
+                values.byteswap()
+            f.write(values.tobytes())
+
+
+def read_npy(path):
+    """(flat float32 array, (rows, dimensions)) from a .npy written by write_npy or numpy."""
+    with open(path, "rb") as f:
+        if f.read(len(NPY_MAGIC)) != NPY_MAGIC:
+            raise ValueError(f"{path} is not a .npy file")
+        major = f.read(2)[0]
+        length = struct.unpack("<H" if major == 1 else "<I", f.read(2 if major == 1 else 4))[0]
+        header = ast.literal_eval(f.read(length).decode("latin1"))
+        if header["descr"] != "<f4" or header["fortran_order"]:
+            raise ValueError(f"{path}: expected C-order little-endian float32, got {header}")
+        values = array.array("f")
+        values.frombytes(f.read())
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, tuple(header["shape"])
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# -- Writing --
+def write_snapshot(documents, source=None, directory=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP):
+    """
+    Write index documents (dicts with a content_vector) as a new snapshot.
+    Returns its path, or None when there is nothing to write.
+    """
+    from embedding_dims import EMBEDDING_DIMENSIONS, describe
+
+    # Before writing: index_aliases.switch compares ledger uploads against this
+    created_at = datetime.now().isoformat(timespec="milliseconds")
+    documents = [d for d in documents if d.get(VECTOR_FIELD)]
+    if not documents:
+        return None
+    fields = sorted({key for d in documents for key in d if key != VECTOR_FIELD})
+    columns = {field: [d.get(field) for d in documents] for field in fields}
+
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, name)
+    staging = f"{path}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    start = time.perf_counter()
+    write_npy(os.path.join(staging, "vectors.npy"),
+              [d[VECTOR_FIELD] for d in documents], EMBEDDING_DIMENSIONS)
+    with open(os.path.join(staging, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f)
+    manifest = {
+        "created_at": created_at,
+        "rows": len(documents),
+        "dimensions": EMBEDDING_DIMENSIONS,
+        "embeddings": describe(),
+        "source_index": source,
+        "fields": fields,
+        "documents": len(set(columns.get("source_file", []))),
+        "sha256": {f: file_sha256(os.path.join(staging, f))
+                   for f in ("vectors.npy", "columns.json")},
+    }
+    with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(staging, path)
+    for old in list_snapshots(directory)[:-keep] if keep else []:
+        shutil.rmtree(old, ignore_errors=True)
+    print(f"  -> Snapshot: {len(documents)} row(s) x {EMBEDDING_DIMENSIONS} dims -> {path} "
+          f"({time.perf_counter() - start:.1f}s)")
+    return path
+
+
+# -- Reading --
+def list_snapshots(directory=SNAPSHOT_DIR):
+    """Complete snapshots, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if not name.endswith(".tmp")
+                  and os.path.exists(os.path.join(directory, name, "manifest.json")))
+
+
+def latest_snapshot(directory=SNAPSHOT_DIR):
+    snapshots = list_snapshots(directory)
+    return snapshots[-1] if snapshots else None
+
+
+def read_manifest(path):
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_rows(path, verify=True):
+    """(manifest, [index document]) - the rows exactly as step2 uploaded them."""
+    manifest = read_manifest(path)
+    if verify:
+        for name, expected in manifest["sha256"].items():
+            if file_sha256(os.path.join(path, name)) != expected:
+                raise ValueError(f"{path}/{name} does not match its manifest checksum")
+    values, (rows, dimensions) = read_npy(os.path.join(path, "vectors.npy"))
+    with open(os.path.join(path, "columns.json"), encoding="utf-8") as f:
+        columns = json.load(f)
+    if rows != manifest["rows"]:
+        raise ValueError(f"{path}: {rows} vector(s) but {manifest['rows']} row(s) in the manifest")
+
+    documents = []
+    for i in range(rows):
+        doc = {field: column[i] for field, column in columns.items() if column[i] is not None}
+        doc[VECTOR_FIELD] = values[i * dimensions:(i + 1) * dimensions].tolist()
+        documents.append(doc)
+    return manifest, documents
+
+
+# -- Bulk load --
+def upload_rows(index_name, documents, concurrency=SNAPSHOT_UPLOAD_CONCURRENCY):
+    """Upload index documents in parallel batches. Returns (rows, seconds)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import step2_index
+    from rate_limiter import get_limiter, limited_call
+    from tracing import payload_size, propagate, span
+
+    client = step2_index.index_client(index_name)
+
+    def upload(batch):
+        with span("upload_documents", docs=len(batch), bytes=payload_size(batch)):
+            result = limited_call(get_limiter("search"), client.upload_documents, documents=batch)
+        failed = sum(1 for r in result if not r.succeeded)
+        if failed:
+            raise RuntimeError(f"{failed} row(s) failed to upload to {index_name}")
+        return len(batch)
+
+    batches = [documents[i:i + UPLOAD_BATCH_SIZE]
+               for i in range(0, len(documents), UPLOAD_BATCH_SIZE)]
+    start = time.perf_counter()
+    with span("snapshot.load", rows=len(documents), index=index_name), \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+        loaded = sum(pool.map(propagate(upload), batches))
+    return loaded, time.perf_counter() - start
+
+
+def bulk_load(path, index_name=None, concurrency=SNAPSHOT_UPLOAD_CONCURRENCY, create=True):
+    """Recreate an index from a snapshot. Returns (rows, seconds)."""
+    import index_aliases
+    import step2_index
+    from embedding_dims import EMBEDDING_DIMENSIONS
+
+    index_name = index_name or index_aliases.resolve(step2_index.INDEX_NAME)
+    manifest, documents = load_rows(path)
+    if manifest["dimensions"] != EMBEDDING_DIMENSIONS:
+        raise ValueError(f"snapshot vectors have {manifest['dimensions']} dimensions, the index "
+                         f"schema {EMBEDDING_DIMENSIONS} - set EMBEDDING_DIMENSIONS to match")
+    if create:
+        step2_index.create_search_index(index_name)
+    return upload_rows(index_name, documents, concurrency)
+
+
+def print_snapshots():
+    snapshots = list_snapshots()
+    if not snapshots:
+        print(f"No snapshots in {SNAPSHOT_DIR}/ yet (step2 writes one after each run).")
+        return
+    print(f"\n{'Snapshot':<42} {'Rows':>7} {'Docs':>6} {'Dims':>5}  Embeddings")
+    print("-" * 90)
+    for path in snapshots:
+        m = read_manifest(path)
+        print(f"{path:<42} {m['rows']:>7} {m['documents']:>6} {m['dimensions']:>5}  {m['embeddings']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar index snapshots.")
+    parser.add_argument("command", nargs="?", default="list", choices=["list", "write", "load"])
+    parser.add_argument("--snapshot", default=None, help="snapshot directory (default: newest)")
+    parser.add_argument("--index", default=None, help="target index (default: AZURE_SEARCH_INDEX_NAME)")
+    parser.add_argument("--concurrency", type=int, default=SNAPSHOT_UPLOAD_CONCURRENCY)
+    parser.add_argument("--no-create", action="store_true", help="upload into the existing index")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print_snapshots()
+    elif args.command == "write":
+        import step2_index
+        from job_ledger import JobLedger
+
+        if not write_snapshot(step2_index.indexed_documents(JobLedger()), step2_index.INDEX_NAME):
+            print("Nothing uploaded yet; run step2 first.")
+    else:
+        path = args.snapshot or latest_snapshot()
+        if path is None:
+            print(f"No snapshots in {SNAPSHOT_DIR}/")
+            sys.exit(1)
+        rows, seconds = bulk_load(path, args.index, args.concurrency, create=not args.no_create)
+        print(f"Loaded {rows} row(s) from {path} in {seconds:.1f}s "
+              f"({rows / max(seconds, 1e-9):.0f} rows/s, 0 embedding calls)")
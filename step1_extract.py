@@ -1,64 +1,510 @@
 """
 Step 1: Use Azure Document Intelligence to extract text from POA documents.
 Outputs extracted text as Markdown files in the 'extracted/' folder.
+
+Low-quality scans are caught here: any page whose average word confidence is
+below LOW_CONFIDENCE_THRESHOLD is re-analyzed (images are cleaned up locally
+first, and the retry uses the high-resolution OCR add-on). Only those pages
+are re-processed, and pages that are still unreadable are left out of the
+Markdown (empty, with "skipped" in the page map) so they don't get chunked
+and indexed. Retry cost is reported
+separately in extraction_metrics/retry_report.json.
+
+Large PDFs (more than SPLIT_PAGE_THRESHOLD pages) are split into page-range
+jobs of PAGES_PER_JOB pages with pypdf, analyzed in parallel, and stitched
+back into one Markdown file. Each range retries on its own. A page map with
+the offset/length of every page in the Markdown is saved next to it as
+extracted/<file>.pages.json.
+
+Edited PDFs are updated page by page: the page map also holds a sha256 of
+every source page (its content stream, images and form/signature
+annotations), so when an amended file comes in only the pages whose hash is
+new are analyzed - as one small PDF of just those pages - and the Markdown
+of the other pages is taken from the previous extraction. step2 then
+re-embeds only the chunks that overlap the changed pages.
+
+Before a file is analyzed, its pages are fingerprinted (fingerprints.py):
+a re-upload of a document that is already indexed - same pages, same
+filled-in values in its text layer - is linked to it and not sent to
+Document Intelligence again. Scans are compared on their text in step2.
+
+Progress is tracked in the job ledger (job_ledger.py): unchanged documents
+that were already extracted are skipped, and a failed document is recorded
+and retried on the next run instead of stopping the whole batch.
 """
 
 import os
+import io
 import glob
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeDocumentRequest, DocumentContentFormat
+
+import clients
+import fingerprints
+import image_preprocess
+from rate_limiter import get_limiter, limited_call, print_limiter_stats
+from job_ledger import STAGES, JobLedger, file_sha256, run_jobs
+from tracing import current_span, propagate, span, traced
 
 load_dotenv()
 
-# Connect to Document Intelligence
-client = DocumentIntelligenceClient(
-    endpoint=os.environ["AZURE_DOCINTEL_ENDPOINT"],
-    credential=AzureKeyCredential(os.environ["AZURE_DOCINTEL_KEY"])
-)
+# -- Configuration --
+LOW_CONFIDENCE_THRESHOLD = float(os.environ.get("LOW_CONFIDENCE_THRESHOLD", "0.75"))
+MIN_PAGE_CONFIDENCE = float(os.environ.get("MIN_PAGE_CONFIDENCE", "0.5"))
+PAGE_BREAK = "\n\n<!-- PageBreak -->\n\n"
+SPLIT_PAGE_THRESHOLD = int(os.environ.get("SPLIT_PAGE_THRESHOLD", "50"))
+PAGES_PER_JOB = int(os.environ.get("PAGES_PER_JOB", "25"))
+MAX_PARALLEL_JOBS = int(os.environ.get("MAX_PARALLEL_JOBS", "4"))
+RANGE_RETRIES = 3
+INCREMENTAL_PAGES = os.environ.get("INCREMENTAL_PAGES", "1") == "1"
+
+CONTENT_TYPE_MAP = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "tiff": "image/tiff",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+def get_content_type(filename):
+    ext = filename.lower().split(".")[-1]
+    return CONTENT_TYPE_MAP.get(ext, "application/octet-stream")
+
+
+def analyze(file_bytes, content_type, pages=None, features=None):
+    """Analyze a document using the Layout model (best for structured docs)."""
+    from azure.ai.documentintelligence.models import DocumentContentFormat
+
+    def run():
+        poller = clients.docintel().begin_analyze_document(
+            model_id="prebuilt-layout",
+            body=file_bytes,
+            content_type=content_type,
+            output_content_format=DocumentContentFormat.MARKDOWN,
+            pages=pages,
+            features=features,
+        )
+        return poller.result()
+
+    # Polling happens inside run(), so a throttled poll retries the whole call
+    with span("analyze", bytes=len(file_bytes), content_type=content_type,
+              pages=pages, high_res=bool(features)) as s:
+        result = limited_call(get_limiter("docintel"), run)
+        s.set(result_pages=len(result.pages or []), result_chars=len(result.content or ""))
+        return result
+
+
+# -- Per-page confidence --
+def split_pages(result):
+    """
+    Split an analyze result into per-page Markdown with the average
+    word confidence of each page.
+    """
+    pages = []
+    for page in result.pages or []:
+        text = "".join(
+            result.content[span.offset:span.offset + span.length]
+            for span in page.spans or []
+        )
+        confidences = [w.confidence for w in page.words or []
+                       if w.confidence is not None]
+        pages.append({
+            "page_number": page.page_number,
+            "content": text.strip(),
+            "confidence": sum(confidences) / len(confidences) if confidences else None,
+            "words": len(confidences),
+        })
+    return pages
+
+
+def join_pages(pages):
+    """
+    Rebuild a single Markdown document from per-page content.
+    Records each page's offset/length in the joined text.
+    """
+    offset = 0
+    for i, page in enumerate(pages):
+        if i:
+            offset += len(PAGE_BREAK)
+        page["offset"], page["length"] = offset, len(page["content"])
+        offset += page["length"]
+    return PAGE_BREAK.join(p["content"] for p in pages)
+
+
+def low_confidence_pages(pages, threshold=LOW_CONFIDENCE_THRESHOLD):
+    return [p for p in pages
+            if p["confidence"] is not None and p["confidence"] < threshold]
+
+
+def no_retry_cost():
+    return {"pages_retried": 0, "retry_calls": 0, "pages_improved": 0,
+            "pages_dropped": 0, "retry_seconds": 0.0}
+
+
+def retry_low_confidence(file_bytes, content_type, pages):
+    """
+    Re-analyze only the low-confidence pages and keep whichever version of
+    each page scored higher. Returns (pages, retry_cost).
+    """
+    cost = no_retry_cost()
+
+    low = low_confidence_pages(pages)
+    if not low:
+        return pages, cost
+
+    start = time.perf_counter()
+    retry_bytes, retry_type = file_bytes, content_type
+    if content_type.startswith("image/"):
+        try:
+            retry_bytes, retry_type = image_preprocess.clean_scan(file_bytes)
+        except ImportError:
+            print("  -> Pillow not installed; retrying without local clean-up")
+
+    from azure.ai.documentintelligence.models import DocumentAnalysisFeature
+
+    page_numbers = ",".join(str(p["page_number"]) for p in low)
+    print(f"  -> Re-analyzing low-confidence page(s): {page_numbers}")
+    retry_result = analyze(
+        retry_bytes, retry_type,
+        pages=page_numbers,
+        features=[DocumentAnalysisFeature.OCR_HIGH_RESOLUTION],
+    )
+    retried = {p["page_number"]: p for p in split_pages(retry_result)}
+
+    cost["retry_calls"] = 1
+    cost["pages_retried"] = len(low)
+    cost["retry_seconds"] = round(time.perf_counter() - start, 2)
+
+    merged = []
+    for page in pages:
+        if page in low:
+            candidate = retried.get(page["page_number"])
+            if candidate and (candidate["confidence"] or 0) > page["confidence"]:
+                print(f"  -> Page {page['page_number']}: confidence "
+                      f"{page['confidence']:.2f} -> {candidate['confidence']:.2f}")
+                page = candidate
+                cost["pages_improved"] += 1
+
+            # Still unreadable - keep it out of the index instead of indexing noise
+            if page["confidence"] is not None and page["confidence"] < MIN_PAGE_CONFIDENCE:
+                print(f"  -> Page {page['page_number']}: dropped "
+                      f"(confidence {page['confidence']:.2f})")
+                page = dict(page, content="", skipped="low confidence")
+                cost["pages_dropped"] += 1
+        merged.append(page)
+
+    return merged, cost
+
+
+def extract_pages(file_bytes, content_type):
+    """Analyze a file (or page range) and retry its low-confidence pages."""
+    result = analyze(file_bytes, content_type)
+    pages = split_pages(result)
+    if not pages:
+        pages = [{"page_number": 1, "content": result.content.strip(),
+                  "confidence": None, "words": 0}]
+    return retry_low_confidence(file_bytes, content_type, pages)
+
+
+# -- Page-range splitting for large PDFs --
+def count_pdf_pages(filepath):
+    """Page count via pypdf, or None when pypdf isn't installed."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    return len(PdfReader(filepath).pages)
+
+
+def page_ranges(page_count, pages_per_job=PAGES_PER_JOB):
+    """[(1, 25), (26, 50), ...] - 1-based, inclusive."""
+    return [(first, min(first + pages_per_job - 1, page_count))
+            for first in range(1, page_count + 1, pages_per_job)]
 
-# Create output folder
-os.makedirs("extracted", exist_ok=True)
 
-# Process each file in the docs/ folder
-doc_files = glob.glob("docs/*")
-print(f"Found {len(doc_files)} file(s) in docs/")
+def page_label(page_numbers):
+    """Pages as 3-7 when they are a contiguous run, else as 2,9,14."""
+    if list(page_numbers) == list(range(page_numbers[0], page_numbers[-1] + 1)):
+        return f"{page_numbers[0]}-{page_numbers[-1]}"
+    return ",".join(str(n) for n in page_numbers)
 
-for filepath in doc_files:
+
+def pdf_pages_bytes(filepath, page_numbers):
+    """Write the given 1-based pages of a PDF into a new in-memory PDF."""
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(filepath)
+    writer = PdfWriter()
+    for n in page_numbers:
+        writer.add_page(reader.pages[n - 1])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def extract_page_set(filepath, page_numbers):
+    """Analyze some pages of a PDF as one job, retrying just this job on failure."""
+    label = page_label(page_numbers)
+    subset_bytes = pdf_pages_bytes(filepath, page_numbers)
+
+    for attempt in range(1, RANGE_RETRIES + 1):
+        try:
+            pages, cost = extract_pages(subset_bytes, "application/pdf")
+            break
+        except Exception as e:
+            if attempt == RANGE_RETRIES:
+                raise
+            print(f"  -> Pages {label} failed "
+                  f"(attempt {attempt}/{RANGE_RETRIES}): {e}")
+            time.sleep(2 ** attempt)
+
+    # Page numbers in the subset PDF start at 1 - map back to the original
+    for page in pages:
+        page["page_number"] = page_numbers[page["page_number"] - 1]
+    print(f"  -> Pages {label} done")
+    return pages, cost
+
+
+def extract_page_sets(filepath, page_sets):
+    """Analyze page sets as parallel jobs and stitch their pages together."""
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_JOBS) as pool:
+        results = list(pool.map(propagate(lambda pages: extract_page_set(filepath, pages)),
+                                page_sets))
+
+    pages, cost = [], no_retry_cost()
+    for set_pages, set_cost in results:
+        pages.extend(set_pages)
+        for key, value in set_cost.items():
+            cost[key] = cost.get(key, 0) + value
+    return pages, cost
+
+
+def extract_split_pdf(filepath, page_count):
+    """Analyze a large PDF as parallel page-range jobs and stitch the pages."""
+    ranges = page_ranges(page_count)
+    print(f"  -> {page_count} pages: splitting into {len(ranges)} range job(s)")
+    return extract_page_sets(filepath, [list(range(first, last + 1)) for first, last in ranges])
+
+
+# -- Page-level change detection --
+def _hash_stream(digest, obj, depth=0):
+    """Feed a PDF object's stream data, and that of any XObjects it draws, to digest."""
+    obj = obj.get_object()
+    if hasattr(obj, "get_data"):
+        digest.update(obj.get_data())
+    resources = obj.get("/Resources")
+    if resources is None or depth >= 4:
+        return
+    xobjects = resources.get_object().get("/XObject")
+    xobjects = xobjects.get_object() if xobjects is not None else {}
+    for name in sorted(xobjects):
+        digest.update(name.encode())
+        _hash_stream(digest, xobjects[name], depth + 1)
+
+
+def pdf_page_hashes(filepath):
+    """
+    sha256 of each page of a PDF: what it draws (content stream, images,
+    forms), its size and rotation, and its annotations' values and
+    appearances (filled-in fields, signatures). None without pypdf.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+
+    hashes = []
+    for page in PdfReader(filepath).pages:
+        digest = hashlib.sha256()
+        digest.update(repr((list(page.mediabox), page.get("/Rotate", 0))).encode())
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        _hash_stream(digest, page)
+        for annotation in page.get("/Annots") or []:
+            annotation = annotation.get_object()
+            digest.update(repr((annotation.get("/Subtype"), annotation.get("/T"),
+                                annotation.get("/V"), annotation.get("/Contents"))).encode())
+            appearance = (annotation.get("/AP") or {}).get("/N")
+            if appearance is not None and hasattr(appearance.get_object(), "get_data"):
+                _hash_stream(digest, appearance)
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def cached_pages(filename):
+    """
+    sha256 -> {content, confidence} of every page of the previous extraction
+    of a file, from its Markdown and page map. Empty if there is none.
+    """
+    try:
+        with open(f"extracted/{filename}.md", encoding="utf-8") as f:
+            content = f.read()
+        with open(f"extracted/{filename}.pages.json", encoding="utf-8") as f:
+            page_map = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not page_map or any(not p.get("sha256") for p in page_map):
+        return {}
+    return {p["sha256"]: {"content": content[p["offset"]:p["offset"] + p["length"]],
+                          "confidence": p["confidence"], "skipped": p.get("skipped")}
+            for p in page_map}
+
+
+def extract_changed_pages(filepath, page_hashes, cached):
+    """
+    Analyze only the pages whose hash is not in `cached` and take the rest
+    from the previous extraction. Returns (pages, cost).
+    """
+    changed = [n for n, h in enumerate(page_hashes, 1) if h not in cached]
+    if changed:
+        print(f"  -> {len(changed)} of {len(page_hashes)} page(s) changed; "
+              f"re-analyzing page(s) {page_label(changed)}")
+        extracted, cost = extract_page_sets(
+            filepath, [changed[i:i + PAGES_PER_JOB] for i in range(0, len(changed), PAGES_PER_JOB)])
+    else:
+        print(f"  -> None of the {len(page_hashes)} page(s) changed; nothing to re-analyze")
+        extracted, cost = [], no_retry_cost()
+
+    by_number = {p["page_number"]: p for p in extracted}
+    pages = [by_number[n] if n in by_number else dict(cached[h], page_number=n, words=0)
+             for n, h in enumerate(page_hashes, 1)]
+    cost["pages_reused"] = len(page_hashes) - len(changed)
+    return pages, cost
+
+
+# -- Near-duplicate scans --
+def link_duplicate_scan(ledger, doc_id, filepath):
+    """
+    Link a file whose pages look like an indexed document's, and whose text
+    layer has the same filled-in values, to it and mark it done without
+    extracting. Returns the canonical doc_id or None.
+    """
+    if not fingerprints.DEDUP_DOCUMENTS:
+        return None
+    with span("image_fingerprint", doc_id=doc_id) as s:
+        page_hashes = fingerprints.image_fingerprint(filepath)
+        if page_hashes is None:
+            return None
+        text_layer = (fingerprints.pdf_text_layer(filepath)
+                      if get_content_type(filepath) == "application/pdf" else None)
+        store = fingerprints.get_store()
+        match = store.match_image(doc_id, page_hashes, text_layer)
+        s.set(pages=len(page_hashes), duplicate=bool(match and match["verified"]))
+    if match is None:
+        return None
+    if not match["verified"]:
+        # A scan (or different filled-in values): extract, step2 compares the text
+        print(f"  -> Pages look like {match['doc_id']}; extracting to compare the text")
+        return None
+    store.link(doc_id, match["doc_id"], "image", match["distance"])
+    canonical = store.canonical_of(doc_id)
+    print(f"  -> {doc_id}: near-duplicate of {canonical} "
+          f"({match['distance']} bit(s) apart); not extracted")
+    # Nothing left to do for this file: its content is indexed under the canonical one
+    ledger.advance(doc_id, STAGES[-1])
+    return canonical
+
+
+@traced("extract_document")
+def extract_document(filepath):
+    """Extract one file to Markdown. Returns the retry cost for the file."""
     filename = os.path.basename(filepath)
     print(f"\nProcessing: {filename}")
+    current_span().set(doc_id=filename)
 
-    with open(filepath, "rb") as f:
-        file_bytes = f.read()
+    content_type = get_content_type(filename)
+    page_hashes = (pdf_page_hashes(filepath)
+                   if INCREMENTAL_PAGES and content_type == "application/pdf" else None)
+    page_count = len(page_hashes) if page_hashes is not None else (
+        count_pdf_pages(filepath) if content_type == "application/pdf" else None)
+    cached = cached_pages(filename) if page_hashes else {}
 
-    # Determine content type
-    ext = filename.lower().split(".")[-1]
-    content_type_map = {
-        "pdf": "application/pdf",
-        "png": "image/png",
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-        "tiff": "image/tiff",
-        "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    }
-    content_type = content_type_map.get(ext, "application/octet-stream")
-
-    # Analyze the document using the Layout model (best for structured docs)
-    poller = client.begin_analyze_document(
-        model_id="prebuilt-layout",
-        body=file_bytes,
-        content_type=content_type,
-        output_content_format=DocumentContentFormat.MARKDOWN,
-    )
-    result = poller.result()
+    if cached and any(h in cached for h in page_hashes):
+        pages, cost = extract_changed_pages(filepath, page_hashes, cached)
+    elif page_count and page_count > SPLIT_PAGE_THRESHOLD:
+        pages, cost = extract_split_pdf(filepath, page_count)
+    else:
+        with open(filepath, "rb") as f:
+            file_bytes = f.read()
+        pages, cost = extract_pages(file_bytes, content_type)
 
-    # Save extracted Markdown
+    for page in pages:
+        if page_hashes and page["page_number"] <= len(page_hashes):
+            page["sha256"] = page_hashes[page["page_number"] - 1]
+    content = join_pages(pages)
+
+    # Save extracted Markdown, plus where each page sits in it. The old page
+    # map goes first, so a crash in between never pairs it with new Markdown
     output_path = f"extracted/{filename}.md"
+    map_path = f"extracted/{filename}.pages.json"
+    if os.path.exists(map_path):
+        os.remove(map_path)
     with open(output_path, "w", encoding="utf-8") as f:
-        f.write(result.content)
+        f.write(content)
+
+    page_map = [{k: p.get(k) for k in ("page_number", "offset", "length", "confidence",
+                                       "skipped", "sha256")}
+                for p in pages]
+    with open(map_path, "w", encoding="utf-8") as f:
+        json.dump(page_map, f, indent=2)
 
     print(f"  -> Saved to {output_path}")
-    print(f"  -> Extracted {len(result.content)} characters")
+    print(f"  -> Extracted {len(content)} characters from {len(pages)} page(s)")
+    current_span().set(pages=len(pages), chars=len(content),
+                       pages_retried=cost["pages_retried"])
+    return cost
+
+
+def main():
+    # Create output folder
+    os.makedirs("extracted", exist_ok=True)
+    os.makedirs("extraction_metrics", exist_ok=True)
+
+    # Register each file in the docs/ folder; changed files start over
+    ledger = JobLedger()
+    doc_files = glob.glob("docs/*")
+    print(f"Found {len(doc_files)} file(s) in docs/")
+    for filepath in doc_files:
+        ledger.register(os.path.basename(filepath), filepath, file_sha256(filepath))
+
+    retry_report = {}
+
+    def handle(job):
+        if link_duplicate_scan(ledger, job["doc_id"], job["source_path"]):
+            return
+        cost = extract_document(job["source_path"])
+        ledger.advance(job["doc_id"], "extracted")
+        if cost["pages_retried"]:
+            retry_report[job["doc_id"]] = cost
+
+    with span("step1.run"):
+        succeeded, failed = run_jobs(ledger, ["new"], handle)
+    print(f"\nExtracted {succeeded} document(s) this run, {failed} failed")
+
+    # Retry cost is reported separately from the first-pass extraction
+    totals = {key: round(sum(c[key] for c in retry_report.values()), 2)
+              for key in ("pages_retried", "retry_calls", "pages_improved",
+                          "pages_dropped", "retry_seconds")}
+    report_path = "extraction_metrics/retry_report.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"documents": retry_report, "totals": totals}, f, indent=2)
+
+    print(f"\nLow-confidence retries: {totals['pages_retried']} page(s) in "
+          f"{totals['retry_calls']} extra call(s), {totals['retry_seconds']}s "
+          f"({totals['pages_improved']} improved, {totals['pages_dropped']} dropped)")
+    print(f"  -> Retry report saved to {report_path}")
+    clusters = fingerprints.get_store().clusters()
+    if clusters:
+        print(f"  -> {sum(len(m) for m in clusters.values())} near-duplicate(s) linked to "
+              f"{len(clusters)} document(s) (python fingerprints.py)")
+    print_limiter_stats()
+    print("\nAll documents extracted. Check the 'extracted/' folder.")
+
 
-print("\nAll documents extracted. Check the 'extracted/' folder.")
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,143 @@
 """
 Step 2: Chunk the extracted text, generate embeddings, and upload to Azure AI Search.
 Creates the search index with semantic search enabled.
+
+Each chunk is also split into small sentence/clause-level child passages
+that are embedded and indexed alongside it (doc_type "child", linked to
+the chunk by parent_id and their character span), so step3 can match on a
+precise passage and expand to just the part of the chunk around it.
+
+Template boilerplate that another document already indexed (the statutory
+notices, the short-form power lists) is detected with MinHash plus an exact
+match of its filled-in values (boilerplate.py) and not embedded or stored
+again; the indexed copy's "shared_by" list gains the new document instead.
+
+A document whose extracted text is a near-duplicate (SimHash,
+fingerprints.py) of one already indexed - the same form scanned twice - is
+linked to it and not chunked, embedded or uploaded.
+
+When step1 wrote a page map, chunks are laid out page by page (each page
+starts a new run of chunks, the last one reaching into the next page), so
+an edited page only changes the chunks that overlap it. An updated document
+reuses the vectors of every chunk and passage whose text is unchanged from
+the version last uploaded, re-uploads only index documents that differ and
+deletes the ones that are gone.
+
+After each run that uploaded something, the index contents (ids, content,
+metadata and vectors) are written to a local columnar snapshot
+(snapshot.py), from which the index can be rebuilt without re-embedding.
+
+Each document is checkpointed in the job ledger (job_ledger.py) after it is
+chunked, embedded and uploaded, so a crashed or throttled run resumes at the
+last completed stage instead of starting over.
 """
 
 import os
+import re
 import glob
 import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import (
-    SearchIndex,
-    SearchField,
-    SearchFieldDataType,
-    SimpleField,
-    SearchableField,
-    VectorSearch,
-    HnswAlgorithmConfiguration,
-    VectorSearchProfile,
-    SemanticConfiguration,
-    SemanticSearch,
-    SemanticPrioritizedFields,
-    SemanticField,
-)
+
+import boilerplate
+import clients
+import fingerprints
+import index_aliases
+import snapshot
+from embedding_dims import EMBEDDING_DIMENSIONS, describe, reduce_vectors, request_options
+from job_ledger import PREVIOUS_EMBEDDED, STAGES, JobLedger, run_jobs
+from rate_limiter import estimate_tokens, get_limiter, limited_call, print_limiter_stats
+from tracing import payload_size, propagate, record_usage, span
+import usage_ledger
 
 load_dotenv()
 
 # -- Configuration --
-INDEX_NAME = os.environ["AZURE_SEARCH_INDEX_NAME"]
+INDEX_NAME = os.environ.get("AZURE_SEARCH_INDEX_NAME", "")
 CHUNK_SIZE = 1000      # characters per chunk
 CHUNK_OVERLAP = 200    # overlap between chunks
-EMBEDDING_DIMENSIONS = 1536  # for text-embedding-ada-002
+PAGE_ALIGNED_CHUNKS = os.environ.get("PAGE_ALIGNED_CHUNKS", "1") == "1"
+DEDUP_BOILERPLATE = os.environ.get("DEDUP_BOILERPLATE", "1") == "1"
+CHILD_CHUNK_SIZE = int(os.environ.get("CHILD_CHUNK_SIZE", "250"))  # max chars per child passage, 0 = none
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "16"))   # inputs per request
+EMBEDDING_CONCURRENCY = int(os.environ.get("EMBEDDING_CONCURRENCY", "4"))  # requests in flight
+
+# Vector index: "hnsw" (approximate) or "exhaustive" (exact KNN - fine for small
+# indexes). Defaults are the service's; hnsw_sweep.py finds better ones for our corpus.
+VECTOR_ALGORITHM = os.environ.get("VECTOR_ALGORITHM", "hnsw")
+VECTOR_METRIC = os.environ.get("VECTOR_METRIC", "cosine")
+HNSW_M = int(os.environ.get("HNSW_M", "4"))                              # graph links per node
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", "400"))  # build-time candidates
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", "500"))              # query-time candidates
 
 # -- Clients --
-openai_client = AzureOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    api_key=os.environ["AZURE_OPENAI_API_KEY"],
-    api_version="2024-06-01",
-)
+# Built on first use by clients.py, so importing this module needs no SDK or settings
+def index_client(index_name):
+    return clients.search(index_name)
 
-search_index_client = SearchIndexClient(
-    endpoint=os.environ["AZURE_SEARCH_ENDPOINT"],
-    credential=AzureKeyCredential(os.environ["AZURE_SEARCH_ADMIN_KEY"]),
-)
 
-search_client = SearchClient(
-    endpoint=os.environ["AZURE_SEARCH_ENDPOINT"],
-    index_name=INDEX_NAME,
-    credential=AzureKeyCredential(os.environ["AZURE_SEARCH_ADMIN_KEY"]),
-)
+def live_client():
+    """Client for the index version INDEX_NAME points at now (index_aliases.py)."""
+    return index_client(index_aliases.resolve(INDEX_NAME))
 
 
 # -- Step 2a: Create the Search Index --
-def create_search_index():
-    """Creates the Azure AI Search index with vector search and semantic ranking."""
+def vector_search_config(algorithm=VECTOR_ALGORITHM, metric=VECTOR_METRIC, m=HNSW_M,
+                         ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH):
+    """The index's vector search section (one algorithm behind "my-vector-profile")."""
+    from azure.search.documents.indexes.models import (
+        ExhaustiveKnnAlgorithmConfiguration,
+        ExhaustiveKnnParameters,
+        HnswAlgorithmConfiguration,
+        HnswParameters,
+        VectorSearch,
+        VectorSearchProfile,
+    )
+
+    if algorithm == "exhaustive":
+        algorithm_config = ExhaustiveKnnAlgorithmConfiguration(
+            name="my-exhaustive-knn",
+            parameters=ExhaustiveKnnParameters(metric=metric),
+        )
+    elif algorithm == "hnsw":
+        algorithm_config = HnswAlgorithmConfiguration(
+            name="my-hnsw",
+            parameters=HnswParameters(m=m, ef_construction=ef_construction,
+                                      ef_search=ef_search, metric=metric),
+        )
+    else:
+        raise ValueError(f"VECTOR_ALGORITHM must be 'hnsw' or 'exhaustive', not {algorithm!r}")
+
+    return VectorSearch(
+        algorithms=[algorithm_config],
+        profiles=[
+            VectorSearchProfile(
+                name="my-vector-profile",
+                algorithm_configuration_name=algorithm_config.name,
+            ),
+        ],
+    )
+
+
+def create_search_index(index_name=None, vector_search=None):
+    """
+    Creates the Azure AI Search index with vector search and semantic ranking.
+    Defaults to the live version behind INDEX_NAME; schema changes that can't
+    be applied in place go to a new version (python index_aliases.py build).
+    """
+    from azure.search.documents.indexes.models import (
+        SearchField,
+        SearchFieldDataType,
+        SearchIndex,
+        SearchableField,
+        SemanticConfiguration,
+        SemanticField,
+        SemanticPrioritizedFields,
+        SemanticSearch,
+        SimpleField,
+    )
+
+    index_name = index_name or index_aliases.resolve(INDEX_NAME)
 
     fields = [
         SimpleField(name="id", type=SearchFieldDataType.String, key=True,
@@ -65,6 +147,19 @@ def create_search_index():
                      filterable=True),
         SimpleField(name="chunk_index", type=SearchFieldDataType.Int32,
                      filterable=True, sortable=True),
+        # every document containing the chunk (template boilerplate is stored once)
+        SimpleField(name="shared_by", type=SearchFieldDataType.Collection(SearchFieldDataType.String),
+                     filterable=True),
+        # "PA" / "IL" - lets step3 run one filtered search per state
+        SimpleField(name="state", type=SearchFieldDataType.String,
+                     filterable=True, facetable=True),
+        # "parent" for chunks, "child" for the passages inside them
+        SimpleField(name="doc_type", type=SearchFieldDataType.String,
+                     filterable=True),
+        SimpleField(name="parent_id", type=SearchFieldDataType.String,
+                     filterable=True),
+        SimpleField(name="span_start", type=SearchFieldDataType.Int32),
+        SimpleField(name="span_end", type=SearchFieldDataType.Int32),
         SearchField(
             name="content_vector",
             type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
@@ -74,17 +169,7 @@ def create_search_index():
         ),
     ]
 
-    vector_search = VectorSearch(
-        algorithms=[
-            HnswAlgorithmConfiguration(name="my-hnsw"),
-        ],
-        profiles=[
-            VectorSearchProfile(
-                name="my-vector-profile",
-                algorithm_configuration_name="my-hnsw",
-            ),
-        ],
-    )
+    vector_search = vector_search or vector_search_config()
 
     semantic_config = SemanticConfiguration(
         name="my-semantic-config",
@@ -96,18 +181,30 @@ def create_search_index():
     semantic_search = SemanticSearch(configurations=[semantic_config])
 
     index = SearchIndex(
-        name=INDEX_NAME,
+        name=index_name,
         fields=fields,
         vector_search=vector_search,
         semantic_search=semantic_search,
     )
 
     # Create or update the index
-    search_index_client.create_or_update_index(index)
-    print(f"Search index '{INDEX_NAME}' created/updated.")
+    with span("create_or_update_index", index=index_name):
+        limited_call(get_limiter("search"), clients.search_index().create_or_update_index, index)
+    algorithm = vector_search.algorithms[0].name
+    print(f"Search index '{index_name}' created/updated ({describe()}, {algorithm}).")
 
 
 # -- Step 2b: Chunk the Text --
+# Page markers step1 writes into the Markdown; a chunk of nothing else is not indexed
+MARKUP = re.compile(r"<!--.*?-->", re.S)
+# Pages dropped as unreadable by older step1 runs (now written empty)
+SKIPPED_PAGE = re.compile(r"<!-- PageSkipped[^>]*-->")
+
+
+def readable(chunk):
+    return bool(MARKUP.sub("", chunk).strip())
+
+
 def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     """Split text into overlapping chunks."""
     chunks = []
@@ -117,64 +214,417 @@ def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
         chunk = text[start:end]
         chunks.append(chunk.strip())
         start = end - overlap
-    return [c for c in chunks if c]  # Remove empty chunks
+    return [c for c in chunks if readable(c)]  # Remove empty chunks
 
 
-# -- Step 2c: Generate Embeddings --
-def get_embedding(text):
-    """Get embedding vector for a text string."""
-    response = openai_client.embeddings.create(
-        input=text,
-        model=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
-    )
-    return response.data[0].embedding
+def chunk_pages(text, page_map, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping chunks, starting over at every page so a
+    chunk only depends on its own page and the chunk_size characters after
+    it. The last chunk of a page runs on into the next one.
+    """
+    chunks = []
+    for page in page_map:
+        start, page_end = page["offset"], page["offset"] + page["length"]
+        if not readable(text[start:page_end]):
+            continue
+        while True:
+            end = start + chunk_size
+            chunks.append(text[start:end].strip())
+            if end >= page_end:
+                break
+            start = end - overlap
+    return [c for c in chunks if readable(c)]
+
+
+def load_page_map(filename, text):
+    """step1's page map of an extracted file, or None if it doesn't match the text."""
+    try:
+        with open(f"extracted/{filename}.pages.json", "r", encoding="utf-8") as f:
+            page_map = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not page_map or page_map[-1]["offset"] + page_map[-1]["length"] != len(text):
+        return None
+    return page_map
+
+
+# Sentence ends, clause breaks and line breaks
+PASSAGE_BREAK = re.compile(r"(?<=[.;:!?])\s+|\n+")
+
+
+def split_passages(text, max_chars=CHILD_CHUNK_SIZE):
+    """
+    Split a chunk into sentence/clause-level passages of up to max_chars,
+    merging short neighbours. Returns (start, end) offsets into `text`.
+    """
+    pieces, start = [], 0
+    for m in PASSAGE_BREAK.finditer(text):
+        pieces.append((start, m.start()))
+        start = m.end()
+    pieces.append((start, len(text)))
+
+    # Overlong sentences (tables, run-on clauses) are cut at a space
+    segments = []
+    for start, end in pieces:
+        while end - start > max_chars:
+            cut = text.rfind(" ", start, start + max_chars)
+            cut = cut if cut > start else start + max_chars
+            segments.append((start, cut))
+            start = cut
+        segments.append((start, end))
+
+    passages = []
+    for start, end in segments:
+        if not text[start:end].strip():
+            continue
+        if passages and end - passages[-1][0] <= max_chars:
+            passages[-1] = (passages[-1][0], end)
+        else:
+            passages.append((start, end))
+    # Trim the whitespace at either end of each span
+    trimmed = []
+    for start, end in passages:
+        piece = text[start:end]
+        start += len(piece) - len(piece.lstrip())
+        trimmed.append((start, start + len(piece.strip())))
+    return trimmed
+
+
+def document_state(filename, text):
+    """Governing state of a document: the file name prefix, else the state named most."""
+    prefix = filename[:3].upper()
+    if prefix in ("PA_", "IL_"):
+        return prefix[:2]
+    mentions = {"PA": len(re.findall(r"Pennsylvania|Pa\.C\.S", text)),
+                "IL": len(re.findall(r"Illinois|ILCS", text))}
+    state = max(mentions, key=mentions.get)
+    return state if mentions[state] else None
+
+
+# -- Step 2c: Embed, Process and Upload --
+def link_duplicate_document(ledger, doc_id):
+    """
+    Link an extracted document whose text is a near-duplicate of an indexed
+    one to it, remove what an earlier version of it put in the index, and
+    mark it done. Returns the canonical doc_id or None.
+    """
+    if not fingerprints.DEDUP_DOCUMENTS:
+        return None
+    with open(f"extracted/{doc_id}.md", "r", encoding="utf-8") as f:
+        text = f.read()
+    store = fingerprints.get_store()
+    with span("text_fingerprint", chars=len(text)) as s:
+        # Only documents that made it into the index can be linked to
+        match = store.match_text(
+            doc_id, text, indexed=lambda d: (ledger.get(d) or {}).get("stage") == STAGES[-1])
+        s.set(duplicate=bool(match))
+    if match is None:
+        return None
+    canonical = store.canonical_of(doc_id)
+    print(f"  -> Near-duplicate of {canonical} ({match['distance']} bit(s) apart); not indexed")
+    if ledger.get_artifact(doc_id, PREVIOUS_EMBEDDED):
+        stale, merges = stale_documents(ledger, doc_id, [])
+        if DEDUP_BOILERPLATE:
+            registry = boilerplate.get_registry()
+            merges += [{"id": p, "shared_by": [f"{r}.md" for r in registry.refs(p)]}
+                       for p in registry.drop_refs(doc_id)]
+        print(f"  -> Removing {len(stale)} index document(s) of its earlier version")
+        write_batches([], merges, stale)
+        ledger.delete_artifact(doc_id, PREVIOUS_EMBEDDED)
+    ledger.advance(doc_id, STAGES[-1])
+    return canonical
+
+
+def chunk_document(ledger, doc_id):
+    """Chunk one extracted document and checkpoint the chunks."""
+    filename = f"{doc_id}.md"
+    with open(f"extracted/{filename}", "r", encoding="utf-8") as f:
+        text = f.read()
+
+    # Blanked rather than removed, so the page map's offsets still hold
+    text = SKIPPED_PAGE.sub(lambda m: " " * len(m.group()), text)
+    page_map = load_page_map(doc_id, text) if PAGE_ALIGNED_CHUNKS else None
+    with span("chunk_text", chars=len(text), pages=len(page_map or ())) as s:
+        chunks = chunk_pages(text, page_map) if page_map else chunk_text(text)
+        s.set(chunks=len(chunks))
+    if not chunks:
+        print("  -> No readable text (every page was dropped); nothing to index")
+    else:
+        print(f"  -> Split into {len(chunks)} chunks")
+    ledger.put_artifact(doc_id, "chunks", chunks)
+    ledger.advance(doc_id, "chunked")
+
+
+def get_embeddings(texts):
+    """
+    Embed many texts at once: inputs are batched into EMBEDDING_BATCH_SIZE
+    per request and the requests are fanned out over a thread pool.
+    """
+    batches = [texts[i:i + EMBEDDING_BATCH_SIZE]
+               for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+
+    def embed_batch(batch):
+        usage_ledger.check_budget()
+        with span("embeddings.create", inputs=len(batch), bytes=payload_size(batch)) as s:
+            response = limited_call(
+                get_limiter("openai-embeddings"),
+                clients.openai().embeddings.with_raw_response.create,
+                input=batch,
+                model=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
+                tokens=estimate_tokens(batch),
+                **request_options(),
+            )
+            record_usage(s, response.usage)
+        usage_ledger.record("embedding", response.usage,
+                            os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"])
+        return reduce_vectors([d.embedding for d in sorted(response.data, key=lambda d: d.index)])
+
+    with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as pool:
+        results = list(pool.map(propagate(embed_batch), batches))
+    return [embedding for batch in results for embedding in batch]
+
+
+def previous_vectors(ledger, doc_id):
+    """Text -> vector of everything uploaded for the previous version of a changed document."""
+    documents = split_merges(ledger.get_artifact(doc_id, PREVIOUS_EMBEDDED) or [])[0]
+    return {d["content"]: d["content_vector"] for d in documents
+            if len(d.get("content_vector") or ()) == EMBEDDING_DIMENSIONS}
+
+
+def chunk_id(filename, i):
+    return f"{filename}-chunk-{i}".replace(" ", "-").replace(".", "-")
+
+
+def embed_document(ledger, doc_id):
+    """Embed the checkpointed chunks of one document."""
+    filename = f"{doc_id}.md"
+    chunks = ledger.get_artifact(doc_id, "chunks")
+    state = document_state(filename, "\n".join(chunks))
+
+    # Boilerplate another document already indexed is referenced, not embedded again
+    signatures, values, shared, dropped = {}, {}, {}, []
+    if DEDUP_BOILERPLATE:
+        registry = boilerplate.get_registry()
+        # Re-embedding starts over: only passages the document still contains get its ref back
+        dropped = registry.drop_refs(doc_id)
+        with span("boilerplate_match", chunks=len(chunks)) as s:
+            for i, chunk in enumerate(chunks):
+                signatures[i] = boilerplate.signature_of(chunk)
+                values[i] = boilerplate.value_hash(chunk)
+                match = registry.find(signatures[i], values[i], exclude_doc=doc_id)
+                if match:
+                    shared[i] = match["passage_id"]
+            s.set(shared=len(shared))
+    own = [i for i in range(len(chunks)) if i not in shared]
+
+    children = []
+    if CHILD_CHUNK_SIZE:
+        for i in own:
+            children.extend((i, start, end) for start, end in split_passages(chunks[i]))
+
+    # Parents and children go out in the same batched requests; text that is
+    # unchanged since the last uploaded version keeps its vector
+    texts = [chunks[i] for i in own] + [chunks[i][start:end] for i, start, end in children]
+    vectors = previous_vectors(ledger, doc_id)
+    reused = sum(1 for text in texts if text in vectors)
+    missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+    vectors.update(zip(missing, get_embeddings(missing)))
+    embeddings = [vectors[text] for text in texts]
+
+    documents = []
+    for i, embedding in zip(own, embeddings):
+        doc = {
+            "id": chunk_id(filename, i),
+            "content": chunks[i],
+            "source_file": filename,
+            "chunk_index": i,
+            "state": state,
+            "doc_type": "parent",
+            "shared_by": [filename],
+            "content_vector": embedding,
+        }
+        documents.append(doc)
+        if DEDUP_BOILERPLATE:
+            registry.add(doc["id"], doc_id, signatures[i], values[i], len(chunks[i]))
+
+    for n, ((i, start, end), embedding) in enumerate(zip(children, embeddings[len(own):])):
+        parent_id = chunk_id(filename, i)
+        documents.append({
+            "id": f"{parent_id}-p{n}",
+            "content": chunks[i][start:end],
+            "source_file": filename,
+            "chunk_index": i,
+            "state": state,
+            "doc_type": "child",
+            "parent_id": parent_id,
+            "span_start": start,
+            "span_end": end,
+            "content_vector": embedding,
+        })
+
+    for i, passage_id in shared.items():
+        registry.add_ref(passage_id, doc_id)
+        documents.append({"@search.action": "merge", "id": passage_id})
+    # ...and the ones it no longer contains get shared_by refreshed without it
+    for passage_id in sorted(set(dropped) - set(shared.values())):
+        documents.append({"@search.action": "merge", "id": passage_id})
+
+    print(f"  -> Embedded {len(own)} chunks and {len(children)} child passages"
+          + (f" ({reused} unchanged, not re-embedded)" if reused else "")
+          + (f"; {len(shared)} boilerplate chunk(s) shared with other documents" if shared else ""))
+    ledger.put_artifact(doc_id, "embedded", documents)
+    ledger.advance(doc_id, "embedded")
+
+
+def split_merges(documents):
+    """
+    (own index documents, references to shared chunks) of an 'embedded'
+    artifact. shared_by is read from the registry now, so documents that
+    joined since are included.
+    """
+    merges = [d for d in documents if d.get("@search.action") == "merge"]
+    documents = [d for d in documents if d.get("@search.action") != "merge"]
+    if DEDUP_BOILERPLATE:
+        registry = boilerplate.get_registry()
+        for doc in documents:
+            if doc.get("doc_type") == "parent":
+                doc["shared_by"] = [f"{d}.md" for d in registry.refs(doc["id"])] or doc["shared_by"]
+        merges = [{"id": d["id"], "shared_by": [f"{r}.md" for r in registry.refs(d["id"])]}
+                  for d in merges]
+    return documents, merges
+
+
+def indexed_documents(ledger):
+    """Every index document of the uploaded documents, as it is in the index now."""
+    for doc_id, documents in ledger.artifacts("embedded"):
+        job = ledger.get(doc_id)
+        if job and job["stage"] == STAGES[-1]:
+            yield from split_merges(documents)[0]
+
+
+def stale_documents(ledger, doc_id, documents):
+    """
+    Index documents of the previous version of doc_id that the new version
+    no longer has, except chunks other documents share (and their passages).
+    Returns (stale, merges): what to delete, and shared_by updates for the
+    shared chunks that are kept without doc_id. Deleted chunks leave the
+    boilerplate registry, so no document references them again.
+    """
+    previous = split_merges(ledger.get_artifact(doc_id, PREVIOUS_EMBEDDED) or [])[0]
+    current = {d["id"] for d in documents}
+    registry = boilerplate.get_registry() if DEDUP_BOILERPLATE else None
+    stale, merges = [], []
+    for doc in previous:
+        if doc["id"] in current:
+            continue
+        parent_id = doc.get("parent_id") or doc["id"]
+        if registry and set(registry.refs(parent_id)) - {doc_id}:
+            if doc["id"] == parent_id:
+                registry.drop_refs(doc_id, [parent_id])
+                merges.append({"id": parent_id,
+                               "shared_by": [f"{r}.md" for r in registry.refs(parent_id)]})
+            continue
+        if registry and doc["id"] == parent_id:
+            registry.remove(parent_id)
+        stale.append({"id": doc["id"]})
+    return stale, merges
+
+
+def upload_document(ledger, doc_id):
+    """
+    Upload the embedded chunks of one document in batches of 100. Returns
+    the number of index documents written or removed.
+    """
+    documents, merges = split_merges(ledger.get_artifact(doc_id, "embedded"))
+    uploaded = {d["id"]: d for d in
+                split_merges(ledger.get_artifact(doc_id, PREVIOUS_EMBEDDED) or [])[0]}
+    # An updated document: what the index already has unchanged is left alone
+    changed = [d for d in documents if uploaded.get(d["id"]) != d]
+    stale, refreshed = stale_documents(ledger, doc_id, documents) if uploaded else ([], [])
+    merges += refreshed
+    if uploaded:
+        print(f"  -> Update: {len(changed)} changed, {len(documents) - len(changed)} unchanged, "
+              f"{len(stale)} removed index document(s)")
+
+    write_batches(changed, merges, stale)
+    ledger.advance(doc_id, "uploaded")
+    ledger.delete_artifact(doc_id, PREVIOUS_EMBEDDED)
+    return len(changed) + len(stale)
+
+
+def write_batches(changed, merges, stale, batch_size=100):
+    """Upload, merge and delete index documents in the live version."""
+    search_client = live_client()
+    batches = [(search_client.upload_documents, changed[i:i + batch_size])
+               for i in range(0, len(changed), batch_size)]
+    # Another worker may not have uploaded the shared chunk yet: merge-or-upload
+    # leaves a stub that its own upload fills in
+    batches += [(search_client.merge_or_upload_documents, merges[i:i + batch_size])
+                for i in range(0, len(merges), batch_size)]
+    batches += [(search_client.delete_documents, stale[i:i + batch_size])
+                for i in range(0, len(stale), batch_size)]
+    for n, (upload, batch) in enumerate(batches):
+        with span("upload_documents", docs=len(batch), bytes=payload_size(batch)):
+            result = limited_call(get_limiter("search"), upload, documents=batch)
+        succeeded = sum(1 for r in result if r.succeeded)
+        print(f"  -> Batch {n + 1}: {succeeded}/{len(batch)} succeeded")
+        if succeeded < len(batch):
+            raise RuntimeError(f"{len(batch) - succeeded} chunk(s) failed to upload")
+
+
+def process_document(ledger, job):
+    """Run one document through whichever stages it still needs."""
+    doc_id, stage = job["doc_id"], job["stage"]
+    print(f"\nProcessing: {doc_id}.md (resuming after '{stage}')")
+
+    with span("process_document", doc_id=doc_id, resumed_after=stage), \
+            usage_ledger.attribute("document", doc_id):
+        if stage == "extracted":
+            if link_duplicate_document(ledger, doc_id):
+                return 0
+            chunk_document(ledger, doc_id)
+            stage = "chunked"
+        if stage == "chunked":
+            embed_document(ledger, doc_id)
+            stage = "embedded"
+        if stage == "embedded":
+            return upload_document(ledger, doc_id)
 
 
-# -- Step 2d: Process and Upload --
 def process_and_upload():
     """Read extracted files, chunk them, embed them, upload to search index."""
 
+    ledger = JobLedger()
+
+    # Extracted files step1 didn't register (e.g. extracted elsewhere) join here
     extracted_files = glob.glob("extracted/*.md")
     print(f"Found {len(extracted_files)} extracted file(s)")
-
-    all_documents = []
-
     for filepath in extracted_files:
-        filename = os.path.basename(filepath)
-        print(f"\nProcessing: {filename}")
-
-        with open(filepath, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        chunks = chunk_text(text)
-        print(f"  -> Split into {len(chunks)} chunks")
-
-        for i, chunk in enumerate(chunks):
-            print(f"  -> Embedding chunk {i+1}/{len(chunks)}...", end="\r")
-
-            embedding = get_embedding(chunk)
-
-            doc = {
-                "id": f"{filename}-chunk-{i}".replace(" ", "-").replace(".", "-"),
-                "content": chunk,
-                "source_file": filename,
-                "chunk_index": i,
-                "content_vector": embedding,
-            }
-            all_documents.append(doc)
-
-        print(f"  -> Embedded {len(chunks)} chunks          ")
-
-    # Upload in batches of 100
-    print(f"\nUploading {len(all_documents)} document(s) to search index...")
-    batch_size = 100
-    for i in range(0, len(all_documents), batch_size):
-        batch = all_documents[i:i + batch_size]
-        result = search_client.upload_documents(documents=batch)
-        succeeded = sum(1 for r in result if r.succeeded)
-        print(f"  -> Batch {i//batch_size + 1}: {succeeded}/{len(batch)} succeeded")
-
-    print(f"\nAll {len(all_documents)} chunks indexed successfully.")
+        doc_id = os.path.basename(filepath)[:-len(".md")]
+        ledger.register(doc_id, content_hash=None, stage="extracted")
+
+    uploaded = []
+    with span("step2.run"):
+        succeeded, failed = run_jobs(
+            ledger, ["extracted", "chunked", "embedded"],
+            lambda job: uploaded.append(process_document(ledger, job)),
+        )
+
+    print(f"\n{sum(uploaded)} chunk(s) from {succeeded} document(s) indexed, "
+          f"{failed} document(s) failed.")
+    if failed:
+        print("Run 'python job_ledger.py status' to see the errors; "
+              "re-run this step to resume.")
+    clusters = fingerprints.get_store().clusters()
+    if clusters:
+        print(f"{sum(len(m) for m in clusters.values())} near-duplicate document(s) linked "
+              f"instead of indexed (python fingerprints.py)")
+    if snapshot.SNAPSHOT_ON_UPLOAD and sum(uploaded):
+        with span("snapshot.write"):
+            snapshot.write_snapshot(indexed_documents(ledger), INDEX_NAME)
+    print_limiter_stats()
+    usage_ledger.print_usage_summary()
 
 
 # -- Run Everything --
@@ -1,84 +1,336 @@
 """
 Step 3: Query your POA documents using RAG.
 Performs semantic search + vector search (hybrid), then sends results to GPT-4o.
+
+Small-to-big retrieval: the search matches the small child passages
+step2 indexes inside each chunk, then expands each hit to the part of its
+parent chunk around it (PARENT_WINDOW characters either side), so the
+prompt carries the relevant clauses rather than whole 1000-char chunks.
+Indexes without child passages fall back to plain chunk search.
+
+Each question is routed first (query_router.py): factual questions that
+resolve to a field step5 extracted ("who is the successor agent in the PA
+durable POA?") are answered from field_store.py with a citation, "show me
+the clause" questions get the retrieved passages without a GPT-4o call,
+and only the rest go through the full RAG path.
+
+Comparison questions that name both states (or ask how "the states"
+differ) fan out into one state-filtered search per state, run concurrently
+with a shared query embedding, and get a balanced share of the context
+each - so a PA vs IL answer never sees only one side.
+
+AZURE_SEARCH_INDEX_NAME is resolved through index_aliases.py on every
+search, so a blue/green switch to a new index version is picked up without
+a restart.
 """
 
 import os
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
+
+import clients
+import index_aliases
+import query_router
+from field_store import STATE_PATTERNS, states_in
+from embedding_dims import reduce_vectors, request_options
+from rate_limiter import estimate_tokens, get_limiter, limited_call
+from tracing import current_span, payload_size, propagate, record_usage, span, traced
+import usage_ledger
 
 load_dotenv()
 
+# -- Configuration --
+# Ask the vector index for more neighbours than top_k (better HNSW recall, more
+# candidates for hybrid fusion), or bypass HNSW with an exact search
+VECTOR_OVERSAMPLING = float(os.environ.get("VECTOR_OVERSAMPLING", "1"))
+VECTOR_EXHAUSTIVE = os.environ.get("VECTOR_EXHAUSTIVE", "0") == "1"
+SMALL_TO_BIG = os.environ.get("SMALL_TO_BIG", "1") == "1"
+PARENT_WINDOW = int(os.environ.get("PARENT_WINDOW", "200"))  # parent chars kept around a passage
+PASSAGE_FANOUT = 3  # passages searched per parent chunk wanted
+QUERY_ROUTING = os.environ.get("QUERY_ROUTING", "1") == "1"
+STATE_FANOUT = os.environ.get("STATE_FANOUT", "1") == "1"
+
+COMPARISON = r"\b(compar\w*|differ\w*|versus|vs\.?|both|each state|the states|contrast)\b"
+
 # -- Clients --
-openai_client = AzureOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    api_key=os.environ["AZURE_OPENAI_API_KEY"],
-    api_version="2024-06-01",
-)
+# Built on first use by clients.py, so importing this module needs no SDK or settings
+INDEX_NAME = os.environ.get("AZURE_SEARCH_INDEX_NAME", "")
 
-search_client = SearchClient(
-    endpoint=os.environ["AZURE_SEARCH_ENDPOINT"],
-    index_name=os.environ["AZURE_SEARCH_INDEX_NAME"],
-    credential=AzureKeyCredential(os.environ["AZURE_SEARCH_ADMIN_KEY"]),
-)
 
+def get_search_client(index_name=None):
+    """Client for one physical index - by default the live version behind INDEX_NAME."""
+    return clients.search(index_name or index_aliases.resolve(INDEX_NAME))
 
-def get_embedding(text):
-    """Get embedding vector for a text string."""
-    response = openai_client.embeddings.create(
-        input=text,
-        model=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
-    )
-    return response.data[0].embedding
+
+def get_embedding(text, native=False):
+    """
+    Get embedding vector for a text string, at the index's size
+    (embedding_dims.py). native=True returns the model's full-size vector.
+    """
+    usage_ledger.check_budget()
+    with span("embeddings.create", inputs=1, bytes=payload_size(text)) as s:
+        response = limited_call(
+            get_limiter("openai-embeddings"),
+            clients.openai().embeddings.with_raw_response.create,
+            input=text,
+            model=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
+            tokens=estimate_tokens(text),
+            **request_options(native),
+        )
+        record_usage(s, response.usage)
+    usage_ledger.record("embedding", response.usage, os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"])
+    if native:
+        return response.data[0].embedding
+    return reduce_vectors([response.data[0].embedding])[0]
 
 
-def search_documents(query, top_k=5):
+def search_documents(query, top_k=5, mode="hybrid", semantic=True, query_vector=None,
+                     oversampling=VECTOR_OVERSAMPLING, exhaustive=VECTOR_EXHAUSTIVE,
+                     passages=False, state=None, index_name=None):
     """
     Hybrid search: combines keyword search + vector similarity + semantic ranking.
     This is the 'Retrieval' in RAG.
+
+    mode="vector" or mode="keyword" drops one half of the hybrid query and
+    semantic=False skips the semantic reranker (used by eval_retrieval.py to
+    compare configurations). Pass query_vector to reuse an embedding.
+    The vector half asks for top_k * oversampling neighbours; exhaustive=True
+    searches every vector instead of the HNSW graph.
+    passages=True searches the child passages instead of the chunks;
+    state="PA" / "IL" restricts the search to one state's documents.
+    index_name searches one index version instead of the live one.
     """
-    query_vector = get_embedding(query)
+    from azure.search.documents.models import VectorizedQuery
 
-    results = search_client.search(
-        search_text=query,
-        vector_queries=[
+    vector_queries = None
+    if mode in ("hybrid", "vector"):
+        if query_vector is None:
+            query_vector = get_embedding(query)
+        vector_queries = [
             VectorizedQuery(
                 vector=query_vector,
-                k_nearest_neighbors=top_k,
+                k_nearest_neighbors=max(top_k, math.ceil(top_k * oversampling)),
                 fields="content_vector",
+                exhaustive=exhaustive or None,
             )
-        ],
-        top=top_k,
-        query_type="semantic",
-        semantic_configuration_name="my-semantic-config",
-        select=["content", "source_file", "chunk_index"],
-    )
+        ]
+
+    options = {}
+    if semantic:
+        options = {"query_type": "semantic",
+                   "semantic_configuration_name": "my-semantic-config"}
+        if mode == "vector":
+            options["semantic_query"] = query   # the reranker still needs the text
+
+    filters = ["doc_type eq 'child'" if passages else "doc_type ne 'child'"]
+    if state:
+        filters.append(f"state eq '{state}'")
+
+    select = ["content", "source_file", "chunk_index"]
+    if passages:
+        select += ["parent_id", "span_start", "span_end"]
+    else:
+        select.append("shared_by")
+
+    # Results are paged lazily - list() inside the call so throttling is retried
+    with span("search", mode=mode, semantic=semantic, top_k=top_k, passages=passages,
+              state=state) as s:
+        client = get_search_client(index_name)
+        results = limited_call(get_limiter("search"), lambda: list(client.search(
+            search_text=query if mode in ("hybrid", "keyword") else None,
+            vector_queries=vector_queries,
+            filter=" and ".join(filters),
+            top=top_k,
+            select=select,
+            **options,
+        )))
+        s.set(results=len(results))
 
     retrieved = []
     for result in results:
         retrieved.append({
             "content": result["content"],
             "source": result["source_file"],
+            "chunk_index": result.get("chunk_index"),
+            "shared_by": result.get("shared_by") or [result["source_file"]],
             "score": result.get("@search.score", 0),
         })
+        if passages:
+            retrieved[-1].update(parent_id=result["parent_id"], span=(result["span_start"],
+                                                                     result["span_end"]))
+
+    return retrieved
+
+
+def get_parents(parent_ids, index_name=None):
+    """
+    Fetch parent chunks by id in one request (from the index the passages
+    came from). Returns {id: {"content", "shared_by"}}.
+    """
+    client = get_search_client(index_name)
+    with span("get_parents", parents=len(parent_ids)):
+        results = limited_call(get_limiter("search"), lambda: list(client.search(
+            search_text="*",
+            filter=f"search.in(id, '{'|'.join(parent_ids)}', '|')",
+            top=len(parent_ids),
+            select=["id", "content", "shared_by"],
+        )))
+    return {r["id"]: {"content": r["content"], "shared_by": r.get("shared_by")} for r in results}
+
+
+def expand_spans(text, spans, window=PARENT_WINDOW):
+    """The parts of `text` around the matched spans, widened to word boundaries and merged."""
+    ranges = []
+    for span_start, span_end in sorted(spans):
+        start, end = max(0, span_start - window), min(len(text), span_end + window)
+        # Don't cut words in half at the edges of the window
+        if start > 0:
+            space = text.find(" ", start, span_start)
+            start = space + 1 if space != -1 else span_start
+        if end < len(text):
+            space = text.rfind(" ", span_end, end)
+            end = space if space != -1 else span_end
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1]))
+        else:
+            ranges.append((start, end))
+    return " ... ".join(text[start:end].strip() for start, end in ranges)
+
+
+def search_passages(query, top_k=5, window=PARENT_WINDOW, **options):
+    """
+    Small-to-big search: match child passages, then return up to top_k parent
+    chunks cut down to the window around their matched passages (best first).
+    """
+    hits = search_documents(query, top_k=top_k * PASSAGE_FANOUT, passages=True, **options)
+
+    parents = {}
+    for hit in hits:
+        parent = parents.get(hit["parent_id"])
+        if parent is None:
+            if len(parents) == top_k:
+                continue
+            parent = parents[hit["parent_id"]] = dict(hit, spans=[], passages=0)
+        parent["spans"].append(hit["span"])
+        parent["passages"] += 1
+    if not parents:
+        return []
 
+    fetched = get_parents(list(parents), options.get("index_name"))
+    retrieved = []
+    for parent_id, parent in parents.items():
+        text = (fetched.get(parent_id) or {}).get("content")
+        retrieved.append({
+            "content": expand_spans(text, parent["spans"], window) if text else parent["content"],
+            "source": parent["source"],
+            "chunk_index": parent["chunk_index"],
+            "shared_by": (fetched.get(parent_id) or {}).get("shared_by") or [parent["source"]],
+            "score": parent["score"],
+            "passages": parent["passages"],
+        })
     return retrieved
 
 
+def citation(chunk):
+    """The chunk's source, plus the other documents sharing it (boilerplate stored once)."""
+    others = [f for f in chunk.get("shared_by") or [] if f != chunk["source"]]
+    return chunk["source"] + (f" (also in {', '.join(others)})" if others else "")
+
+
+def retrieve(question, top_k=5, **options):
+    """Small-to-big passages when the index has them, else whole chunks."""
+    chunks = search_passages(question, top_k=top_k, **options) if SMALL_TO_BIG else []
+    return chunks or search_documents(question, top_k=top_k, **options)
+
+
+def comparison_states(question):
+    """The states a comparison question spans ([] when it is not one)."""
+    text = question.lower()
+    named = states_in(question)
+    if len(named) > 1:
+        return named
+    if re.search(COMPARISON, text) and re.search(r"\bstates?\b|jurisdiction", text):
+        return list(STATE_PATTERNS)
+    return []
+
+
+def search_by_state(question, states, top_k=5):
+    """
+    One filtered retrieval per state, run concurrently, merged with an even
+    share of top_k per state (interleaved, best first).
+    """
+    query_vector = get_embedding(question)   # shared by every state's search
+    budgets = {state: top_k // len(states) + (i < top_k % len(states))
+               for i, state in enumerate(states)}
+
+    def search_state(state):
+        return retrieve(question, top_k=max(1, budgets[state]), query_vector=query_vector,
+                        state=state)
+
+    with span("state_fanout", states=",".join(states)):
+        with ThreadPoolExecutor(max_workers=len(states)) as pool:
+            per_state = list(pool.map(propagate(search_state), states))
+
+    merged = []
+    for rank in range(max((len(r) for r in per_state), default=0)):
+        for state, results in zip(states, per_state):
+            if rank < len(results):
+                merged.append(dict(results[rank], state=state))
+    return merged
+
+
+@traced("query")
 def ask_question(question):
     """
-    Full RAG pipeline: retrieve relevant chunks, then generate an answer.
+    Route the question, then answer it by field lookup, retrieval only,
+    or the full RAG pipeline.
     """
+    current_span().set(question=question[:200])
     print(f"\n{'='*50}")
     print(f"Question: {question}")
     print(f"{'='*50}")
 
+    start = time.perf_counter()
+    if QUERY_ROUTING:
+        with span("route") as s:
+            decision = query_router.route(question)
+            s.set(route=decision["route"], reason=decision["reason"])
+    else:
+        decision = {"route": "rag", "reason": "routing-off", "confidence": 1.0,
+                    "classify_ms": 0, "lookup": None}
+    current_span().set(route=decision["route"])
+
+    answer = None
+    try:
+        if decision["route"] == "lookup":
+            hit = decision["lookup"]
+            answer = hit["answer"]
+            print(f"\nAnswer (from extracted fields, {hit['latency_ms']} ms):\n{answer}")
+        else:
+            answer = answer_from_documents(question, generate=decision["route"] == "rag")
+    finally:
+        query_router.log_decision(question, decision, (time.perf_counter() - start) * 1000,
+                                  answered=answer is not None)
+    return answer
+
+
+def answer_from_documents(question, generate=True):
+    """
+    Retrieve relevant chunks, then generate an answer with GPT-4o
+    (generate=False returns the retrieved passages themselves).
+    """
     # Step A: Retrieve relevant chunks
     print("\nSearching documents...")
-    chunks = search_documents(question)
+    with usage_ledger.attribute("query", question):
+        states = comparison_states(question) if STATE_FANOUT else []
+        if states:
+            print(f"Comparison across {' and '.join(states)}: searching each state")
+            chunks = search_by_state(question, states)
+        else:
+            chunks = retrieve(question)
 
     if not chunks:
         print("No relevant documents found.")
@@ -88,12 +340,20 @@ def ask_question(question):
     print(f"\nRetrieved {len(chunks)} relevant chunk(s):")
     for i, chunk in enumerate(chunks):
         preview = chunk['content'][:100].replace('\n', ' ')
-        print(f"  {i+1}. [{chunk['source']}] {preview}...")
+        print(f"  {i+1}. [{citation(chunk)}] {preview}...")
+
+    if not generate:
+        answer = "\n\n".join(f"[Source: {citation(c)}]\n{c['content']}" for c in chunks)
+        print(f"\nPassages:\n{answer}")
+        return answer
 
     # Step B: Build the context from retrieved chunks
-    context = "\n\n---\n\n".join(
-        f"[Source: {c['source']}]\n{c['content']}" for c in chunks
-    )
+    with span("context_build", chunks=len(chunks)) as s:
+        context = "\n\n---\n\n".join(
+            f"[Source: {citation(c)}" + (f" | {c['state']}" if c.get("state") else "")
+            + f"]\n{c['content']}" for c in chunks
+        )
+        s.set(chars=len(context))
 
     # Step C: Generate answer using GPT-4o
     print("\nGenerating answer...")
@@ -108,11 +368,9 @@ Rules:
 - Be precise about legal details - do not paraphrase legal terms loosely.
 - If PA and IL differ on something, highlight the differences."""
 
-    response = openai_client.chat.completions.create(
-        model=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"""Context from POA documents:
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"""Context from POA documents:
 
 {context}
 
@@ -121,10 +379,22 @@ Rules:
 Question: {question}
 
 Please answer based on the context above."""}
-        ],
-        temperature=0.3,       # Lower = more factual, less creative
-        max_tokens=1000,
-    )
+    ]
+
+    usage_ledger.check_budget()
+    with span("chat.completions.create", bytes=payload_size(messages)) as s, \
+            usage_ledger.attribute("query", question):
+        response = limited_call(
+            get_limiter("openai-chat"),
+            clients.openai().chat.completions.with_raw_response.create,
+            model=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
+            messages=messages,
+            temperature=0.3,       # Lower = more factual, less creative
+            max_tokens=1000,
+            tokens=estimate_tokens([m["content"] for m in messages]) + 1000,
+        )
+        record_usage(s, response.usage)
+        usage_ledger.record("chat", response.usage, os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"])
 
     answer = response.choices[0].message.content
     print(f"\nAnswer:\n{answer}")
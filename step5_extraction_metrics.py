@@ -16,6 +16,7 @@ expected POA fields were successfully extracted from each document.
 Output:
   - extraction_metrics/metrics_summary.csv
   - extraction_metrics/metrics_summary.json
+  - extraction_metrics/<file>_fields.json, also loaded into field_store.py
   - Prints a formatted table to console
 """
 
@@ -24,24 +25,14 @@ import glob
 import json
 import csv
 from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import DocumentContentFormat
-from openai import AzureOpenAI
 
-load_dotenv()
-
-# -- Clients --
-doc_client = DocumentIntelligenceClient(
-    endpoint=os.environ["AZURE_DOCINTEL_ENDPOINT"],
-    credential=AzureKeyCredential(os.environ["AZURE_DOCINTEL_KEY"])
-)
+import clients
+import field_store
+from rate_limiter import estimate_tokens, get_limiter, limited_call, print_limiter_stats
+from tracing import current_span, record_usage, span, traced
+import usage_ledger
 
-openai_client = AzureOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    api_key=os.environ["AZURE_OPENAI_API_KEY"],
-    api_version="2024-06-01",
-)
+load_dotenv()
 
 os.makedirs("extraction_metrics", exist_ok=True)
 
@@ -97,21 +88,26 @@ def assess_field_completeness(content, filename):
     Use GPT-4o to assess what percentage of expected POA fields
     were successfully extracted from the document.
     """
-    response = openai_client.chat.completions.create(
-        model=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a document extraction quality assessor. "
-                    "Given extracted text from a Power of Attorney document, "
-                    "assess which standard fields are present and which are missing. "
-                    "Return ONLY valid JSON with no markdown or backticks."
-                )
-            },
-            {
-                "role": "user",
-                "content": f"""Analyze this extracted POA document text and assess field completeness.
+    usage_ledger.check_budget()
+    with span("chat.completions.create", purpose="field_completeness") as s, \
+            usage_ledger.attribute("document", filename):
+        response = limited_call(
+            get_limiter("openai-chat"),
+            clients.openai().chat.completions.with_raw_response.create,
+            model=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a document extraction quality assessor. "
+                        "Given extracted text from a Power of Attorney document, "
+                        "assess which standard fields are present and which are missing. "
+                        "Return ONLY valid JSON with no markdown or backticks."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": f"""Analyze this extracted POA document text and assess field completeness.
 
 For each field below, mark it as "found" (true/false) based on whether the extracted text
 contains that information. Also provide a brief extracted value or "NOT FOUND".
@@ -146,11 +142,14 @@ Return JSON in this exact format:
 Filename: {filename}
 
 {content[:6000]}"""
-            }
-        ],
-        temperature=0.1,
-        max_tokens=2000,
-    )
+                }
+            ],
+            temperature=0.1,
+            max_tokens=2000,
+            tokens=estimate_tokens(content[:6000]) + 2500,
+        )
+        record_usage(s, response.usage)
+        usage_ledger.record("chat", response.usage, os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"])
 
     raw = response.choices[0].message.content.strip()
     if raw.startswith("```"):
@@ -165,10 +164,12 @@ Filename: {filename}
                 "quality_notes": "Failed to parse GPT assessment"}
 
 
+@traced("analyze_document")
 def analyze_document(filepath):
     """Run full extraction analysis on a single document."""
     filename = os.path.basename(filepath)
     print(f"\nAnalyzing: {filename}")
+    current_span().set(doc_id=filename)
 
     with open(filepath, "rb") as f:
         file_bytes = f.read()
@@ -177,13 +178,19 @@ def analyze_document(filepath):
     content_type = get_content_type(filename)
 
     # Run Document Intelligence
-    poller = doc_client.begin_analyze_document(
-        model_id="prebuilt-layout",
-        body=file_bytes,
-        content_type=content_type,
-        output_content_format=DocumentContentFormat.MARKDOWN,
-    )
-    result = poller.result()
+    from azure.ai.documentintelligence.models import DocumentContentFormat
+
+    def run():
+        poller = clients.docintel().begin_analyze_document(
+            model_id="prebuilt-layout",
+            body=file_bytes,
+            content_type=content_type,
+            output_content_format=DocumentContentFormat.MARKDOWN,
+        )
+        return poller.result()
+
+    with span("analyze", bytes=len(file_bytes), content_type=content_type):
+        result = limited_call(get_limiter("docintel"), run)
 
     content = result.content
     chars = len(content)
@@ -355,6 +362,10 @@ def main():
 
     # Save per-field detail
     print(f"  Per-document field details saved in extraction_metrics/")
+    loaded = field_store.load_dir(field_store.FieldStore())
+    print(f"  Field store updated: {loaded} document(s) in {field_store.STORE_PATH}")
+    print_limiter_stats()
+    usage_ledger.print_usage_summary()
 
     print(f"\n{'='*60}")
     print(f"  Done! Use the CSV or JSON for your summary table.")
@@ -0,0 +1,335 @@
+"""
+tracing.py
+
+Lightweight span tracing for the pipeline: every outbound Azure call
+(analyze, embeddings, chat, upload, search) and the main local stages
+(chunking, context building) run inside a span that records its duration,
+payload sizes, token usage and retry/throttle counts.
+
+Spans nest through a contextvar, so a query or a document becomes one trace
+with its calls underneath. Worker threads inherit the caller's span when the
+callable is wrapped with propagate().
+
+Export is controlled by PIPELINE_TRACE:
+    jsonl  (default) append one JSON line per span to PIPELINE_TRACE_PATH
+           (default traces/spans.jsonl)
+    otel   also emit OpenTelemetry spans (needs opentelemetry-sdk; exported
+           over OTLP when opentelemetry-exporter-otlp is installed, honouring
+           the usual OTEL_EXPORTER_OTLP_* variables, else to the console)
+    both   jsonl + otel
+    off    no tracing
+
+rate_limiter.limited_call() adds attempts, retries and throttle wait to the
+span that is current when it runs.
+
+Usage (summary of where time goes):
+    python tracing.py                          # PIPELINE_TRACE_PATH
+    python tracing.py traces/spans.jsonl --top 10
+    python tracing.py --root query             # only traces rooted at "query"
+
+Root spans: query (step3), step1.run, step2.run, ingest.document
+(ingest_worker), ingest_daemon.document (ingest_daemon).
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import argparse
+import functools
+import threading
+import contextlib
+import contextvars
+
+TRACE_MODE = os.environ.get("PIPELINE_TRACE", "jsonl").lower()
+TRACE_PATH = os.environ.get("PIPELINE_TRACE_PATH", "traces/spans.jsonl")
+
+_current = contextvars.ContextVar("current_span", default=None)
+_write_lock = threading.Lock()
+_trace_file = None
+_otel_tracer = None
+
+
+class Span:
+    """One timed operation. Attributes are plain JSON values."""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key, amount=1):
+        """Increment a counter attribute (tokens, retries, bytes ...)."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "pid": os.getpid(),
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+# -- Export --
+def _write_jsonl(record):
+    global _trace_file
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        if _trace_file is None:
+            os.makedirs(os.path.dirname(TRACE_PATH) or ".", exist_ok=True)
+            # Append mode: several worker processes can share the file line by line
+            _trace_file = open(TRACE_PATH, "a", encoding="utf-8")
+        _trace_file.write(line)
+        _trace_file.flush()
+
+
+def _get_otel_tracer():
+    global _otel_tracer
+    if _otel_tracer is None:
+        from opentelemetry import trace
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+        except ImportError:
+            exporter = ConsoleSpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        _otel_tracer = trace.get_tracer("poa-pipeline")
+    return _otel_tracer
+
+
+def _otel_attributes(attributes):
+    """OpenTelemetry only takes primitive attribute values."""
+    return {k: v if isinstance(v, (str, bool, int, float)) else json.dumps(v, default=str)
+            for k, v in attributes.items() if v is not None}
+
+
+# -- Spans --
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a child of the current span."""
+    if TRACE_MODE == "off":
+        yield NOOP_SPAN
+        return
+
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    otel_context = otel_span = None
+    if TRACE_MODE in ("otel", "both"):
+        otel_context = _get_otel_tracer().start_as_current_span(name)
+        otel_span = otel_context.__enter__()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set(error=f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - current._t0) * 1000, 3)
+        _current.reset(token)
+        if otel_span is not None:
+            otel_span.set_attributes(_otel_attributes(current.attributes))
+            otel_context.__exit__(None, None, None)
+        if TRACE_MODE in ("jsonl", "both"):
+            _write_jsonl(current.to_dict())
+
+
+def current_span():
+    """The innermost open span (a no-op stand-in when there is none)."""
+    return _current.get() or NOOP_SPAN
+
+
+def traced(name=None):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__qualname__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def propagate(fn):
+    """
+    Wrap `fn` so that, run on a pool thread, it sees the caller's context
+    variables: its spans nest under the caller's span (and usage_ledger
+    attribution carries over).
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A Context can only be entered by one thread at a time - copy per call
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def payload_size(value):
+    """Approximate request payload size in bytes (bytes, str, or JSON-able)."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str))
+
+
+def record_usage(target, usage):
+    """Copy an OpenAI `usage` object onto a span."""
+    if usage is None:
+        return
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, key, None)
+        if value is not None:
+            target.add(key, value)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached:
+        target.add("cached_tokens", cached)
+
+
+# -- Summary CLI --
+def percentile(values, pct):
+    """Nearest-rank percentile (None for no values); shared by the report CLIs."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def load_spans(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(spans, root=None):
+    """Aggregate spans by name (with self time) and by trace."""
+    by_id = {s["span_id"]: s for s in spans}
+    roots = {s["trace_id"]: s for s in spans if s["parent_id"] is None}
+    if root:
+        keep = {tid for tid, s in roots.items() if s["name"] == root}
+        spans = [s for s in spans if s["trace_id"] in keep]
+        roots = {tid: s for tid, s in roots.items() if tid in keep}
+
+    child_time = {}
+    for s in spans:
+        if s["parent_id"] in by_id:
+            child_time[s["parent_id"]] = child_time.get(s["parent_id"], 0) + s["duration_ms"]
+
+    names = {}
+    for s in spans:
+        entry = names.setdefault(s["name"], {"count": 0, "errors": 0, "durations": [],
+                                             "self_ms": 0.0, "counters": {}})
+        entry["count"] += 1
+        entry["errors"] += s["status"] != "ok"
+        entry["durations"].append(s["duration_ms"])
+        # Children running in parallel can exceed the parent; clamp at zero
+        entry["self_ms"] += max(0.0, s["duration_ms"] - child_time.get(s["span_id"], 0))
+        for key, value in s["attributes"].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                entry["counters"][key] = entry["counters"].get(key, 0) + value
+
+    rows = []
+    for name, e in names.items():
+        rows.append({
+            "name": name,
+            "count": e["count"],
+            "errors": e["errors"],
+            "total_ms": round(sum(e["durations"]), 1),
+            "self_ms": round(e["self_ms"], 1),
+            "mean_ms": round(sum(e["durations"]) / e["count"], 1),
+            "p95_ms": round(percentile(e["durations"], 95), 1),
+            "counters": e["counters"],
+        })
+    rows.sort(key=lambda r: r["self_ms"], reverse=True)
+
+    traces = []
+    for trace_id, root_span in roots.items():
+        parts = {}
+        for s in spans:
+            if s["trace_id"] == trace_id and s["parent_id"] is not None:
+                parts[s["name"]] = parts.get(s["name"], 0) + s["duration_ms"]
+        traces.append({"trace_id": trace_id, "name": root_span["name"],
+                       "duration_ms": root_span["duration_ms"],
+                       "label": root_span["attributes"].get("doc_id")
+                                or root_span["attributes"].get("question", ""),
+                       "parts": sorted(parts.items(), key=lambda kv: kv[1], reverse=True)})
+    traces.sort(key=lambda t: t["duration_ms"], reverse=True)
+    return rows, traces
+
+
+def print_summary(rows, traces, top=10):
+    total_self = sum(r["self_ms"] for r in rows) or 1
+    print(f"\n{'Span':<28} {'Count':>6} {'Err':>4} {'Total ms':>10} {'Self ms':>10} "
+          f"{'Self %':>7} {'Mean ms':>9} {'p95 ms':>9}")
+    print("-" * 90)
+    for r in rows:
+        print(f"{r['name'][:28]:<28} {r['count']:>6} {r['errors']:>4} {r['total_ms']:>10.0f} "
+              f"{r['self_ms']:>10.0f} {r['self_ms'] / total_self:>7.1%} "
+              f"{r['mean_ms']:>9.1f} {r['p95_ms']:>9.1f}")
+
+    counters = [(r["name"], r["counters"]) for r in rows if r["counters"]]
+    if counters:
+        print("\nCounters:")
+        for name, values in counters:
+            shown = ", ".join(f"{k}={round(v, 2)}" for k, v in sorted(values.items()))
+            print(f"  {name[:28]:<28} {shown}")
+
+    if traces:
+        print(f"\nSlowest {min(top, len(traces))} of {len(traces)} trace(s):")
+        for t in traces[:top]:
+            parts = ", ".join(f"{name} {ms:.0f}ms" for name, ms in t["parts"][:3])
+            label = f" [{str(t['label'])[:50]}]" if t["label"] else ""
+            print(f"  {t['name']}{label}: {t['duration_ms']:.0f}ms  ({parts})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize pipeline spans.")
+    parser.add_argument("path", nargs="?", default=TRACE_PATH,
+                        help=f"spans JSONL file (default: {TRACE_PATH})")
+    parser.add_argument("--root", default=None,
+                        help="only traces whose root span has this name (query, step1.run, "
+                             "step2.run, ingest.document, ingest_daemon.document)")
+    parser.add_argument("--top", type=int, default=10, help="slowest traces to list")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"No spans found at {args.path} (is PIPELINE_TRACE off?)")
+        sys.exit(1)
+    rows, traces = summarize(load_spans(args.path), args.root)
+    print_summary(rows, traces, args.top)
+
+
+if __name__ == "__main__":
+    main()
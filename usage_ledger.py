@@ -0,0 +1,265 @@
+"""
+usage_ledger.py
+
+Token and cost accounting for every Azure OpenAI call in the pipeline,
+backed by SQLite (same style as job_ledger.py).
+
+Each call records prompt, completion, cached-prompt and embedding tokens
+from the response's `usage`, priced with the per-1K-token rates below, and
+is attributed to whatever is being worked on at the time:
+    with attribute("document", doc_id): ...     (step2, step5, ingest workers)
+    with attribute("query", question): ...      (step3)
+Calls made outside an attribute() block are attributed to the run.
+
+Every process gets a run id (USAGE_RUN_ID, or a timestamp + pid); set
+USAGE_RUN_ID yourself to group several processes into one run.
+ingest_worker.py does this for its worker pool.
+
+Budgets: with USAGE_BUDGET_USD and/or USAGE_BUDGET_TOKENS set, check_budget()
+raises BudgetExceeded before the next call once the run has spent that much,
+so a runaway batch stops instead of burning the deployment's quota.
+
+Prices default to GPT-4o and text-embedding-ada-002 list prices and can be
+overridden with USAGE_PRICE_* variables.
+
+Usage:
+    python usage_ledger.py                 # report for the latest run
+    python usage_ledger.py report <run_id>
+    python usage_ledger.py runs            # one line per run
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+import contextlib
+import contextvars
+from datetime import datetime
+
+USAGE_PATH = os.environ.get("USAGE_LEDGER_PATH", "ingest_state/usage.db")
+RUN_ID = os.environ.get("USAGE_RUN_ID") or f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+BUDGET_USD = float(os.environ.get("USAGE_BUDGET_USD", "0") or 0)
+BUDGET_TOKENS = int(os.environ.get("USAGE_BUDGET_TOKENS", "0") or 0)
+
+# USD per 1,000 tokens
+PRICES = {
+    "chat_input": float(os.environ.get("USAGE_PRICE_CHAT_INPUT", "0.0025")),
+    "chat_cached_input": float(os.environ.get("USAGE_PRICE_CHAT_CACHED_INPUT", "0.00125")),
+    "chat_output": float(os.environ.get("USAGE_PRICE_CHAT_OUTPUT", "0.01")),
+    "embedding": float(os.environ.get("USAGE_PRICE_EMBEDDING", "0.0001")),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id                INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id            TEXT NOT NULL,
+    at                REAL NOT NULL,
+    kind              TEXT NOT NULL,
+    model             TEXT,
+    subject_type      TEXT NOT NULL,
+    subject           TEXT,
+    prompt_tokens     INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens     INTEGER NOT NULL DEFAULT 0,
+    embedding_tokens  INTEGER NOT NULL DEFAULT 0,
+    cost_usd          REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_usage_run ON usage(run_id);
+CREATE INDEX IF NOT EXISTS idx_usage_subject ON usage(subject_type, subject);
+"""
+
+_subject = contextvars.ContextVar("usage_subject", default=("run", None))
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised before a call once the run's token or cost budget is used up."""
+
+
+def cost_of(kind, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+    """USD cost of one call."""
+    if kind == "embedding":
+        return prompt_tokens / 1000 * PRICES["embedding"]
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached / 1000 * PRICES["chat_input"]
+            + cached_tokens / 1000 * PRICES["chat_cached_input"]
+            + completion_tokens / 1000 * PRICES["chat_output"])
+
+
+class UsageLedger:
+    """SQLite-backed record of OpenAI token usage per call."""
+
+    def __init__(self, path=USAGE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        self._conn.executescript(SCHEMA)
+
+    def add(self, run_id, kind, model, subject_type, subject, prompt_tokens=0,
+            completion_tokens=0, cached_tokens=0):
+        embedding_tokens = prompt_tokens if kind == "embedding" else 0
+        chat_prompt = 0 if kind == "embedding" else prompt_tokens
+        cost = cost_of(kind, prompt_tokens, completion_tokens, cached_tokens)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO usage (run_id, at, kind, model, subject_type, subject, "
+                "prompt_tokens, completion_tokens, cached_tokens, embedding_tokens, cost_usd) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, time.time(), kind, model, subject_type, subject, chat_prompt,
+                 completion_tokens, cached_tokens, embedding_tokens, cost),
+            )
+        return cost
+
+    def run_totals(self, run_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS calls, "
+                "COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens, "
+                "COALESCE(SUM(completion_tokens), 0) AS completion_tokens, "
+                "COALESCE(SUM(cached_tokens), 0) AS cached_tokens, "
+                "COALESCE(SUM(embedding_tokens), 0) AS embedding_tokens, "
+                "COALESCE(SUM(cost_usd), 0) AS cost_usd "
+                "FROM usage WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return dict(row)
+
+    def by_subject(self, run_id, subject_type, limit=10):
+        """Most expensive documents / queries of a run."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT subject, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+                "SUM(completion_tokens) AS completion_tokens, "
+                "SUM(embedding_tokens) AS embedding_tokens, SUM(cost_usd) AS cost_usd "
+                "FROM usage WHERE run_id = ? AND subject_type = ? "
+                "GROUP BY subject ORDER BY cost_usd DESC LIMIT ?",
+                (run_id, subject_type, limit),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def by_kind(self, run_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, model, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+                "SUM(completion_tokens) AS completion_tokens, SUM(cached_tokens) AS cached_tokens, "
+                "SUM(embedding_tokens) AS embedding_tokens, SUM(cost_usd) AS cost_usd "
+                "FROM usage WHERE run_id = ? GROUP BY kind, model", (run_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def runs(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, MIN(at) AS started, COUNT(*) AS calls, "
+                "SUM(prompt_tokens + completion_tokens + embedding_tokens) AS tokens, "
+                "SUM(cost_usd) AS cost_usd FROM usage GROUP BY run_id ORDER BY started"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def get_ledger():
+    """One UsageLedger per process."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger()
+        return _ledger
+
+
+# -- Attribution --
+@contextlib.contextmanager
+def attribute(subject_type, subject):
+    """Attribute the OpenAI calls made inside the block to a document or query."""
+    token = _subject.set((subject_type, str(subject)[:500]))
+    try:
+        yield
+    finally:
+        _subject.reset(token)
+
+
+def record(kind, usage, model=None):
+    """Record one call's `usage` ("embedding" or "chat"). Returns its cost."""
+    if usage is None:
+        return 0.0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    subject_type, subject = _subject.get()
+    return get_ledger().add(
+        RUN_ID, kind, model, subject_type, subject,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        cached_tokens=cached,
+    )
+
+
+def check_budget():
+    """Raise BudgetExceeded if this run has used up its budget (no-op without one)."""
+    if not BUDGET_USD and not BUDGET_TOKENS:
+        return
+    totals = get_ledger().run_totals(RUN_ID)
+    tokens = totals["prompt_tokens"] + totals["completion_tokens"] + totals["embedding_tokens"]
+    if BUDGET_USD and totals["cost_usd"] >= BUDGET_USD:
+        raise BudgetExceeded(f"run {RUN_ID} spent ${totals['cost_usd']:.4f} "
+                             f"of its ${BUDGET_USD:.2f} budget")
+    if BUDGET_TOKENS and tokens >= BUDGET_TOKENS:
+        raise BudgetExceeded(f"run {RUN_ID} used {tokens} of its {BUDGET_TOKENS} token budget")
+
+
+# -- Reporting --
+def print_usage_summary(run_id=None):
+    """One-paragraph usage summary, printed at the end of a step."""
+    run_id = run_id or RUN_ID
+    totals = get_ledger().run_totals(run_id)
+    if not totals["calls"]:
+        return
+    print(f"\nToken usage (run {run_id}): {totals['calls']} call(s), "
+          f"{totals['prompt_tokens']} prompt + {totals['completion_tokens']} completion "
+          f"({totals['cached_tokens']} cached), {totals['embedding_tokens']} embedding "
+          f"-> ${totals['cost_usd']:.4f}")
+
+
+def print_report(run_id, top=10):
+    ledger = get_ledger()
+    totals = ledger.run_totals(run_id)
+    print(f"\nRun {run_id}: {totals['calls']} call(s), ${totals['cost_usd']:.4f}")
+
+    print(f"\n{'Kind':<10} {'Model':<24} {'Calls':>7} {'Prompt':>10} {'Compl.':>9} "
+          f"{'Cached':>9} {'Embed':>10} {'Cost $':>9}")
+    print("-" * 94)
+    for r in ledger.by_kind(run_id):
+        print(f"{r['kind']:<10} {(r['model'] or '-')[:24]:<24} {r['calls']:>7} "
+              f"{r['prompt_tokens']:>10} {r['completion_tokens']:>9} {r['cached_tokens']:>9} "
+              f"{r['embedding_tokens']:>10} {r['cost_usd']:>9.4f}")
+
+    for subject_type, label in (("document", "documents"), ("query", "queries")):
+        rows = ledger.by_subject(run_id, subject_type, top)
+        if not rows:
+            continue
+        print(f"\nMost expensive {label}:")
+        for r in rows:
+            tokens = r["prompt_tokens"] + r["completion_tokens"] + r["embedding_tokens"]
+            print(f"  ${r['cost_usd']:.4f}  {tokens:>8} tok  {r['calls']:>4} call(s)  "
+                  f"{r['subject'][:70]}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    ledger = get_ledger()
+    runs = ledger.runs()
+    if command == "runs":
+        for r in runs:
+            started = datetime.fromtimestamp(r["started"]).isoformat(timespec="seconds")
+            print(f"{r['run_id']:<28} {started}  {r['calls']:>6} call(s)  "
+                  f"{r['tokens']:>10} tok  ${r['cost_usd']:.4f}")
+    elif command == "report":
+        if len(sys.argv) > 2:
+            print_report(sys.argv[2])
+        elif runs:
+            print_report(runs[-1]["run_id"])
+        else:
+            print("No usage recorded yet.")
+    else:
+        print(__doc__)